@@ -0,0 +1 @@
+"""Benchmarks for the custom pipeline examples."""
@@ -0,0 +1,73 @@
+"""A local stand-in for the GDP MCP server, used by the load test.
+
+It exposes a few tools with the same shape as the GitHub, Slack and time tools of the real server, answers them with
+canned data after a configurable latency, and speaks the same SSE transport as the real server.
+
+Run it from the `custom-pipeline` directory:
+
+    python -m benchmarks.fake_mcp_server --port 8765 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from mcp.server.fastmcp import FastMCP
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def create_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, latency: float = 0.05) -> FastMCP:
+    """Create the fake MCP server.
+
+    Args:
+        host (str, optional): The host to listen on. Defaults to `127.0.0.1`.
+        port (int, optional): The port to listen on. Defaults to 8765.
+        latency (float, optional): Seconds every tool call takes. Defaults to 0.05.
+
+    Returns:
+        FastMCP: The server.
+    """
+    server = FastMCP("fake-gdp", host=host, port=port, log_level="WARNING")
+
+    @server.tool()
+    async def get_current_time(timezone: str = "Asia/Jakarta") -> str:
+        """Get the current time in a timezone."""
+        await asyncio.sleep(latency)
+        return datetime.now(ZoneInfo(timezone)).isoformat()
+
+    @server.tool()
+    async def github_search_issues(query: str) -> str:
+        """Search issues and pull requests on GitHub."""
+        await asyncio.sleep(latency)
+        items = [
+            {"number": number, "title": f"Pull request {number}", "state": "open", "user": {"login": "octocat"}}
+            for number in range(1, 13)
+        ]
+        return json.dumps({"query": query, "total_count": len(items), "items": items})
+
+    @server.tool()
+    async def slack_get_users() -> str:
+        """List the users of the Slack workspace."""
+        await asyncio.sleep(latency)
+        return json.dumps({"members": [{"id": f"U{index:08d}", "name": f"user{index}"} for index in range(50)]})
+
+    return server
+
+
+def main():
+    """Run the fake MCP server over SSE until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every tool call takes.")
+    args = parser.parse_args()
+
+    create_server(args.host, args.port, args.latency).run(transport="sse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Load test of the MCP pipeline at increasing numbers of concurrent requests.
+
+It builds the pipeline with `McpPipelineBuilderPlugin.build()` and invokes it the way a worker does, against a local
+fake MCP server and a scripted chat model, so no network access or API key is needed. Every request makes the same
+tool calls in parallel and then streams a canned answer. For each concurrency level it reports:
+
+- throughput and p50/p95/p99 latency of `pipeline.invoke()`;
+- the number of events emitted per request and the time spent emitting them;
+- the memory allocated per in-flight request, measured in a separate round with `tracemalloc`.
+
+Run it from the `custom-pipeline` directory:
+
+    python -m benchmarks.load_test_mcp_pipeline --concurrency 1 8 32 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from mcp_pipeline.pipeline import McpPipelineBuilderPlugin
+
+SERVER_URL_ENV = "LOAD_TEST_MCP_SERVER_URL"
+ERROR_NOTICE = "An error occurred while processing your request."
+DEFAULT_TOOL_CALLS = (
+    ("github_search_issues", {"query": "repo:GDP-ADMIN/bosa is:pr is:open"}),
+    ("get_current_time", {"timezone": "Asia/Jakarta"}),
+)
+DEFAULT_ANSWER = (
+    "As of now there are 12 open pull requests in the GDP-ADMIN/bosa repository. "
+    "If you need a list or details about these pull requests, let me know!"
+)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """A chat model that requests a fixed set of tool calls and then answers with a fixed text.
+
+    It is stateless: the next message only depends on whether the conversation already contains tool results, so
+    one instance serves any number of concurrent requests.
+
+    Attributes:
+        scripted_tool_calls (list[tuple[str, dict[str, Any]]]): The tools called in the first turn, in parallel.
+        answer (str): The final answer, streamed word by word.
+        latency (float): Seconds every model call takes before it starts answering.
+    """
+
+    scripted_tool_calls: list[tuple[str, dict[str, Any]]] = list(DEFAULT_TOOL_CALLS)
+    answer: str = DEFAULT_ANSWER
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        """Return the model itself, since the script already knows which tools to call."""
+        return self
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        yield from self._to_chunks(self._next_message(messages))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._to_chunks(self._next_message(messages)):
+            yield chunk
+
+    def _next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        usage = {"input_tokens": 500, "output_tokens": 50, "total_tokens": 550}
+        if not self.scripted_tool_calls or not isinstance(messages[-1], HumanMessage):
+            return AIMessage(content=self.answer, usage_metadata=usage)
+        tool_calls = [
+            {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}
+            for name, args in self.scripted_tool_calls
+        ]
+        return AIMessage(content="", tool_calls=tool_calls, usage_metadata=usage)
+
+    def _to_chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        if message.tool_calls:
+            tool_call_chunks = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                for index, call in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="", tool_call_chunks=tool_call_chunks, usage_metadata=message.usage_metadata
+                )
+            )
+            return
+
+        words = message.content.split(" ")
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=word if last else f"{word} ", usage_metadata=message.usage_metadata if last else None
+                )
+            )
+
+
+class TimingEventEmitter:
+    """An event emitter that serializes every event like a streaming handler would and times it.
+
+    Attributes:
+        emit_count (int): The number of events emitted.
+        emit_seconds (float): The total time spent in `emit`.
+    """
+
+    def __init__(self):
+        self.emit_count = 0
+        self.emit_seconds = 0.0
+
+    async def emit(self, value: Any, event_level: Any = None, event_type: Any = None, **kwargs: Any) -> None:
+        """Serialize and count an event.
+
+        Args:
+            value (Any): The event value.
+            event_level (Any, optional): The event level. Defaults to None.
+            event_type (Any, optional): The event type. Defaults to None.
+            **kwargs (Any): Other event attributes.
+        """
+        start = time.perf_counter()
+        json.dumps({"value": value, "level": str(event_level), "type": str(event_type)}, default=str)
+        self.emit_count += 1
+        self.emit_seconds += time.perf_counter() - start
+
+
+@dataclass
+class RequestResult:
+    """The outcome of one request.
+
+    Attributes:
+        latency (float): Seconds `pipeline.invoke()` took.
+        ok (bool): Whether the pipeline answered without an error notice.
+        emit_count (int): The number of events emitted.
+        emit_seconds (float): The time spent emitting events.
+    """
+
+    latency: float
+    ok: bool
+    emit_count: int
+    emit_seconds: float
+
+
+async def run_round(
+    builder: McpPipelineBuilderPlugin, pipeline: Any, concurrency: int, requests: int
+) -> tuple[list[RequestResult], float]:
+    """Send a number of requests with a fixed number of them in flight at any time.
+
+    Args:
+        builder (McpPipelineBuilderPlugin): The builder of the pipeline, used to build the initial states.
+        pipeline (Any): The pipeline under test.
+        concurrency (int): The number of requests in flight.
+        requests (int): The total number of requests.
+
+    Returns:
+        tuple[list[RequestResult], float]: The result of every request and the wall-clock duration of the round.
+    """
+    results: list[RequestResult] = []
+    next_request = iter(range(requests))
+
+    async def worker():
+        for index in next_request:
+            emitter = TimingEventEmitter()
+            # Distinct queries keep the optional response cache out of the measurement.
+            state = builder.build_initial_state(
+                {"message": f"How many open PRs are in bosa as of now? (request {index})"}, {}, event_emitter=emitter
+            )
+            start = time.perf_counter()
+            response = await pipeline.invoke(initial_state=state, config={"user_multimodal_contents": []})
+            latency = time.perf_counter() - start
+            ok = not str(response.get("response", "")).startswith(ERROR_NOTICE)
+            results.append(RequestResult(latency, ok, emitter.emit_count, emitter.emit_seconds))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+async def measure_memory_per_request(
+    builder: McpPipelineBuilderPlugin, pipeline: Any, concurrency: int
+) -> float:
+    """Measure the peak memory allocated while a batch of requests is in flight.
+
+    Args:
+        builder (McpPipelineBuilderPlugin): The builder of the pipeline.
+        pipeline (Any): The pipeline under test.
+        concurrency (int): The number of requests in flight.
+
+    Returns:
+        float: The peak allocation per in-flight request in bytes.
+    """
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await run_round(builder, pipeline, concurrency, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - baseline) / concurrency
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values (list[float]): The values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"The fake MCP server did not start listening on port {port} within {timeout} seconds.")
+
+
+def start_fake_server(latency: float) -> tuple[subprocess.Popen, str]:
+    """Start the fake MCP server in a subprocess.
+
+    Args:
+        latency (float): Seconds every tool call takes.
+
+    Returns:
+        tuple[subprocess.Popen, str]: The server process and its SSE URL.
+    """
+    port = _get_free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_mcp_server", "--port", str(port), "--latency", str(latency)],
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    try:
+        _wait_for_port(port)
+    except TimeoutError:
+        process.terminate()
+        raise
+    return process, f"http://127.0.0.1:{port}/sse"
+
+
+async def run(args: argparse.Namespace, server_url: str) -> None:
+    """Build the pipeline and run every concurrency level.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+        server_url (str): The SSE URL of the MCP server.
+    """
+    os.environ[SERVER_URL_ENV] = server_url
+    if args.no_tool_cache:
+        os.environ["MCP_TOOL_CACHE"] = "false"
+    model = ScriptedChatModel(latency=args.model_latency)
+    builder = McpPipelineBuilderPlugin(language_model_factory=lambda model_name, api_key_env: model)
+    pipeline_config = {"model_name": "scripted/load-test", "mcp_server_url": SERVER_URL_ENV}
+
+    start = time.perf_counter()
+    pipeline = await builder.build(pipeline_config)
+    cold_build = time.perf_counter() - start
+    start = time.perf_counter()
+    await builder.build(pipeline_config)
+    warm_build = time.perf_counter() - start
+    print(f"build(): cold {cold_build * 1000:.1f} ms, warm {warm_build * 1000:.1f} ms")
+
+    await run_round(builder, pipeline, min(args.concurrency), min(args.concurrency))
+
+    header = (
+        f"{'concurrency':>11} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'errors':>6} | "
+        f"{'emits/req':>9} | {'emit ms/req':>11} | {'emit %':>6} | {'KiB/req':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for concurrency in args.concurrency:
+        results, duration = await run_round(builder, pipeline, concurrency, args.requests)
+        latencies = [result.latency for result in results]
+        emit_seconds = sum(result.emit_seconds for result in results)
+        memory = await measure_memory_per_request(builder, pipeline, concurrency) if args.memory else float("nan")
+        print(
+            f"{concurrency:>11} | {len(results) / duration:>8.1f} | {percentile(latencies, 50) * 1000:>8.1f} | "
+            f"{percentile(latencies, 95) * 1000:>8.1f} | {percentile(latencies, 99) * 1000:>8.1f} | "
+            f"{sum(not result.ok for result in results):>6} | "
+            f"{sum(result.emit_count for result in results) / len(results):>9.1f} | "
+            f"{emit_seconds / len(results) * 1000:>11.3f} | {emit_seconds / sum(latencies) * 100:>6.2f} | "
+            f"{memory / 1024:>8.1f}"
+        )
+
+
+def main():
+    """Run the load test against a fake MCP server started for the duration of the test."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level.")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Seconds every tool call takes.")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="Seconds every model call takes.")
+    parser.add_argument("--server-url", help="Use a running MCP server instead of starting the fake one.")
+    parser.add_argument("--no-tool-cache", action="store_true", help="Disable the tool result cache.")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the memory measurement.")
+    args = parser.parse_args()
+
+    process = None
+    server_url = args.server_url
+    if server_url is None:
+        process, server_url = start_fake_server(args.tool_latency)
+    try:
+        asyncio.run(run(args, server_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Micro-benchmark of the per-chunk cost of processing the MCP agent stream.
+
+It compares the previous approach, which rescanned the full `messages` list of every `stream_mode="values"` chunk,
+with `AgentStreamProcessor`, which only looks at the new messages of every `stream_mode="updates"` chunk. The cost
+per chunk of the former grows with the number of tool calls, while the latter stays flat.
+
+Run it from the `custom-pipeline` directory:
+
+    python -m benchmarks.stream_processing_benchmark
+"""
+
+import argparse
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from mcp_pipeline.stream_processor import AgentStreamProcessor
+
+
+def build_conversation(tool_calls: int) -> list[list[Any]]:
+    """Build the new messages of every agent step of a conversation with the given number of tool calls.
+
+    Args:
+        tool_calls (int): The number of tool calls in the conversation.
+
+    Returns:
+        list[list[Any]]: The messages produced by each step, in order.
+    """
+    steps: list[list[Any]] = [[HumanMessage(content="How many open PRs are in bosa-sdk as of now?")]]
+    for index in range(tool_calls):
+        call_id = f"call_{index}"
+        tool_call = {
+            "name": "github__search_issues",
+            "args": {"query": f"repo:GDP-ADMIN/bosa-sdk page:{index}"},
+            "id": call_id,
+        }
+        steps.append([
+            AIMessage(
+                content="",
+                tool_calls=[tool_call],
+                additional_kwargs={
+                    "tool_calls": [
+                        {"id": call_id, "type": "function", "function": {"name": tool_call["name"], "arguments": "{}"}}
+                    ]
+                },
+            )
+        ])
+        steps.append([ToolMessage(content=f"result {index}", tool_call_id=call_id)])
+    steps.append([AIMessage(content="There are 12 open pull requests.")])
+    return steps
+
+
+def run_values_rescan(steps: list[list[Any]]) -> list[float]:
+    """Replay the conversation the way the `stream_mode="values"` loop processed it.
+
+    Args:
+        steps (list[list[Any]]): The messages produced by each step.
+
+    Returns:
+        list[float]: The processing time of each chunk in seconds.
+    """
+    durations = []
+    messages: list[Any] = []
+    processed_tool_ids = set()
+    for new_messages in steps:
+        messages = messages + new_messages
+        chunk = {"messages": messages}
+        start = time.perf_counter()
+        for message in chunk["messages"]:
+            if hasattr(message, "additional_kwargs") and "tool_calls" in message.additional_kwargs:
+                for tool_call in message.additional_kwargs["tool_calls"]:
+                    if tool_call["id"] not in processed_tool_ids:
+                        processed_tool_ids.add(tool_call["id"])
+        next((msg for msg in reversed(chunk["messages"]) if hasattr(msg, "content") and msg.content), None)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_updates(steps: list[list[Any]]) -> list[float]:
+    """Replay the conversation through `AgentStreamProcessor` with `stream_mode="updates"` chunks.
+
+    Args:
+        steps (list[list[Any]]): The messages produced by each step.
+
+    Returns:
+        list[float]: The processing time of each chunk in seconds.
+    """
+    durations = []
+    processor = AgentStreamProcessor()
+    for index, new_messages in enumerate(steps):
+        update = {"agent" if index % 2 else "tools": {"messages": new_messages}}
+        start = time.perf_counter()
+        processor.process_update(update)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _last_chunks_mean(durations: list[float], window: int = 10) -> float:
+    tail = durations[-window:]
+    return sum(tail) / len(tail)
+
+
+def main():
+    """Print the mean per-chunk cost of both approaches for growing numbers of tool calls."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tool-calls", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'tool calls':>10} | {'values rescan (us/chunk)':>24} | {'updates delta (us/chunk)':>24}")
+    print("-" * 66)
+    for tool_calls in args.tool_calls:
+        steps = build_conversation(tool_calls)
+        values_cost = min(_last_chunks_mean(run_values_rescan(steps)) for _ in range(args.repeat))
+        updates_cost = min(_last_chunks_mean(run_updates(steps)) for _ in range(args.repeat))
+        print(f"{tool_calls:>10} | {values_cost * 1e6:>24.2f} | {updates_cost * 1e6:>24.2f}")
+
+
+if __name__ == "__main__":
+    main()
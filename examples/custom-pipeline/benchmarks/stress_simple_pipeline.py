@@ -0,0 +1,191 @@
+"""Stress test of `SimplePipelineBuilder` serving many presets concurrently from one builder instance.
+
+Many tasks build and invoke pipelines for randomly chosen presets at the same time, with builds of other presets
+interleaved between every build and invoke. Each preset answers with its own model name, so a request that ends up
+with the state builder or pipeline of another preset is detected. The `LM` preset is replaced with an echo preset,
+so no API key or network access is needed.
+
+Run it from the `custom-pipeline` directory:
+
+    python -m benchmarks.stress_simple_pipeline --presets 8 --tasks 64 --iterations 50
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, TypedDict
+
+from gllm_core.event import EventEmitter
+from gllm_generation.response_synthesizer.response_synthesizer import BaseResponseSynthesizer
+from gllm_inference.schema import PromptRole
+from gllm_pipeline.pipeline.pipeline import Pipeline
+from gllm_pipeline.steps import step
+
+from simple_pipeline.pipeline import SimplePipelineBuilder
+
+
+class EchoState(TypedDict):
+    """The state of the echo pipeline.
+
+    Attributes:
+        query (str): The user's query.
+        response (str): The answer.
+        event_emitter (EventEmitter): The event emitter of the request.
+    """
+
+    query: str
+    response: str
+    event_emitter: EventEmitter
+
+
+class EchoResponseSynthesizer(BaseResponseSynthesizer):
+    """Answers with the model name and the query after a short random delay."""
+
+    def __init__(self, model_name: str):
+        super().__init__()
+        self.model_name = model_name
+
+    async def synthesize_response(
+        self,
+        query: str | None = None,
+        state_variables: dict[str, Any] | None = None,
+        history: list[tuple[PromptRole, str | list[Any]]] | None = None,
+        event_emitter: EventEmitter | None = None,
+        system_multimodal_contents: list[Any] | None = None,
+        user_multimodal_contents: list[Any] | None = None,
+    ) -> str:
+        """Answer with the model name and the query.
+
+        Args:
+            query (str | None, optional): The query. Defaults to None.
+            state_variables (dict[str, Any] | None, optional): Unused. Defaults to None.
+            history (list[tuple[PromptRole, str | list[Any]]] | None, optional): Unused. Defaults to None.
+            event_emitter (EventEmitter | None, optional): Unused. Defaults to None.
+            system_multimodal_contents (list[Any] | None, optional): Unused. Defaults to None.
+            user_multimodal_contents (list[Any] | None, optional): Unused. Defaults to None.
+
+        Returns:
+            str: The answer.
+        """
+        await asyncio.sleep(random.uniform(0, 0.002))
+        return get_expected_response(self.model_name, query)
+
+
+class EchoPreset:
+    """Stands in for the `LM` preset with the same `build` and `build_initial_state` methods."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def build(self) -> Pipeline:
+        """Build the echo pipeline.
+
+        Returns:
+            Pipeline: The pipeline.
+        """
+        return Pipeline(
+            steps=[
+                step(
+                    component=EchoResponseSynthesizer(self.model_name),
+                    input_state_map={"query": "query"},
+                    output_state="response",
+                )
+            ],
+            state_type=EchoState,
+        )
+
+    def build_initial_state(self, query: str, config: dict[str, Any]) -> EchoState:
+        """Build the initial state of the echo pipeline.
+
+        Args:
+            query (str): The user's query.
+            config (dict[str, Any]): The config with the event emitter.
+
+        Returns:
+            EchoState: The initial state.
+        """
+        return EchoState(query=query, response=None, event_emitter=config.get("event_emitter"))
+
+
+def get_expected_response(model_name: str, query: str) -> str:
+    """Return the answer of the echo preset of a model.
+
+    Args:
+        model_name (str): The model.
+        query (str): The query.
+
+    Returns:
+        str: The answer.
+    """
+    return f"[{model_name}] {query}"
+
+
+async def run_task(
+    builder: SimplePipelineBuilder, pipeline_configs: list[dict[str, Any]], task_id: int, iterations: int
+) -> int:
+    """Build and invoke random presets, yielding to other tasks between every step.
+
+    Args:
+        builder (SimplePipelineBuilder): The shared builder.
+        pipeline_configs (list[dict[str, Any]]): The pipeline configs of the presets.
+        task_id (int): The ID of the task, used in the queries.
+        iterations (int): The number of requests of the task.
+
+    Returns:
+        int: The number of requests answered by the wrong preset.
+    """
+    mismatches = 0
+    for iteration in range(iterations):
+        pipeline_config = random.choice(pipeline_configs)
+        pipeline = await builder.build(pipeline_config)
+        await asyncio.sleep(0)
+        query = f"task {task_id} request {iteration}"
+        state = builder.build_initial_state({"message": query}, pipeline_config)
+        await asyncio.sleep(0)
+        result = await pipeline.invoke(initial_state=state, config={"user_multimodal_contents": []})
+        if result["response"] != get_expected_response(pipeline_config["model_name"], query):
+            mismatches += 1
+    return mismatches
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Run the stress test.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+
+    Returns:
+        int: The number of requests answered by the wrong preset.
+    """
+    builder = SimplePipelineBuilder(preset_factory=lambda model_name, api_key: EchoPreset(model_name))
+    pipeline_configs = [
+        {"model_name": f"echo/model-{index}", "api_key": "STRESS_TEST_API_KEY"} for index in range(args.presets)
+    ]
+
+    start = time.perf_counter()
+    mismatches = await asyncio.gather(
+        *(run_task(builder, pipeline_configs, task_id, args.iterations) for task_id in range(args.tasks))
+    )
+    duration = time.perf_counter() - start
+
+    requests = args.tasks * args.iterations
+    print(f"presets: {args.presets}, tasks: {args.tasks}, requests: {requests}, built presets: {len(builder.presets)}")
+    print(f"duration: {duration:.2f} s ({requests / duration:.1f} build+invoke/s)")
+    print(f"mismatched responses: {sum(mismatches)}")
+    return sum(mismatches)
+
+
+def main():
+    """Run the stress test and exit with a non-zero status if any request was answered by the wrong preset."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--presets", type=int, default=8)
+    parser.add_argument("--tasks", type=int, default=64, help="Number of concurrent tasks.")
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per task.")
+    args = parser.parse_args()
+
+    raise SystemExit(1 if asyncio.run(run(args)) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Example of running many questions through the simple pipeline in one batch.
+
+Every line of the input file is a JSON object with a `message` and an optional `id`, e.g.
+`{"id": "q1", "message": "What is artificial intelligence?"}`. The answers are written to the output file in the
+order of the input. An interrupted run resumes from its checkpoint when started again with the same arguments.
+"""
+
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from simple_pipeline.batch import DEFAULT_CONCURRENCY, BatchRunner
+from simple_pipeline.pipeline import SimplePipelineBuilder
+
+load_dotenv()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the questions of a JSONL file through the simple pipeline.")
+    parser.add_argument("input", help="The JSONL file with the questions.")
+    parser.add_argument("output", help="The JSONL file the answers are written to.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum requests in flight.")
+    parser.add_argument("--rate", type=float, default=None, help="Maximum requests started per second.")
+    parser.add_argument("--checkpoint", default=None, help="The checkpoint file. Defaults to <output>.checkpoint.")
+    parser.add_argument("--model", default=os.getenv("SIMPLE_PIPELINE_LANGUAGE_MODEL"), help="The language model.")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        SimplePipelineBuilder(),
+        {"model_name": args.model},
+        concurrency=args.concurrency,
+        requests_per_second=args.rate,
+    )
+    summary = await runner.run(args.input, args.output, args.checkpoint or f"{args.output}.checkpoint")
+    print(
+        f"Processed {summary.processed} requests ({summary.failed} failed) in {summary.duration:.1f} s, "
+        f"skipped {summary.skipped} requests of a previous run."
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Cache of compiled ReAct agent graphs for the MCP pipeline.
+
+Compiling the agent graph is done once per (model, credentials, tool catalog version) and the result is reused by
+every request. A graph is only rebuilt when the tool catalog changes or when the language model factory returns a
+different chat model, e.g. after the API key was rotated.
+"""
+
+from typing import Any, Callable
+
+from langchain_core.language_models import BaseLanguageModel
+from langgraph.prebuilt import create_react_agent
+
+from mcp_pipeline.tool_catalog import ToolCatalogSnapshot
+from mcp_pipeline.tool_executor import ParallelToolExecutor
+
+AGENT_NAME = "HelloAgent"
+
+
+class AgentGraphCache:
+    """Builds and caches one compiled agent graph per model and tool catalog version.
+
+    Attributes:
+        prompt (str): The system prompt of the agent.
+        language_model_factory (Callable[[str, str], BaseLanguageModel]): Returns the chat model of a model name and
+            the name of the environment variable holding its API key. It is called on every lookup, so it should
+            return a shared instance rather than create a new one.
+        tool_executor (ParallelToolExecutor): Wraps the tools with concurrency limits, timeouts and call budgets.
+    """
+
+    def __init__(
+        self,
+        prompt: str,
+        language_model_factory: Callable[[str, str], BaseLanguageModel],
+        tool_executor: ParallelToolExecutor,
+    ):
+        self.prompt = prompt
+        self.language_model_factory = language_model_factory
+        self.tool_executor = tool_executor
+        self._graphs: dict[tuple[str, str, str], tuple[str, BaseLanguageModel, Any]] = {}
+
+    def get(self, model: str, api_key_env: str, tool_snapshot: ToolCatalogSnapshot) -> Any:
+        """Return the compiled agent graph for a model and tool snapshot, compiling it on first use.
+
+        Args:
+            model (str): The model name, e.g. `openai/gpt-4.1`.
+            api_key_env (str): The name of the environment variable holding the API key of the model.
+            tool_snapshot (ToolCatalogSnapshot): The tools the agent can call.
+
+        Returns:
+            Any: The compiled agent graph.
+        """
+        language_model = self.language_model_factory(model, api_key_env)
+        graph_key = (model, api_key_env, tool_snapshot.server_url)
+        cached = self._graphs.get(graph_key)
+        if cached is not None and cached[0] == tool_snapshot.version and cached[1] is language_model:
+            return cached[2]
+
+        graph = create_react_agent(
+            name=AGENT_NAME,
+            prompt=self.prompt,
+            model=language_model,
+            tools=self.tool_executor.wrap(list(tool_snapshot.tools), tool_snapshot.server_url),
+        )
+        # Graphs compiled for an older catalog version or model are replaced rather than kept around.
+        self._graphs[graph_key] = (tool_snapshot.version, language_model, graph)
+        return graph
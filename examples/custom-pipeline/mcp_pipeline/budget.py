@@ -0,0 +1,192 @@
+"""Per-request budgets for the MCP agent.
+
+A runaway agent loop can keep calling tools and the model long after a useful answer could have been given. A
+`RequestBudget` bounds one request by total wall-clock time, per-tool timeout, number of tool calls, cumulative prompt
+and completion tokens and total size of the tool results. When a limit is exhausted, the request stops and the
+partial answer is returned.
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+
+DEFAULT_MAX_WALL_CLOCK_SECONDS = 120.0
+DEFAULT_TOOL_TIMEOUT_SECONDS = 60.0
+
+
+class BudgetExceededException(Exception):
+    """Exception raised when a request has exhausted one of its budgets.
+
+    Attributes:
+        notice (str): A message for the user explaining why the answer may be incomplete.
+    """
+
+    notice = "We've reached the limits of what we can do for this request."
+
+
+class MaximumToolCallsException(BudgetExceededException):
+    """Exception raised when the maximum number of tool calls is reached."""
+
+    notice = "We've reached the maximum number of tool calls."
+
+
+class WallClockBudgetExceededException(BudgetExceededException):
+    """Exception raised when a request runs longer than its wall-clock budget."""
+
+    notice = "We've run out of time for this request."
+
+
+class TokenBudgetExceededException(BudgetExceededException):
+    """Exception raised when a request uses more prompt or completion tokens than its budget."""
+
+    notice = "We've reached the maximum number of tokens for this request."
+
+
+class ToolResultBudgetExceededException(BudgetExceededException):
+    """Exception raised when the tool results of a request exceed their size budget."""
+
+    notice = "We've reached the maximum amount of tool results for this request."
+
+
+def _get_optional_env(name: str, cast: type, default: float | None = None) -> float | None:
+    value = os.getenv(name)
+    return cast(value) if value else default
+
+
+@dataclass(frozen=True)
+class BudgetLimits:
+    """The limits of one request. A limit of None means unlimited.
+
+    Attributes:
+        max_tool_calls (int): The maximum number of tool calls.
+        max_wall_clock_seconds (float | None): The maximum duration of the request.
+        tool_timeout_seconds (float | None): The maximum duration of a single tool call.
+        max_prompt_tokens (int | None): The maximum number of prompt tokens summed over all model calls.
+        max_completion_tokens (int | None): The maximum number of completion tokens summed over all model calls.
+        max_tool_result_bytes (int | None): The maximum size of all tool results together.
+    """
+
+    max_tool_calls: int = 10
+    max_wall_clock_seconds: float | None = DEFAULT_MAX_WALL_CLOCK_SECONDS
+    tool_timeout_seconds: float | None = DEFAULT_TOOL_TIMEOUT_SECONDS
+    max_prompt_tokens: int | None = None
+    max_completion_tokens: int | None = None
+    max_tool_result_bytes: int | None = None
+
+    @classmethod
+    def from_env(cls, max_tool_calls: int) -> "BudgetLimits":
+        """Read the limits from the environment.
+
+        Args:
+            max_tool_calls (int): The maximum number of tool calls.
+
+        Returns:
+            BudgetLimits: The configured limits.
+        """
+        return cls(
+            max_tool_calls=max_tool_calls,
+            max_wall_clock_seconds=_get_optional_env(
+                "MCP_MAX_WALL_CLOCK_SECONDS", float, DEFAULT_MAX_WALL_CLOCK_SECONDS
+            ),
+            tool_timeout_seconds=_get_optional_env("MCP_TOOL_TIMEOUT", float, DEFAULT_TOOL_TIMEOUT_SECONDS),
+            max_prompt_tokens=_get_optional_env("MCP_MAX_PROMPT_TOKENS", int),
+            max_completion_tokens=_get_optional_env("MCP_MAX_COMPLETION_TOKENS", int),
+            max_tool_result_bytes=_get_optional_env("MCP_MAX_TOOL_RESULT_BYTES", int),
+        )
+
+
+@dataclass
+class RequestBudget:
+    """Tracks the consumption of one request against its limits.
+
+    Attributes:
+        limits (BudgetLimits): The limits of the request.
+        tool_call_count (int): The number of tool calls started so far.
+        skipped_tool_calls (int): The number of tool calls refused because the budget was spent.
+        prompt_tokens (int): The prompt tokens used so far.
+        completion_tokens (int): The completion tokens used so far.
+        tool_result_bytes (int): The size of the tool results received so far.
+    """
+
+    limits: BudgetLimits
+    tool_call_count: int = 0
+    skipped_tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tool_result_bytes: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def remaining_seconds(self) -> float | None:
+        """The wall-clock time left, or None if unlimited."""
+        if self.limits.max_wall_clock_seconds is None:
+            return None
+        return max(0.0, self.limits.max_wall_clock_seconds - (time.monotonic() - self.started_at))
+
+    def get_tool_timeout(self) -> float | None:
+        """Return the timeout of the next tool call, which never outlives the request.
+
+        Returns:
+            float | None: The timeout in seconds, or None if unlimited.
+        """
+        timeouts = [t for t in (self.limits.tool_timeout_seconds, self.remaining_seconds) if t is not None]
+        return min(timeouts) if timeouts else None
+
+    def reserve_tool_call(self) -> bool:
+        """Count a tool call against the budget.
+
+        Returns:
+            bool: True if the call may run, False if the budget is already spent.
+        """
+        if self.get_exceeded() is not None:
+            self.skipped_tool_calls += 1
+            return False
+        self.tool_call_count += 1
+        return True
+
+    def record_tool_result(self, size: int) -> None:
+        """Add the size of a tool result to the budget.
+
+        Args:
+            size (int): The size of the result in bytes.
+        """
+        self.tool_result_bytes += size
+
+    def record_token_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Set the tokens used so far by the model calls of the request.
+
+        Args:
+            prompt_tokens (int): The cumulative prompt tokens.
+            completion_tokens (int): The cumulative completion tokens.
+        """
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def get_exceeded(self) -> type[BudgetExceededException] | None:
+        """Return the exception matching the first exhausted limit, if any.
+
+        Returns:
+            type[BudgetExceededException] | None: The exception type, or None while the budget lasts.
+        """
+        limits = self.limits
+        if self.tool_call_count >= limits.max_tool_calls:
+            return MaximumToolCallsException
+        if self.remaining_seconds == 0:
+            return WallClockBudgetExceededException
+        if limits.max_prompt_tokens is not None and self.prompt_tokens >= limits.max_prompt_tokens:
+            return TokenBudgetExceededException
+        if limits.max_completion_tokens is not None and self.completion_tokens >= limits.max_completion_tokens:
+            return TokenBudgetExceededException
+        if limits.max_tool_result_bytes is not None and self.tool_result_bytes >= limits.max_tool_result_bytes:
+            return ToolResultBudgetExceededException
+        return None
+
+    def check(self) -> None:
+        """Raise if any limit is exhausted.
+
+        Raises:
+            BudgetExceededException: The subclass matching the first exhausted limit.
+        """
+        exceeded = self.get_exceeded()
+        if exceeded is not None:
+            raise exceeded(f"{exceeded.__name__}: {self}")
@@ -0,0 +1,244 @@
+"""Per-tool-call instrumentation for the MCP pipeline.
+
+`ToolCallInstrumentation` is a LangChain callback handler attached to every agent run. It observes the real start and
+end of each tool execution, emits the matching "running" and "finished" process events and records the call in
+`ToolCallMetrics`, a process-wide aggregate that can be scraped as a dictionary or in the Prometheus text format.
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+from urllib.parse import urlparse
+from uuid import UUID
+
+from gllm_core.constants import EventLevel, EventType
+from gllm_core.event import EventEmitter
+from langchain_core.callbacks import AsyncCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+_METRIC_NAMES = (
+    "calls",
+    "errors",
+    "duration_seconds_total",
+    "duration_seconds_max",
+    "input_bytes_total",
+    "output_bytes_total",
+)
+
+
+@dataclass(frozen=True)
+class ToolCallRecord:
+    """The measurements of one tool call.
+
+    Attributes:
+        tool_name (str): The name of the tool.
+        server (str): The MCP server the tool belongs to.
+        tool_call_id (str | None): The ID of the tool call requested by the model.
+        started_at (float): The Unix timestamp at which the tool started.
+        duration (float): The wall-clock duration of the call in seconds.
+        input_bytes (int): The size of the tool arguments in bytes.
+        output_bytes (int): The size of the tool result in bytes.
+        error (str | None): The error raised by the tool, if any.
+    """
+
+    tool_name: str
+    server: str
+    tool_call_id: str | None
+    started_at: float
+    duration: float
+    input_bytes: int
+    output_bytes: int
+    error: str | None = None
+
+
+class ToolCallMetrics:
+    """Aggregates tool call records per server and tool."""
+
+    def __init__(self):
+        self._stats: dict[tuple[str, str], dict[str, float]] = {}
+        self._listeners: list[Callable[[ToolCallRecord], None]] = []
+
+    def add_listener(self, listener: Callable[[ToolCallRecord], None]) -> None:
+        """Register a callback invoked with every recorded tool call.
+
+        Args:
+            listener (Callable[[ToolCallRecord], None]): The callback to register.
+        """
+        self._listeners.append(listener)
+
+    def record(self, record: ToolCallRecord) -> None:
+        """Add a tool call to the aggregates and forward it to the listeners.
+
+        Args:
+            record (ToolCallRecord): The tool call to record.
+        """
+        stats = self._stats.setdefault(
+            (record.server, record.tool_name),
+            dict.fromkeys(_METRIC_NAMES, 0),
+        )
+        stats["calls"] += 1
+        stats["errors"] += 1 if record.error else 0
+        stats["duration_seconds_total"] += record.duration
+        stats["duration_seconds_max"] = max(stats["duration_seconds_max"], record.duration)
+        stats["input_bytes_total"] += record.input_bytes
+        stats["output_bytes_total"] += record.output_bytes
+
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logger.warning("Tool call metrics listener failed: %s", e)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Return the aggregates of every tool seen so far.
+
+        Returns:
+            list[dict[str, Any]]: One entry per server and tool.
+        """
+        return [
+            {"server": server, "tool": tool_name, **stats}
+            for (server, tool_name), stats in sorted(self._stats.items())
+        ]
+
+    def to_prometheus(self) -> str:
+        """Render the aggregates in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        lines = []
+        for name in _METRIC_NAMES:
+            metric = f"mcp_tool_{name}"
+            lines.append(f"# TYPE {metric} {'gauge' if name.endswith('_max') else 'counter'}")
+            for entry in self.snapshot():
+                lines.append(f'{metric}{{server="{entry["server"]}",tool="{entry["tool"]}"}} {entry[name]}')
+        return "\n".join(lines) + "\n"
+
+
+class ToolCallInstrumentation(AsyncCallbackHandler):
+    """Callback handler that times every tool call of one agent run.
+
+    Attributes:
+        event_emitter (EventEmitter | None): The emitter of the request, if any.
+        start_time (float): The Unix timestamp at which the request started.
+        tool_servers (dict[str, str]): Maps tool names to the MCP server they belong to.
+        metrics (ToolCallMetrics): The aggregate the tool calls are recorded in.
+    """
+
+    def __init__(
+        self,
+        event_emitter: EventEmitter | None,
+        start_time: float,
+        tool_servers: dict[str, str],
+        metrics: ToolCallMetrics,
+    ):
+        self.event_emitter = event_emitter
+        self.start_time = start_time
+        self.tool_servers = tool_servers
+        self.metrics = metrics
+        self.records: list[ToolCallRecord] = []
+        self._running: dict[UUID, tuple[str, float, float, int]] = {}
+
+    async def on_tool_start(
+        self,
+        serialized: dict[str, Any] | None,
+        input_str: str,
+        *,
+        run_id: UUID,
+        inputs: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Record the start of a tool call and emit its "running" event."""
+        tool_name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        payload = json.dumps(inputs, default=str) if inputs is not None else input_str
+        self._running[run_id] = (tool_name, time.time(), time.perf_counter(), len(payload.encode()))
+        await self._emit_process_event(run_id, tool_name, "running")
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Record the end of a tool call and emit its "finished" event."""
+        await self._finish(run_id, output, error=None)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Record a failed tool call and emit its "finished" event."""
+        await self._finish(run_id, None, error=error)
+
+    async def _finish(self, run_id: UUID, output: Any, error: BaseException | None) -> None:
+        running = self._running.pop(run_id, None)
+        if running is None:
+            return
+        tool_name, started_at, started_counter, input_bytes = running
+        content = getattr(output, "content", output)
+        error_message = f"{type(error).__name__}: {error}" if error else None
+        if error_message is None and getattr(output, "status", None) == "error":
+            # Tools with `handle_tool_error` turn a `ToolException` into an error `ToolMessage`, and LangChain then
+            # reports it through `on_tool_end` instead of `on_tool_error`.
+            error_message = f"ToolException: {content}"
+        record = ToolCallRecord(
+            tool_name=tool_name,
+            server=self.tool_servers.get(tool_name, "unknown"),
+            tool_call_id=getattr(output, "tool_call_id", None),
+            started_at=started_at,
+            duration=time.perf_counter() - started_counter,
+            input_bytes=input_bytes,
+            output_bytes=len(str(content).encode()) if content is not None else 0,
+            error=error_message,
+        )
+        self.records.append(record)
+        self.metrics.record(record)
+        await self._emit_process_event(run_id, tool_name, "finished", record)
+
+    async def _emit_process_event(
+        self, run_id: UUID, tool_name: str, status: str, record: ToolCallRecord | None = None
+    ) -> None:
+        if not self.event_emitter:
+            return
+        data_value = {
+            "id": str(run_id),
+            "message": f"Called tool `{tool_name}`",
+            "status": status,
+            "time": round(time.time() - self.start_time, 2),
+        }
+        if record is not None:
+            data_value.update({
+                "duration": round(record.duration, 3),
+                "server": record.server,
+                "input_bytes": record.input_bytes,
+                "output_bytes": record.output_bytes,
+                "error": record.error,
+            })
+        await self.event_emitter.emit(
+            json.dumps({"data_type": "process", "data_value": data_value}),
+            event_level=EventLevel.INFO,
+            event_type=EventType.DATA,
+        )
+
+
+def get_server_label(server_url: str) -> str:
+    """Return a label identifying an MCP server without leaking credentials in its URL.
+
+    Args:
+        server_url (str): The MCP server URL.
+
+    Returns:
+        str: The host and port of the server.
+    """
+    parsed = urlparse(server_url)
+    if not parsed.hostname:
+        return server_url or "unknown"
+    return f"{parsed.hostname}:{parsed.port}" if parsed.port else parsed.hostname
+
+
+_tool_call_metrics = ToolCallMetrics()
+
+
+def get_tool_call_metrics() -> ToolCallMetrics:
+    """Return the process-wide tool call metrics.
+
+    Returns:
+        ToolCallMetrics: The shared metrics aggregate.
+    """
+    return _tool_call_metrics
+
@@ -1,12 +1,23 @@
+"""Simple pipeline utilizing MCP.
+
+Authors:
+    Samuel Lusandi (samuel.lusandi@gdplabs.id)
+"""
 from typing import Any
 
+MCP_SERVER_NAME = "gdp"
+
+
+def get_mcp_connection(server_url: str) -> dict[str, Any]:
+    return {
+        "url": server_url,
+        "transport": "sse",
+    }
+
 
 def get_mcp_servers(server_url: str) -> dict[str, Any]:
     mcp_servers = {
-        "gdp": {
-            "url": server_url,
-            "transport": "sse",
-        },
+        MCP_SERVER_NAME: get_mcp_connection(server_url),
     }
 
     return mcp_servers
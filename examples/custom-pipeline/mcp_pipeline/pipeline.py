@@ -4,14 +4,15 @@ Authors:
     Samuel Lusandi (samuel.lusandi@gdplabs.id)
 """
 
-import json
-import uuid
+import asyncio
 import os
 import time
+from contextlib import aclosing
 from enum import StrEnum
+from pathlib import Path
 
 from dotenv import load_dotenv
-from typing import Any, TypedDict
+from typing import Any, Callable, TypedDict
 
 from mcp_pipeline.preset_config import McpPresetConfig
 
@@ -26,22 +27,69 @@ from gllm_core.constants import EventLevel, EventType
 from gllm_inference.schema import PromptRole as PromptRole
 from gllm_generation.response_synthesizer.response_synthesizer import BaseResponseSynthesizer
 
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import ChatOpenAI
 from langchain_core.language_models import BaseLanguageModel
-from langgraph.prebuilt import create_react_agent
 
-from mcp_pipeline.mcp_config import get_mcp_servers
+from mcp_pipeline.agent_graph import AgentGraphCache
+from mcp_pipeline.budget import (
+    BudgetExceededException,
+    BudgetLimits,
+    MaximumToolCallsException,
+    RequestBudget,
+    WallClockBudgetExceededException,
+)
+from mcp_pipeline.instrumentation import ToolCallInstrumentation, get_server_label, get_tool_call_metrics
+from mcp_pipeline.response_cache import (
+    BaseResponseCache,
+    ResponseTtlPolicy,
+    compute_response_cache_key,
+    get_response_cache,
+    get_response_ttl_policy,
+)
+from mcp_pipeline.stream_processor import AgentStreamProcessor
+from mcp_pipeline.token_streamer import TokenStreamer
+from mcp_pipeline.tool_executor import get_tool_executor
+from mcp_pipeline.tool_catalog import McpToolCatalog, get_tool_catalog
+from pipeline_common.build_cache import PipelineBuildCache, get_build_cache_max_entries, warm_up
+from pipeline_common.model_routing import get_language_model_from_env
 
 load_dotenv(override=True)
 
-def get_language_model(model: str, key: str) -> BaseLanguageModel:
-    provider = model.split("/")[0]
-    model_name = model.split("/")[1]
-    if provider == "openai":
-        return ChatOpenAI(model=model_name, api_key=key)
-    else:
-        raise ValueError(f"Unsupported model: {model}")
+CONFIG_PATH = Path(__file__).parent / "config.yaml"
+BUILD_CONFIG_KEYS = ("model_name", "api_key", "mcp_server_url", "stream_tokens")
+
+SYSTEM_PROMPT = """You are a helpful assistant that can utilize all tools given to you to solve the user's input.
+
+            When there is anything related to relative time, you *must* call the get_current_time tool. Otherwise you will not be able to 
+            provide an accurate response. The timezone *must* be UTC+7 Asia/Jakarta.
+
+            Here are a few things you need to do for specific tasks:
+            
+            Regarding Slack:
+            - Ping specific user on slack: You must first find the user's slack ID and then ping them using the format <@user_id>
+            - Reminder the following when you use IDs:
+                * IDs prefixed with `T` indicate Teams/Organizations (T*******)
+                * IDs prefixed with `U` indicate Users (U*******)
+                * IDs prefixed with `C` indicate Channels (C*******)
+                * IDs prefixed with `D` indicate Direct Messages (D*******)
+            - Regarding sending a message to slack channel: If a user specifies a channel, and IF the channel cannot be found, do not give up yet;
+              it is likely a private channel.
+                * Try sending it directly, the slack_post_message tool will throw an error if the channel truly cannot be found.
+                * Remember to just use the name of the channel as ID directly!
+
+            Regarding Github:
+            - If the user does not specify a repository owner, you *must* assume it is `GDP-ADMIN`. (i.e., `bosa` becomes `GDP-ADMIN/bosa`)
+            - If the user does not specify a repository owner and a repository name, you do not have to proceed; simply tell the user that you need more information.
+            - Regarding issues and pull requests in github:
+                * If the result is under 1000 items, you *must* use the search endpoints (i.e., search_repositories, search_issues, etc.) because
+                  your query can become a lot more versatile, and the results will be much more accurate. You can filter by date, filter by user,
+                  etc.
+                * If the result is over 1000 items, you *must* use the list endpoints (i.e., list_repositories, list_issues, etc.) because
+                  the search endpoints will not return all the results. However, do know that this endpoint doesn't have as much query capabilities,
+                  i.e., there's no query, no filter by date, etc.
+            """
+
+def get_language_model(model: str, api_key_env: str) -> BaseLanguageModel:
+    return get_language_model_from_env(model, api_key_env)
 
 
 class SimpleState(TypedDict):
@@ -76,21 +124,33 @@ class McpPresetConfig(BasePipelinePresetConfig):
     mcp_server_url: str
 
 
-class MaximumToolCallsException(Exception):
-    """Exception raised when the maximum number of tool calls is reached."""
-    pass
-
-
 # TODO debug why this cannot be in a separate file without failing to import.
 class McpResponseSynthesizer(BaseResponseSynthesizer):
 
     MAX_TOOL_CALLS = 10
 
-    def __init__(self, model: str, key: str, mcp_server_url: str):
+    def __init__(
+        self,
+        model: str,
+        api_key_env: str,
+        mcp_server_url: str,
+        agent_graphs: AgentGraphCache,
+        tool_catalog: McpToolCatalog | None = None,
+        stream_tokens: bool = False,
+        budget_limits: BudgetLimits | None = None,
+        response_cache: BaseResponseCache | None = None,
+        response_ttl_policy: ResponseTtlPolicy | None = None,
+    ):
         super().__init__()
         self.model = model
-        self.key = key
+        self.api_key_env = api_key_env
         self.mcp_server_url = mcp_server_url
+        self.agent_graphs = agent_graphs
+        self.tool_catalog = tool_catalog or get_tool_catalog()
+        self.stream_tokens = stream_tokens
+        self.budget_limits = budget_limits or BudgetLimits.from_env(max_tool_calls=self.MAX_TOOL_CALLS)
+        self.response_cache = response_cache
+        self.response_ttl_policy = response_ttl_policy or get_response_ttl_policy()
 
     async def synthesize_response(
         self,
@@ -127,124 +187,90 @@ class McpResponseSynthesizer(BaseResponseSynthesizer):
             NotImplementedError: If the method is not implemented in a subclass.
         """
         start_time = time.time()
-        client = MultiServerMCPClient(get_mcp_servers(self.mcp_server_url))
-        tools = await client.get_tools()
-        for tool in tools:
-            tool.name = tool.name.replace("::", "__")
-
-        model = self.model
-        key = self.key
-
-        agent = create_react_agent(
-            name="HelloAgent",
-            prompt=f"""You are a helpful assistant that can utilize all tools given to you to solve the user's input.
-
-            When there is anything related to relative time, you *must* call the get_current_time tool. Otherwise you will not be able to 
-            provide an accurate response. The timezone *must* be UTC+7 Asia/Jakarta.
-
-            Here are a few things you need to do for specific tasks:
-            
-            Regarding Slack:
-            - Ping specific user on slack: You must first find the user's slack ID and then ping them using the format <@user_id>
-            - Reminder the following when you use IDs:
-                * IDs prefixed with `T` indicate Teams/Organizations (T*******)
-                * IDs prefixed with `U` indicate Users (U*******)
-                * IDs prefixed with `C` indicate Channels (C*******)
-                * IDs prefixed with `D` indicate Direct Messages (D*******)
-            - Regarding sending a message to slack channel: If a user specifies a channel, and IF the channel cannot be found, do not give up yet;
-              it is likely a private channel.
-                * Try sending it directly, the slack_post_message tool will throw an error if the channel truly cannot be found.
-                * Remember to just use the name of the channel as ID directly!
-
-            Regarding Github:
-            - If the user does not specify a repository owner, you *must* assume it is `GDP-ADMIN`. (i.e., `bosa` becomes `GDP-ADMIN/bosa`)
-            - If the user does not specify a repository owner and a repository name, you do not have to proceed; simply tell the user that you need more information.
-            - Regarding issues and pull requests in github:
-                * If the result is under 1000 items, you *must* use the search endpoints (i.e., search_repositories, search_issues, etc.) because
-                  your query can become a lot more versatile, and the results will be much more accurate. You can filter by date, filter by user,
-                  etc.
-                * If the result is over 1000 items, you *must* use the list endpoints (i.e., list_repositories, list_issues, etc.) because
-                  the search endpoints will not return all the results. However, do know that this endpoint doesn't have as much query capabilities,
-                  i.e., there's no query, no filter by date, etc.
-            """,
-            model=get_language_model(model, key),
-            tools=tools,
+        tool_snapshot = await self.tool_catalog.get_snapshot(self.mcp_server_url)
+
+        cache_key = None
+        if self.response_cache and query:
+            cache_key = compute_response_cache_key(
+                query, self.model, self.agent_graphs.prompt, self.mcp_server_url, tool_snapshot.version
+            )
+            cached_response = await self.response_cache.get(cache_key)
+            if cached_response is not None:
+                if event_emitter:
+                    await event_emitter.emit(cached_response, event_level=EventLevel.INFO, event_type=EventType.RESPONSE)
+                return cached_response
+
+        agent = self.agent_graphs.get(self.model, self.api_key_env, tool_snapshot)
+
+        stream_processor = AgentStreamProcessor()
+        server_label = get_server_label(self.mcp_server_url)
+        instrumentation = ToolCallInstrumentation(
+            event_emitter=event_emitter,
+            start_time=start_time,
+            tool_servers={tool.name: server_label for tool in tool_snapshot.tools},
+            metrics=get_tool_call_metrics(),
         )
-
-        final_response = ""
-        processed_tool_ids = set()
-
-        tool_call_count = 0
-        message_prefix = ""
+        token_streamer = TokenStreamer(event_emitter) if event_emitter and self.stream_tokens else None
+        stream_mode = ["updates", "messages"] if token_streamer else ["updates"]
+        budget = RequestBudget(self.budget_limits)
+        tool_names: set[str] = set()
+        notice = ""
         try:
-            async for chunk in agent.astream({"messages": query}, stream_mode="values"):
-                if isinstance(chunk, dict) and 'messages' in chunk:
-                    messages = chunk['messages']
-
-                    for message in messages:
-                        if hasattr(message, 'additional_kwargs') and 'tool_calls' in message.additional_kwargs:
-                            tool_calls = message.additional_kwargs['tool_calls']
-                            for tool_call in tool_calls:
-                                if tool_call['id'] not in processed_tool_ids:
-                                    processed_tool_ids.add(tool_call['id'])
-                                    tool_call_count += 1
-
-                                    tool_info = f"Called tool `{tool_call['function']['name']}`"
-
-                                    step_id = str(uuid.uuid4())
-                                    tool_running_data = {
-                                        "data_type": "process",
-                                        "data_value": {
-                                            "id": step_id,
-                                            "message": tool_info,
-                                            "status": "running",
-                                            "time": round(time.time() - start_time, 2)
-                                        },
-                                    }
-                                    tool_finished_data = {
-                                        "data_type": "process",
-                                        "data_value": {
-                                            "id": step_id,
-                                            "message": tool_info,
-                                            "status": "finished",
-                                            "time": round(time.time() - start_time, 2)
-                                        },
-                                    }
-
-                                    if event_emitter:
-                                        await event_emitter.emit(
-                                            json.dumps(tool_running_data),
-                                            event_level=EventLevel.INFO,
-                                            event_type=EventType.DATA
-                                        )
-                                        await event_emitter.emit(
-                                            json.dumps(tool_finished_data),
-                                            event_level=EventLevel.INFO,
-                                            event_type=EventType.DATA
-                                        )
-                                    
-                                    if tool_call_count >= self.MAX_TOOL_CALLS:
-                                        raise MaximumToolCallsException("Maximum tool calls reached")
-        except MaximumToolCallsException as e:
-            print(f"Error during tool calls: {e}")
-            message_prefix = "We've reached the maximum number of tool calls. This is what we have so far:\n\n"
+            # Leaving the stream early closes it, which cancels the model and tool calls that are still running.
+            async with asyncio.timeout(budget.remaining_seconds):
+                with self.agent_graphs.tool_executor.execution(budget):
+                    async with aclosing(agent.astream(
+                        {"messages": query}, config={"callbacks": [instrumentation]}, stream_mode=stream_mode
+                    )) as stream:
+                        async for mode, chunk in stream:
+                            if mode == "messages":
+                                message_chunk, metadata = chunk
+                                if metadata.get("langgraph_node") != "agent":
+                                    continue
+                                token_streamer.start_turn(metadata.get("langgraph_step", message_chunk.id))
+                                if getattr(message_chunk, "tool_call_chunks", None):
+                                    # Text of a turn that calls tools is a preamble, not the answer.
+                                    token_streamer.discard_turn()
+                                elif isinstance(message_chunk.content, str):
+                                    token_streamer.push(message_chunk.content)
+                                continue
+
+                            tool_names.update(call["name"] for call in stream_processor.process_update(chunk))
+                            budget.record_token_usage(stream_processor.prompt_tokens, stream_processor.completion_tokens)
+                            budget.check()
+            if token_streamer:
+                await token_streamer.aclose()
+        except TimeoutError as e:
+            print(f"Request budget exhausted: {WallClockBudgetExceededException.__name__}: {e}")
+            notice = WallClockBudgetExceededException.notice
+        except BudgetExceededException as e:
+            print(f"Request budget exhausted: {e}")
+            notice = e.notice
         except Exception as e:
             print(f"Error during tool calls: {e}")
-            message_prefix = "An error occurred while processing your request. This is what we have so far:\n\n"
-
-        if 'messages' in chunk:
-            messages = chunk['messages']
-            last_ai_message = next((msg for msg in reversed(messages) 
-                                   if hasattr(msg, 'content') and msg.content), None)
-            final_response = message_prefix + (last_ai_message.content if last_ai_message else "No response generated")
-
-            if event_emitter and final_response:
-                await event_emitter.emit(
-                    final_response, 
-                    event_level=EventLevel.INFO, 
-                    event_type=EventType.RESPONSE
-                )
-        
+            notice = "An error occurred while processing your request."
+        finally:
+            # Closed above only on success. A failed or cancelled request must not keep emitting deltas after it ends.
+            if token_streamer:
+                token_streamer.cancel()
+
+        message_prefix = f"{notice} This is what we have so far:\n\n" if notice else ""
+        final_response = message_prefix + (stream_processor.final_content or "No response generated")
+
+        # Only complete answers are cached, partial ones would hide the problem from the next identical question.
+        if cache_key and not notice and stream_processor.final_content:
+            ttl = self.response_ttl_policy.get_ttl(tool_names)
+            if ttl > 0:
+                await self.response_cache.set(cache_key, final_response, ttl)
+
+        # The complete answer is always sent as one response event, the streamed deltas are only a preview of it.
+        if event_emitter and final_response:
+            await event_emitter.emit(
+                final_response,
+                event_level=EventLevel.INFO,
+                event_type=EventType.RESPONSE
+            )
+
         return final_response
 
 
@@ -260,8 +286,25 @@ class McpPipelineBuilderPlugin(PipelineBuilderPlugin):
     name = "mcp-pipeline"
     preset_config_class = McpPresetConfig
 
+    def __init__(self, language_model_factory: Callable[[str, str], BaseLanguageModel] = get_language_model):
+        """Initialize the MCP pipeline builder.
+
+        Args:
+            language_model_factory (Callable[[str, str], BaseLanguageModel], optional): Creates the chat model of the
+                agent from a model name and the name of the environment variable holding its API key. Defaults to
+                `get_language_model`, which shares one client per model across requests and builds.
+        """
+        super().__init__()
+        self.agent_graphs = AgentGraphCache(
+            prompt=SYSTEM_PROMPT,
+            language_model_factory=language_model_factory,
+            tool_executor=get_tool_executor(),
+        )
+        self.response_cache = get_response_cache()
+        self.build_cache = PipelineBuildCache(max_entries=get_build_cache_max_entries())
+
     async def build(self, pipeline_config: dict[str, Any]) -> Pipeline:
-        """Build the pipeline.
+        """Build the pipeline, or return the cached pipeline of the same config and environment.
 
         Args:
             pipeline_config (dict[str, Any]): The pipeline configuration.
@@ -269,14 +312,65 @@ class McpPipelineBuilderPlugin(PipelineBuilderPlugin):
         Returns:
             Pipeline: The simple pipeline.
         """
+        return await self.build_cache.get_or_build(
+            pipeline_config, self._get_build_env_names(pipeline_config), self._build, config_keys=BUILD_CONFIG_KEYS
+        )
+
+    async def warm_up(self) -> int:
+        """Build the pipeline of every preset and supported model in `config.yaml`.
+
+        Returns:
+            int: The number of pipelines built.
+        """
+        return await warm_up(self, CONFIG_PATH)
+
+    def invalidate(self, pipeline_config: dict[str, Any] | None = None) -> None:
+        """Drop the cached pipeline of a config, or every cached pipeline, so that the next build reconstructs it.
+
+        Args:
+            pipeline_config (dict[str, Any] | None, optional): The config whose pipeline is dropped. Defaults to None,
+                which drops every pipeline.
+        """
+        env_names = self._get_build_env_names(pipeline_config) if pipeline_config is not None else ()
+        self.build_cache.invalidate(pipeline_config, env_names, config_keys=BUILD_CONFIG_KEYS)
+
+    def _get_build_env_names(self, pipeline_config: dict[str, Any]) -> list[str]:
+        # Every MCP_* variable is included, since the synthesizer reads its limits and caches from them at build time.
+        return [
+            "LANGUAGE_MODEL",
+            "LANGUAGE_MODEL_FALLBACKS",
+            "LANGUAGE_MODEL_HEDGE_AFTER",
+            pipeline_config.get("api_key") or "LLM_API_KEY",
+            pipeline_config.get("mcp_server_url") or "MCP_SERVER_URL",
+            *(name for name in os.environ if name.startswith("MCP_")),
+        ]
+
+    async def _build(self, pipeline_config: dict[str, Any]) -> Pipeline:
         model = str(pipeline_config["model_name"]) if "model_name" in pipeline_config else os.getenv("LANGUAGE_MODEL", "openai/gpt-4.1")
-        key = os.getenv(pipeline_config["api_key"]) if "api_key" in pipeline_config else os.getenv("LLM_API_KEY", "")
+        api_key_env = pipeline_config.get("api_key") or "LLM_API_KEY"
         
         mcp_server_url_key = pipeline_config.get("mcp_server_url") or "MCP_SERVER_URL"
         mcp_server_url = os.getenv(mcp_server_url_key, "")
+        stream_tokens = str(pipeline_config.get("stream_tokens", os.getenv("MCP_STREAM_TOKENS", "false"))).lower() == "true"
+
+        tool_catalog = get_tool_catalog()
+        try:
+            # Precompile the agent so that the first request does not pay for tool discovery or graph compilation.
+            tool_snapshot = await tool_catalog.get_snapshot(mcp_server_url)
+            self.agent_graphs.get(model, api_key_env, tool_snapshot)
+        except Exception as e:
+            print(f"Could not precompile the MCP agent, it will be compiled on the first request: {e}")
 
         response_synthesizer_step = step(
-            component=McpResponseSynthesizer(model=model, key=key, mcp_server_url=mcp_server_url),
+            component=McpResponseSynthesizer(
+                model=model,
+                api_key_env=api_key_env,
+                mcp_server_url=mcp_server_url,
+                agent_graphs=self.agent_graphs,
+                tool_catalog=tool_catalog,
+                stream_tokens=stream_tokens,
+                response_cache=self.response_cache,
+            ),
             input_state_map={
                 "query": SimpleStateKeys.QUERY,
             },
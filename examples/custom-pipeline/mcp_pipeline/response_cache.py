@@ -0,0 +1,279 @@
+"""Optional cache of final MCP agent answers.
+
+Answers are keyed on the normalized query, the model, the system prompt and the version of the tool catalog, so a
+change to any of them results in a miss. How long an answer is kept depends on the tools the agent called to produce
+it. Only an allow-list of read-only tools may contribute to a cached answer: answers built from them expire quickly,
+and answers that used any other tool are never cached, since the tool may have side effects, such as posting a
+message, that a hit would skip.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from fnmatch import fnmatch
+from typing import Iterable
+
+DEFAULT_RESPONSE_CACHE_TTL = 300.0
+DEFAULT_RESPONSE_CACHE_MAX_ENTRIES = 1024
+DEFAULT_RESPONSE_CACHE_PATH = ".mcp_response_cache.sqlite3"
+
+# Patterns of read-only tools, matched against tool names in order; the first match wins. Tools that match no pattern
+# are treated as having side effects, and a TTL of 0 disables caching as well. The cache key has no user component, so
+# only tools whose results are the same for every caller are listed, not e.g. `get_me` or searches that depend on the
+# caller's permissions.
+DEFAULT_TOOL_TTL_HINTS: dict[str, float] = {
+    "slack_get_user_profile": 60,
+    "slack_get_users": 60,
+    "slack_list_channels": 60,
+    "get_file_contents": 60,
+    "get_issue": 60,
+    "get_pull_request": 60,
+}
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that trivially different spellings share a cache entry.
+
+    Args:
+        query (str): The user's query.
+
+    Returns:
+        str: The query in NFKC form, lower-cased, with collapsed whitespace and without trailing punctuation.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+    return normalized.rstrip(" ?!.")
+
+
+def compute_response_cache_key(
+    query: str, model: str, prompt: str, server_url: str, tools_version: str
+) -> str:
+    """Compute the cache key of an answer.
+
+    Args:
+        query (str): The user's query.
+        model (str): The model name.
+        prompt (str): The system prompt of the agent.
+        server_url (str): The MCP server the agent calls.
+        tools_version (str): The version of the server's tool catalog.
+
+    Returns:
+        str: The cache key.
+    """
+    payload = json.dumps(
+        [
+            normalize_query(query),
+            model,
+            hashlib.sha256(prompt.encode()).hexdigest(),
+            server_url,
+            tools_version,
+        ]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseTtlPolicy:
+    """Decides how long an answer is cached from the tools used to produce it.
+
+    Attributes:
+        default_ttl (float): The TTL of answers that used no tool.
+        tool_ttl_hints (dict[str, float]): TTLs keyed by the name patterns of the tools that may contribute to a
+            cached answer. Answers that used any other tool are not cached.
+    """
+
+    def __init__(self, default_ttl: float = DEFAULT_RESPONSE_CACHE_TTL, tool_ttl_hints: dict[str, float] | None = None):
+        self.default_ttl = default_ttl
+        self.tool_ttl_hints = DEFAULT_TOOL_TTL_HINTS if tool_ttl_hints is None else tool_ttl_hints
+
+    def get_ttl(self, tool_names: Iterable[str]) -> float:
+        """Return the TTL of an answer, which is the shortest TTL of the tools it used, or 0 if one is not allowed.
+
+        Args:
+            tool_names (Iterable[str]): The names of the tools called while producing the answer.
+
+        Returns:
+            float: The TTL in seconds. 0 means the answer must not be cached.
+        """
+        ttl = self.default_ttl
+        for tool_name in tool_names:
+            hint = next((hint for pattern, hint in self.tool_ttl_hints.items() if fnmatch(tool_name, pattern)), 0)
+            ttl = min(ttl, hint)
+        return ttl
+
+
+class BaseResponseCache(ABC):
+    """Stores final answers by cache key until they expire."""
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None:
+        """Return a cached answer.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str | None: The answer, or None if it is missing or expired.
+        """
+
+    @abstractmethod
+    async def set(self, key: str, response: str, ttl: float) -> None:
+        """Store an answer.
+
+        Args:
+            key (str): The cache key.
+            response (str): The answer.
+            ttl (float): Seconds before the answer expires.
+        """
+
+
+class InMemoryResponseCache(BaseResponseCache):
+    """A per-process LRU response cache.
+
+    Attributes:
+        max_entries (int): The maximum number of answers kept. The least recently used one is evicted first.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        """Return a cached answer.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str | None: The answer, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    async def set(self, key: str, response: str, ttl: float) -> None:
+        """Store an answer.
+
+        Args:
+            key (str): The cache key.
+            response (str): The answer.
+            ttl (float): Seconds before the answer expires.
+        """
+        self._entries[key] = (time.time() + ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteResponseCache(BaseResponseCache):
+    """A response cache stored in a SQLite file, shared by processes on the same host and kept across restarts.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESPONSE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    async def get(self, key: str) -> str | None:
+        """Return a cached answer.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str | None: The answer, or None if it is missing or expired.
+        """
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, response: str, ttl: float) -> None:
+        """Store an answer.
+
+        Args:
+            key (str): The cache key.
+            response (str): The answer.
+            ttl (float): Seconds before the answer expires.
+        """
+        await asyncio.to_thread(self._set, key, response, ttl)
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, response: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, now + ttl),
+            )
+
+
+def parse_tool_ttl_patterns(value: str) -> dict[str, float]:
+    """Parse comma-separated `pattern=seconds` TTLs of tool name patterns.
+
+    Args:
+        value (str): The TTLs, e.g. `get_issue=60,slack_list_*=300`.
+
+    Returns:
+        dict[str, float]: The TTLs keyed by pattern, in the order they were given.
+    """
+    hints = {}
+    for item in value.split(","):
+        if "=" in item:
+            pattern, ttl = item.rsplit("=", 1)
+            hints[pattern.strip()] = float(ttl)
+    return hints
+
+
+def get_response_cache() -> BaseResponseCache | None:
+    """Create the response cache configured by the environment.
+
+    Returns:
+        BaseResponseCache | None: The cache, or None if response caching is disabled.
+    """
+    backend = os.getenv("MCP_RESPONSE_CACHE", "").lower()
+    if backend in ("", "none", "false"):
+        return None
+    if backend == "memory":
+        return InMemoryResponseCache(
+            max_entries=int(os.getenv("MCP_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_RESPONSE_CACHE_MAX_ENTRIES))
+        )
+    if backend == "sqlite":
+        return SqliteResponseCache(path=os.getenv("MCP_RESPONSE_CACHE_PATH", DEFAULT_RESPONSE_CACHE_PATH))
+    raise ValueError(f"Unsupported response cache: {backend}")
+
+
+def get_response_ttl_policy() -> ResponseTtlPolicy:
+    """Create the TTL policy configured by the environment.
+
+    Returns:
+        ResponseTtlPolicy: The TTL policy.
+    """
+    tool_ttl_hints = os.getenv("MCP_RESPONSE_CACHE_TOOL_TTLS")
+    return ResponseTtlPolicy(
+        default_ttl=float(os.getenv("MCP_RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL)),
+        tool_ttl_hints=parse_tool_ttl_patterns(tool_ttl_hints) if tool_ttl_hints else None,
+    )
@@ -0,0 +1,415 @@
+"""Pool of long-lived MCP client sessions shared across MCP pipeline requests.
+
+Opening an MCP session costs an SSE handshake plus an `initialize` round trip. The pool keeps one session per MCP
+server URL alive between requests, health-checks it periodically, reconnects it when it breaks and evicts it once it
+has been idle for too long.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+import anyio
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession
+from mcp.types import ServerNotification, ToolListChangedNotification
+from mcp.types import Tool as McpTool
+
+from mcp_pipeline.mcp_config import MCP_SERVER_NAME, get_mcp_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 8
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+
+class _PooledSession:
+    """A single MCP session kept open by a dedicated owner task.
+
+    The MCP transports are built on anyio task groups, which must be entered and exited from the same task. The
+    owner task therefore enters the session context, publishes the session and waits until it is asked to close.
+    """
+
+    def __init__(self, server_url: str, connection: dict[str, Any]):
+        self.server_url = server_url
+        self.connection = connection
+        self.session: ClientSession | None = None
+        self.loop = asyncio.get_running_loop()
+        self.in_use = 0
+        self.broken = False
+        self.last_used = time.monotonic()
+        self.last_health_check = time.monotonic()
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._error: BaseException | None = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.session is not None and not self.broken and self._task is not None and not self._task.done()
+
+    async def open(self, timeout: float) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session:{self.server_url}")
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close(timeout)
+            raise
+        if self.session is None:
+            raise ConnectionError(f"Could not open MCP session to {self.server_url}") from self._error
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.is_alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+        except Exception as e:
+            logger.warning("Health check failed for MCP server %s: %s", self.server_url, e)
+            return False
+        self.last_health_check = time.monotonic()
+        return True
+
+    def close_soon(self) -> None:
+        """Ask the owner task to close the session from any thread, without waiting for it."""
+        try:
+            self.loop.call_soon_threadsafe(self._closing.set)
+        except RuntimeError:
+            # The loop is closed, and its tasks, the owner task included, were cancelled when it shut down.
+            pass
+
+    async def close(self, timeout: float) -> None:
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        client = MultiServerMCPClient({MCP_SERVER_NAME: self.connection})
+        try:
+            async with client.session(MCP_SERVER_NAME) as session:
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.warning("MCP session to %s terminated: %s", self.server_url, e)
+        finally:
+            self.session = None
+            self._ready.set()
+
+
+class PooledToolSession:
+    """Session-like facade that routes MCP tool calls through the pool.
+
+    Tools converted with this facade are not bound to a particular `ClientSession`, so they stay valid when the
+    pool reconnects to the server.
+    """
+
+    def __init__(self, pool: "McpSessionPool", server_url: str):
+        self._pool = pool
+        self._server_url = server_url
+
+    async def call_tool(self, name: str, arguments: dict[str, Any] | None = None, *args: Any, **kwargs: Any) -> Any:
+        for attempt in range(2):
+            async with self._pool._lease(self._server_url) as entry:
+                try:
+                    return await entry.session.call_tool(name, arguments, *args, **kwargs)
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+                    # The request never left the client, so it is safe to retry it once on a fresh session. Other
+                    # errors, e.g. a tool error or a timeout, leave the session usable.
+                    self._pool.mark_broken(entry)
+                    if attempt:
+                        raise
+
+
+class McpSessionPool:
+    """A pool of long-lived MCP sessions keyed by MCP server URL.
+
+    Attributes:
+        max_sessions (int): The maximum number of sessions open at the same time.
+        idle_timeout (float): Seconds after which an unused session is closed.
+        health_check_interval (float): Seconds between pings of a pooled session.
+        connect_timeout (float): Seconds to wait for a session to open or answer a ping.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    ):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self._sessions: OrderedDict[str, _PooledSession] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._condition: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tools_changed_listeners: list[Callable[[str], None]] = []
+        self._connected_servers: set[str] = set()
+
+    @asynccontextmanager
+    async def lease(self, server_url: str) -> AsyncIterator[ClientSession]:
+        """Borrow a healthy session for the given server, opening or reconnecting it if needed.
+
+        Args:
+            server_url (str): The MCP server URL.
+
+        Yields:
+            ClientSession: An initialized MCP client session.
+        """
+        async with self._lease(server_url) as entry:
+            yield entry.session
+
+    async def load_tools(self, server_url: str) -> list[BaseTool]:
+        """List the tools of an MCP server and convert them into LangChain tools backed by the pool.
+
+        Args:
+            server_url (str): The MCP server URL.
+
+        Returns:
+            list[BaseTool]: The tools exposed by the server.
+        """
+        async with self.lease(server_url) as session:
+            mcp_tools = await _list_all_tools(session)
+
+        tool_session = PooledToolSession(self, server_url)
+        return [convert_mcp_tool_to_langchain_tool(tool_session, tool) for tool in mcp_tools]
+
+    def subscribe_tools_changed(self, listener: Callable[[str], None]) -> None:
+        """Register a callback invoked with the server URL whenever the tools of that server may have changed.
+
+        This happens when the server sends a `notifications/tools/list_changed` message and when a session is
+        reconnected, since the server may have been redeployed in the meantime.
+
+        Args:
+            listener (Callable[[str], None]): The callback to register.
+        """
+        self._tools_changed_listeners.append(listener)
+
+    def mark_broken(self, entry: _PooledSession) -> None:
+        """Flag a leased session so that it is replaced on the next lease and closed once it is released.
+
+        Args:
+            entry (_PooledSession): The leased session. Only this session is flagged, not a newer session to the
+                same server that may have replaced it in the meantime.
+        """
+        entry.broken = True
+
+    async def close(self) -> None:
+        """Close every pooled session."""
+        condition = self._get_condition()
+        async with condition:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+            condition.notify_all()
+        for entry in entries:
+            await entry.close(self.connect_timeout)
+
+    def stats(self) -> dict[str, Any]:
+        """Return a snapshot of the pooled sessions.
+
+        Returns:
+            dict[str, Any]: The pool limits and the state of each session.
+        """
+        now = time.monotonic()
+        return {
+            "max_sessions": self.max_sessions,
+            "open_sessions": len(self._sessions),
+            "sessions": {
+                server_url: {
+                    "alive": entry.is_alive,
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(now - entry.last_used, 2),
+                }
+                for server_url, entry in self._sessions.items()
+            },
+        }
+
+    @asynccontextmanager
+    async def _lease(self, server_url: str) -> AsyncIterator[_PooledSession]:
+        entry = await self._acquire(server_url)
+        try:
+            yield entry
+        finally:
+            await self._release(entry)
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions belong to the event loop that opened them and cannot be reused from another one, so they are
+            # closed on their own loop.
+            for entry in self._sessions.values():
+                entry.close_soon()
+            self._sessions.clear()
+            self._pending.clear()
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def _acquire(self, server_url: str) -> _PooledSession:
+        # The lock only guards the bookkeeping. Sessions are opened, pinged and closed without holding it, so a slow
+        # server does not hold up the leases of the other servers.
+        condition = self._get_condition()
+        while True:
+            stale: list[_PooledSession] = []
+            opening = None
+            try:
+                async with condition:
+                    stale.extend(self._pop_idle())
+                    entry = self._sessions.get(server_url)
+                    if entry is not None and not entry.is_alive:
+                        # Requests still holding the broken session finish with it; it is closed on release.
+                        entry.broken = True
+                        del self._sessions[server_url]
+                        if entry.in_use == 0:
+                            stale.append(entry)
+                        entry = None
+                    pending = self._pending.get(server_url)
+                    if entry is not None:
+                        entry.in_use += 1
+                        entry.last_used = time.monotonic()
+                        self._sessions.move_to_end(server_url)
+                    elif pending is None:
+                        if len(self._sessions) + len(self._pending) >= self.max_sessions:
+                            victim = next((url for url, pooled in self._sessions.items() if pooled.in_use == 0), None)
+                            if victim is None:
+                                await condition.wait()
+                                continue
+                            stale.append(self._sessions.pop(victim))
+                        opening = asyncio.get_running_loop().create_future()
+                        # Leases that do not wait for the session must not log "exception was never retrieved".
+                        opening.add_done_callback(lambda future: future.cancelled() or future.exception())
+                        self._pending[server_url] = opening
+            finally:
+                for stale_entry in stale:
+                    await stale_entry.close(self.connect_timeout)
+
+            if opening is not None:
+                return await self._open(server_url, opening)
+            if entry is None:
+                # Another lease is opening a session to this server; use it once it is ready.
+                try:
+                    await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                continue
+            if time.monotonic() - entry.last_health_check < self.health_check_interval:
+                return entry
+            if await entry.ping(self.connect_timeout):
+                return entry
+            entry.broken = True
+            await self._release(entry)
+
+    async def _open(self, server_url: str, opening: asyncio.Future) -> _PooledSession:
+        condition = self._get_condition()
+        entry = _PooledSession(server_url, self._get_connection(server_url))
+        try:
+            await entry.open(self.connect_timeout)
+        except BaseException as e:
+            await entry.close(self.connect_timeout)
+            async with condition:
+                self._pending.pop(server_url, None)
+                condition.notify_all()
+            if isinstance(e, asyncio.CancelledError):
+                opening.cancel()
+            else:
+                opening.set_exception(e)
+            raise
+
+        async with condition:
+            self._pending.pop(server_url, None)
+            entry.in_use += 1
+            self._sessions[server_url] = entry
+            reconnected = server_url in self._connected_servers
+            self._connected_servers.add(server_url)
+            condition.notify_all()
+        opening.set_result(entry)
+        if reconnected:
+            self._notify_tools_changed(server_url)
+        return entry
+
+    async def _release(self, entry: _PooledSession) -> None:
+        condition = self._get_condition()
+        async with condition:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if entry.broken and self._sessions.get(entry.server_url) is entry:
+                del self._sessions[entry.server_url]
+            closing = entry.in_use == 0 and self._sessions.get(entry.server_url) is not entry
+            condition.notify_all()
+        if closing:
+            await entry.close(self.connect_timeout)
+
+    def _get_connection(self, server_url: str) -> dict[str, Any]:
+        async def message_handler(message: Any) -> None:
+            if isinstance(message, ServerNotification) and isinstance(message.root, ToolListChangedNotification):
+                self._notify_tools_changed(server_url)
+
+        connection = get_mcp_connection(server_url)
+        connection["session_kwargs"] = {**connection.get("session_kwargs", {}), "message_handler": message_handler}
+        return connection
+
+    def _notify_tools_changed(self, server_url: str) -> None:
+        for listener in self._tools_changed_listeners:
+            try:
+                listener(server_url)
+            except Exception as e:
+                logger.warning("Tools-changed listener failed for MCP server %s: %s", server_url, e)
+
+    def _pop_idle(self) -> list[_PooledSession]:
+        now = time.monotonic()
+        idle = [
+            server_url
+            for server_url, entry in self._sessions.items()
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout
+        ]
+        return [self._sessions.pop(server_url) for server_url in idle]
+
+
+async def _list_all_tools(session: ClientSession) -> list[McpTool]:
+    tools: list[McpTool] = []
+    cursor = None
+    while True:
+        page = await session.list_tools(cursor=cursor)
+        tools.extend(page.tools)
+        cursor = page.nextCursor
+        if not cursor:
+            return tools
+
+
+_default_pool: McpSessionPool | None = None
+
+
+def get_session_pool() -> McpSessionPool:
+    """Return the process-wide session pool, configured from the environment on first use.
+
+    Returns:
+        McpSessionPool: The shared session pool.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = McpSessionPool(
+            max_sessions=int(os.getenv("MCP_SESSION_POOL_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+            idle_timeout=float(os.getenv("MCP_SESSION_POOL_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)),
+            health_check_interval=float(
+                os.getenv("MCP_SESSION_POOL_HEALTH_CHECK_INTERVAL", DEFAULT_HEALTH_CHECK_INTERVAL)
+            ),
+        )
+    return _default_pool
@@ -0,0 +1,74 @@
+"""Incremental processing of the ReAct agent stream.
+
+The agent is streamed with `stream_mode="updates"`, so every chunk only carries the messages produced by the node
+that just ran. Each message is therefore inspected exactly once, and the cost per chunk no longer grows with the
+length of the conversation.
+"""
+
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+
+class AgentStreamProcessor:
+    """Tracks tool calls and the latest answer from incremental agent stream updates.
+
+    Attributes:
+        tool_call_count (int): The number of tool calls requested by the agent so far.
+        prompt_tokens (int): The prompt tokens reported by the model calls so far.
+        completion_tokens (int): The completion tokens reported by the model calls so far.
+        last_message (BaseMessage | None): The most recent message with non-empty content.
+    """
+
+    def __init__(self):
+        self.tool_call_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.last_message: BaseMessage | None = None
+
+    def process_update(self, update: Any) -> list[dict[str, Any]]:
+        """Process one `stream_mode="updates"` chunk.
+
+        Args:
+            update (Any): A mapping from the node that just ran to the state update it produced.
+
+        Returns:
+            list[dict[str, Any]]: The tool calls requested by the new messages, in order.
+        """
+        new_tool_calls = []
+        if not isinstance(update, dict):
+            return new_tool_calls
+
+        for node_update in update.values():
+            if not isinstance(node_update, dict):
+                continue
+            for message in node_update.get("messages", ()):
+                new_tool_calls.extend(self.process_message(message))
+        return new_tool_calls
+
+    def process_message(self, message: BaseMessage) -> list[dict[str, Any]]:
+        """Process a single new message.
+
+        Args:
+            message (BaseMessage): A message produced by the agent or by a tool.
+
+        Returns:
+            list[dict[str, Any]]: The tool calls requested by the message.
+        """
+        if getattr(message, "content", None):
+            self.last_message = message
+
+        if not isinstance(message, AIMessage):
+            return []
+        if message.usage_metadata:
+            self.prompt_tokens += message.usage_metadata.get("input_tokens", 0)
+            self.completion_tokens += message.usage_metadata.get("output_tokens", 0)
+        if not message.tool_calls:
+            return []
+        self.tool_call_count += len(message.tool_calls)
+        return list(message.tool_calls)
+
+    @property
+    def final_content(self) -> str | None:
+        """The content of the most recent message with content, if any."""
+        return self.last_message.content if self.last_message else None
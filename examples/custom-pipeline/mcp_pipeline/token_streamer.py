@@ -0,0 +1,123 @@
+"""Forwarding of LLM token deltas to the event emitter.
+
+Emitting every token as its own event makes the emitter the bottleneck for fast models. `TokenStreamer` coalesces
+deltas into frames instead: a frame is sent once it is large enough or old enough, and while a frame is being emitted
+new deltas keep accumulating into the next one. A slow consumer therefore receives fewer, larger frames rather than
+making the agent wait.
+
+Frames are `EventType.DATA` events with a `response_delta` data type, so they are not mistaken for the complete
+answer, which is still sent as one `EventType.RESPONSE` event at the end. Every frame carries the index of the agent
+turn it belongs to. A consumer should restart the displayed text when the turn changes, since a turn that turns out
+to call tools is dropped and its text is not part of the answer.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any
+
+from gllm_core.constants import EventLevel, EventType
+from gllm_core.event import EventEmitter
+
+DEFAULT_MIN_FRAME_CHARS = 24
+DEFAULT_MAX_FRAME_INTERVAL = 0.05
+
+
+class TokenStreamer:
+    """Batches token deltas into `response_delta` frames, one agent turn at a time.
+
+    Attributes:
+        event_emitter (EventEmitter): The emitter the frames are sent to.
+        min_frame_chars (int): The frame size at which a frame is sent without waiting.
+        max_frame_interval (float): The maximum number of seconds a delta waits before being sent.
+        emitted_chars (int): The number of characters emitted so far.
+        turn (int): The index of the current agent turn.
+    """
+
+    def __init__(
+        self,
+        event_emitter: EventEmitter,
+        min_frame_chars: int = DEFAULT_MIN_FRAME_CHARS,
+        max_frame_interval: float = DEFAULT_MAX_FRAME_INTERVAL,
+    ):
+        self.event_emitter = event_emitter
+        self.min_frame_chars = min_frame_chars
+        self.max_frame_interval = max_frame_interval
+        self.emitted_chars = 0
+        self.turn = 0
+        self._turn_key: Any = None
+        self._discarded = False
+        self._buffer: list[str] = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self._task: asyncio.Task | None = None
+
+    def start_turn(self, turn_key: Any) -> None:
+        """Switch to the agent turn a delta belongs to, dropping what is buffered of the previous turn.
+
+        Args:
+            turn_key (Any): Identifies the turn, e.g. the LangGraph step of the model call.
+        """
+        if turn_key == self._turn_key:
+            return
+        if self._turn_key is not None:
+            self.turn += 1
+        self._turn_key = turn_key
+        self._discarded = False
+        self._buffer.clear()
+        self._buffered_chars = 0
+
+    def discard_turn(self) -> None:
+        """Drop the current turn, e.g. because it calls tools, so its text is not part of the answer."""
+        self._discarded = True
+        self._buffer.clear()
+        self._buffered_chars = 0
+
+    def push(self, delta: str) -> None:
+        """Queue a token delta of the current turn without waiting for it to be emitted.
+
+        Args:
+            delta (str): The text generated since the previous delta.
+        """
+        if not delta or self._discarded:
+            return
+        self._buffer.append(delta)
+        self._buffered_chars += len(delta)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def aclose(self) -> None:
+        """Emit everything that is still buffered."""
+        if self._task is not None:
+            await self._task
+        if self._buffer:
+            await self._emit_frame()
+
+    def cancel(self) -> None:
+        """Drop the buffered deltas and stop emitting."""
+        self._buffer.clear()
+        self._buffered_chars = 0
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _drain(self) -> None:
+        while self._buffer:
+            if self._buffered_chars < self.min_frame_chars:
+                wait = self.max_frame_interval - (time.monotonic() - self._last_flush)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self._emit_frame()
+
+    async def _emit_frame(self) -> None:
+        frame = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        if not frame:
+            return
+        await self.event_emitter.emit(
+            json.dumps({"data_type": "response_delta", "data_value": {"turn": self.turn, "delta": frame}}),
+            event_level=EventLevel.INFO,
+            event_type=EventType.DATA,
+        )
+        self.emitted_chars += len(frame)
+        self._last_flush = time.monotonic()
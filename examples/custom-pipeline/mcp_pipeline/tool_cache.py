@@ -0,0 +1,180 @@
+"""Memoization of idempotent MCP tool calls.
+
+The agent often repeats read-only lookups with the same arguments, e.g. resolving the same Slack user ID several
+times in one conversation. Results of allow-listed tools are kept for a short TTL and returned without a round trip
+to the MCP server. Concurrent identical calls share a single request to the server.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from fnmatch import fnmatch
+from typing import Any, Awaitable, Callable
+
+from mcp_pipeline.response_cache import parse_tool_ttl_patterns
+
+DEFAULT_TOOL_CACHE_MAX_ENTRIES = 512
+
+# Only read-only lookups whose results rarely change belong here, by exact name, so that variants such as
+# `get_issue_comments` are not cached by accident. The first matching pattern sets the TTL in seconds.
+DEFAULT_CACHEABLE_TOOLS: dict[str, float] = {
+    "slack_get_user_profile": 600,
+    "slack_get_users": 600,
+    "slack_list_channels": 600,
+    "get_me": 600,
+    "get_file_contents": 60,
+    "get_issue": 60,
+    "get_pull_request": 60,
+}
+
+
+class ToolResultCache:
+    """An LRU cache of tool results for an allow-list of idempotent tools.
+
+    Attributes:
+        cacheable_tools (dict[str, float]): TTLs in seconds keyed by the name patterns of the tools that may be cached.
+        max_entries (int): The maximum number of results kept. The least recently used one is evicted first.
+        hits (int): The number of calls answered from the cache, including calls that joined an identical call in
+            flight.
+        misses (int): The number of cacheable calls sent to the MCP server.
+        evictions (int): The number of results evicted to respect `max_entries`.
+    """
+
+    def __init__(
+        self,
+        cacheable_tools: dict[str, float] | None = None,
+        max_entries: int = DEFAULT_TOOL_CACHE_MAX_ENTRIES,
+    ):
+        self.cacheable_tools = DEFAULT_CACHEABLE_TOOLS if cacheable_tools is None else cacheable_tools
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    def get_ttl(self, tool_name: str) -> float:
+        """Return how long the results of a tool may be cached.
+
+        Args:
+            tool_name (str): The name of the tool.
+
+        Returns:
+            float: The TTL in seconds. 0 means the tool is not cached.
+        """
+        for pattern, ttl in self.cacheable_tools.items():
+            if fnmatch(tool_name, pattern):
+                return ttl
+        return 0
+
+    async def call(
+        self, server_url: str, tool_name: str, arguments: dict[str, Any], call_tool: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached result of a tool call, or make the call and cache its result.
+
+        Args:
+            server_url (str): The full URL of the MCP server the tool belongs to. Servers, or users, that share a host
+                but differ in the path or query of their URL do not share results.
+            tool_name (str): The name of the tool.
+            arguments (dict[str, Any]): The arguments of the call.
+            call_tool (Callable[[], Awaitable[Any]]): Makes the call to the MCP server.
+
+        Returns:
+            Any: The result of the tool call.
+        """
+        ttl = self.get_ttl(tool_name)
+        if ttl <= 0:
+            return await call_tool()
+
+        key = _get_cache_key(server_url, tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # The call we joined was cancelled by its own request, which must not fail this one.
+                if not in_flight.cancelled():
+                    raise
+                return await call_tool()
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await call_tool()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # Failures are not cached, the callers waiting on this call see the same error.
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        future.set_result(result)
+        self._entries[key] = (time.monotonic() + ttl, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Return the cache counters.
+
+        Returns:
+            dict[str, Any]: The hits, misses, evictions and current size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+def _get_cache_key(server_url: str, tool_name: str, arguments: dict[str, Any]) -> str:
+    canonical_arguments = json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+    # Hashed, so that credentials in the URL are not kept in the cache keys.
+    server_hash = hashlib.sha256(server_url.encode()).hexdigest()
+    return f"{server_hash}\x00{tool_name}\x00{canonical_arguments}"
+
+
+_default_tool_cache: ToolResultCache | None = None
+
+
+def get_tool_result_cache() -> ToolResultCache | None:
+    """Return the process-wide tool result cache configured by the environment.
+
+    Returns:
+        ToolResultCache | None: The shared cache, or None if tool result caching is disabled.
+    """
+    global _default_tool_cache
+    if os.getenv("MCP_TOOL_CACHE", "true").lower() != "true":
+        return None
+    if _default_tool_cache is None:
+        cacheable_tools = os.getenv("MCP_TOOL_CACHE_TOOLS")
+        _default_tool_cache = ToolResultCache(
+            cacheable_tools=parse_tool_ttl_patterns(cacheable_tools) if cacheable_tools is not None else None,
+            max_entries=int(os.getenv("MCP_TOOL_CACHE_MAX_ENTRIES", DEFAULT_TOOL_CACHE_MAX_ENTRIES)),
+        )
+    return _default_tool_cache
@@ -0,0 +1,180 @@
+"""Cached, versioned catalog of the tools exposed by MCP servers.
+
+Tool discovery is kept out of the request path: requests read the latest snapshot of a server's tools, while stale
+snapshots are refreshed in the background once their TTL has passed or when the server announces that its tool list
+has changed.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from mcp_pipeline.session_pool import McpSessionPool, get_session_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_CATALOG_TTL = 300.0
+
+
+@dataclass(frozen=True)
+class ToolCatalogSnapshot:
+    """An immutable view of the tools exposed by one MCP server.
+
+    Attributes:
+        server_url (str): The MCP server URL.
+        tools (tuple[BaseTool, ...]): The tools with names normalized for the language model.
+        version (str): A hash of the tool names, descriptions and input schemas.
+        fetched_at (float): The `time.monotonic()` timestamp of the last refresh.
+    """
+
+    server_url: str
+    tools: tuple[BaseTool, ...]
+    version: str
+    fetched_at: float
+
+
+class McpToolCatalog:
+    """Caches normalized MCP tools per server and refreshes them in the background.
+
+    Attributes:
+        session_pool (McpSessionPool): The pool used to list the tools.
+        ttl (float): Seconds after which a snapshot is refreshed in the background.
+    """
+
+    def __init__(self, session_pool: McpSessionPool, ttl: float = DEFAULT_TOOL_CATALOG_TTL):
+        self.session_pool = session_pool
+        self.ttl = ttl
+        self._snapshots: dict[str, ToolCatalogSnapshot] = {}
+        self._refreshes: dict[str, asyncio.Task] = {}
+        self._stale: set[str] = set()
+        session_pool.subscribe_tools_changed(self.invalidate)
+
+    async def get_snapshot(self, server_url: str) -> ToolCatalogSnapshot:
+        """Return the cached tools of a server.
+
+        Only the very first call for a server waits for the tools to be listed. Afterwards the cached snapshot is
+        returned immediately and, if it is stale, a refresh is scheduled in the background.
+
+        Args:
+            server_url (str): The MCP server URL.
+
+        Returns:
+            ToolCatalogSnapshot: The latest snapshot of the server's tools.
+        """
+        snapshot = self._snapshots.get(server_url)
+        if snapshot is None:
+            return await asyncio.shield(self._schedule_refresh(server_url))
+
+        if server_url in self._stale or time.monotonic() - snapshot.fetched_at > self.ttl:
+            self._schedule_refresh(server_url)
+        return snapshot
+
+    def invalidate(self, server_url: str) -> None:
+        """Mark the snapshot of a server as stale so that the next read refreshes it in the background.
+
+        Args:
+            server_url (str): The MCP server URL.
+        """
+        self._stale.add(server_url)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if server_url in self._snapshots:
+            self._schedule_refresh(server_url)
+
+    def prefetch(self, server_url: str) -> None:
+        """Start loading the tools of a server in the background if they are not cached yet.
+
+        Args:
+            server_url (str): The MCP server URL.
+        """
+        if server_url not in self._snapshots:
+            self._schedule_refresh(server_url)
+
+    def _schedule_refresh(self, server_url: str) -> asyncio.Task:
+        task = self._refreshes.get(server_url)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._refresh(server_url), name=f"mcp-tool-catalog:{server_url}")
+            task.add_done_callback(_log_refresh_failure)
+            self._refreshes[server_url] = task
+        return task
+
+    async def _refresh(self, server_url: str) -> ToolCatalogSnapshot:
+        self._stale.discard(server_url)
+        tools = await self.session_pool.load_tools(server_url)
+        for tool in tools:
+            tool.name = tool.name.replace("::", "__")
+        version = compute_tools_version(tools)
+
+        previous = self._snapshots.get(server_url)
+        if previous is not None and previous.version == version:
+            # Keep the tool objects that agents were already built with when nothing changed.
+            tools = list(previous.tools)
+        snapshot = ToolCatalogSnapshot(
+            server_url=server_url,
+            tools=tuple(tools),
+            version=version,
+            fetched_at=time.monotonic(),
+        )
+        self._snapshots[server_url] = snapshot
+        return snapshot
+
+
+def compute_tools_version(tools: list[BaseTool]) -> str:
+    """Hash the names, descriptions and input schemas of a list of tools.
+
+    Args:
+        tools (list[BaseTool]): The tools to hash.
+
+    Returns:
+        str: A short, stable hex digest that changes whenever any tool definition changes.
+    """
+    definitions = sorted(
+        (
+            {"name": tool.name, "description": tool.description, "schema": _get_input_schema(tool)}
+            for tool in tools
+        ),
+        key=lambda definition: definition["name"],
+    )
+    payload = json.dumps(definitions, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _get_input_schema(tool: BaseTool) -> dict[str, Any]:
+    schema = tool.args_schema
+    if schema is None:
+        return {}
+    if isinstance(schema, dict):
+        return schema
+    return schema.model_json_schema()
+
+
+def _log_refresh_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Failed to refresh MCP tool catalog: %s", task.exception())
+
+
+_default_catalog: McpToolCatalog | None = None
+
+
+def get_tool_catalog() -> McpToolCatalog:
+    """Return the process-wide tool catalog backed by the shared session pool.
+
+    Returns:
+        McpToolCatalog: The shared tool catalog.
+    """
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = McpToolCatalog(
+            session_pool=get_session_pool(),
+            ttl=float(os.getenv("MCP_TOOL_CATALOG_TTL", DEFAULT_TOOL_CATALOG_TTL)),
+        )
+    return _default_catalog
@@ -0,0 +1,147 @@
+"""Concurrent execution of MCP tool calls with per-server limits and per-call timeouts.
+
+The agent's tool node already runs the tool calls of one AI message concurrently and returns their results in the
+order the model requested them. `ParallelToolExecutor` wraps the MCP tools so that this concurrency stays within a
+budget: each server only serves a bounded number of calls at once, every call has a timeout, and the calls of a
+request count against its `RequestBudget`. Repeated calls of idempotent tools are answered by a `ToolResultCache`.
+"""
+
+import asyncio
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from mcp_pipeline.budget import DEFAULT_TOOL_TIMEOUT_SECONDS, RequestBudget
+from mcp_pipeline.instrumentation import get_server_label
+from mcp_pipeline.tool_cache import ToolResultCache, get_tool_result_cache
+
+DEFAULT_MAX_CONCURRENCY_PER_SERVER = 4
+
+
+_current_budget: ContextVar[RequestBudget | None] = ContextVar("mcp_request_budget", default=None)
+
+
+class _ExecutorTool(StructuredTool):
+    """A tool that checks the tool call budget of the current request before running."""
+
+    async def ainvoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        # The tool node starts the calls of one AI message in order, and this check happens before the first await,
+        # so the calls that fit into the budget are always the first ones the model requested.
+        budget = _current_budget.get()
+        if budget is not None and not budget.reserve_tool_call():
+            content = f"Tool `{self.name}` was not called: the budget of this request has been exhausted."
+            if isinstance(input, dict) and input.get("type") == "tool_call":
+                return ToolMessage(content=content, name=self.name, tool_call_id=input["id"], status="error")
+            return content
+        return await super().ainvoke(input, config, **kwargs)
+
+
+class ParallelToolExecutor:
+    """Wraps MCP tools with per-server concurrency limits, per-call timeouts and a per-request budget.
+
+    Attributes:
+        max_concurrency_per_server (int): The maximum number of concurrent calls to one MCP server.
+        tool_timeout (float): Seconds after which a tool call is abandoned when it runs outside of a request budget.
+        result_cache (ToolResultCache | None): Memoizes the results of idempotent tools, if set.
+    """
+
+    def __init__(
+        self,
+        max_concurrency_per_server: int = DEFAULT_MAX_CONCURRENCY_PER_SERVER,
+        tool_timeout: float = DEFAULT_TOOL_TIMEOUT_SECONDS,
+        result_cache: ToolResultCache | None = None,
+    ):
+        self.max_concurrency_per_server = max_concurrency_per_server
+        self.tool_timeout = tool_timeout
+        self.result_cache = result_cache
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def wrap(self, tools: list[BaseTool], server_url: str) -> list[BaseTool]:
+        """Wrap the tools of one MCP server.
+
+        Args:
+            tools (list[BaseTool]): The tools to wrap.
+            server_url (str): The URL of the server the tools belong to. The concurrency limit applies per host, and
+                cached results are kept per URL.
+
+        Returns:
+            list[BaseTool]: The wrapped tools, in the same order.
+        """
+        return [self._wrap_tool(tool, server_url) for tool in tools]
+
+    @contextmanager
+    def execution(self, budget: RequestBudget) -> Iterator[RequestBudget]:
+        """Scope a request budget to the agent run executed inside the block.
+
+        Args:
+            budget (RequestBudget): The budget the tool calls of the run count against.
+
+        Yields:
+            RequestBudget: The same budget, which can be inspected while the run progresses.
+        """
+        token = _current_budget.set(budget)
+        try:
+            yield budget
+        finally:
+            _current_budget.reset(token)
+
+    def _wrap_tool(self, tool: BaseTool, server_url: str) -> BaseTool:
+        server = get_server_label(server_url)
+
+        async def run_tool(**kwargs: Any) -> Any:
+            budget = _current_budget.get()
+            timeout = budget.get_tool_timeout() if budget is not None else self.tool_timeout
+
+            async def call_tool() -> Any:
+                async with self._get_semaphore(server):
+                    try:
+                        return await asyncio.wait_for(tool.coroutine(**kwargs), timeout)
+                    except asyncio.TimeoutError as e:
+                        raise ToolException(f"Tool `{tool.name}` timed out after {timeout:.1f} seconds.") from e
+
+            # Cache hits skip the semaphore, so they never wait behind slow calls to the same server.
+            if self.result_cache is not None:
+                result = await self.result_cache.call(server_url, tool.name, kwargs, call_tool)
+            else:
+                result = await call_tool()
+            if budget is not None:
+                content = result[0] if tool.response_format == "content_and_artifact" else result
+                budget.record_tool_result(len(str(content).encode()))
+            return result
+
+        return _ExecutorTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=run_tool,
+            response_format=tool.response_format,
+            metadata=tool.metadata,
+            handle_tool_error=True,
+        )
+
+    def _get_semaphore(self, server: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(server)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency_per_server)
+            self._semaphores[server] = semaphore
+        return semaphore
+
+
+def get_tool_executor() -> ParallelToolExecutor:
+    """Create a tool executor configured from the environment.
+
+    Returns:
+        ParallelToolExecutor: The tool executor.
+    """
+    return ParallelToolExecutor(
+        max_concurrency_per_server=int(
+            os.getenv("MCP_TOOL_MAX_CONCURRENCY_PER_SERVER", DEFAULT_MAX_CONCURRENCY_PER_SERVER)
+        ),
+        tool_timeout=float(os.getenv("MCP_TOOL_TIMEOUT", DEFAULT_TOOL_TIMEOUT_SECONDS)),
+        result_cache=get_tool_result_cache(),
+    )
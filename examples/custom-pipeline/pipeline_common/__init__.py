@@ -0,0 +1 @@
+"""Components shared by the pipelines of this example."""
@@ -0,0 +1,205 @@
+"""Cache of built pipelines, so that pipeline construction is paid once per preset rather than per request.
+
+Pipelines are keyed by a stable hash of the pipeline config entries the build reads and of the environment variables
+it resolves, e.g. the API key or the MCP server URL. Changing either results in a new key, so a stale pipeline is
+never returned. Entries are evicted least recently used first and can be dropped explicitly.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Protocol
+
+import yaml
+from gllm_pipeline.pipeline.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUILD_CACHE_MAX_ENTRIES = 32
+
+
+def compute_build_key(
+    pipeline_config: dict[str, Any], env_names: Iterable[str], config_keys: Iterable[str] | None = None
+) -> str:
+    """Compute the cache key of a build.
+
+    Args:
+        pipeline_config (dict[str, Any]): The pipeline configuration.
+        env_names (Iterable[str]): The environment variables the build resolves. Only a hash of their values is
+            part of the key, so secrets are never kept in memory by the cache.
+        config_keys (Iterable[str] | None, optional): The config entries the build reads. Other entries, e.g.
+            display settings of the preset, do not change the pipeline and are left out of the key. Defaults to None,
+            which uses the whole config.
+
+    Returns:
+        str: The cache key.
+    """
+    if config_keys is not None:
+        pipeline_config = {key: pipeline_config.get(key) for key in config_keys}
+    env = {name: hashlib.sha256(os.getenv(name, "").encode()).hexdigest() for name in sorted(set(env_names))}
+    payload = json.dumps({"config": pipeline_config, "env": env}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PipelineBuildCache:
+    """An LRU cache of built pipelines. Concurrent builds of the same key share one build.
+
+    Attributes:
+        max_entries (int): The maximum number of pipelines kept. The least recently used one is evicted first.
+        hits (int): The number of builds answered from the cache.
+        misses (int): The number of builds that constructed a pipeline.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_BUILD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Pipeline] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def get_or_build(
+        self,
+        pipeline_config: dict[str, Any],
+        env_names: Iterable[str],
+        build: Callable[[dict[str, Any]], Awaitable[Pipeline]],
+        config_keys: Iterable[str] | None = None,
+    ) -> Pipeline:
+        """Return the cached pipeline of a config, building it on a miss.
+
+        Args:
+            pipeline_config (dict[str, Any]): The pipeline configuration.
+            env_names (Iterable[str]): The environment variables the build resolves.
+            build (Callable[[dict[str, Any]], Awaitable[Pipeline]]): Builds the pipeline of a config.
+            config_keys (Iterable[str] | None, optional): The config entries the build reads. Defaults to None, which
+                uses the whole config.
+
+        Returns:
+            Pipeline: The pipeline.
+        """
+        key = compute_build_key(pipeline_config, env_names, config_keys)
+        pipeline = self._entries.get(key)
+        if pipeline is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pipeline
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # The build we joined was cancelled by its own caller, which must not fail this one.
+                if not in_flight.cancelled():
+                    raise
+                return await build(pipeline_config)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            pipeline = await build(pipeline_config)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        future.set_result(pipeline)
+        self._entries[key] = pipeline
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return pipeline
+
+    def invalidate(
+        self,
+        pipeline_config: dict[str, Any] | None = None,
+        env_names: Iterable[str] = (),
+        config_keys: Iterable[str] | None = None,
+    ) -> None:
+        """Drop the pipeline of a config, or every pipeline.
+
+        Args:
+            pipeline_config (dict[str, Any] | None, optional): The config whose pipeline is dropped. Defaults to None,
+                which drops every pipeline.
+            env_names (Iterable[str], optional): The environment variables the build resolves. Defaults to none.
+            config_keys (Iterable[str] | None, optional): The config entries the build reads. Defaults to None.
+        """
+        if pipeline_config is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(compute_build_key(pipeline_config, env_names, config_keys), None)
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters.
+
+        Returns:
+            dict[str, int]: The hits, misses and current size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+def get_build_cache_max_entries() -> int:
+    """Return the size of the build caches configured by the environment.
+
+    Returns:
+        int: The maximum number of pipelines kept by each builder.
+    """
+    return int(os.getenv("PIPELINE_BUILD_CACHE_MAX_ENTRIES", DEFAULT_BUILD_CACHE_MAX_ENTRIES))
+
+
+class _PipelineBuilder(Protocol):
+    async def build(self, pipeline_config: dict[str, Any]) -> Pipeline: ...
+
+
+def get_preset_configs(config_path: str | Path) -> list[dict[str, Any]]:
+    """Return the pipeline configs of every preset and supported model in a `config.yaml`.
+
+    Args:
+        config_path (str | Path): The path of the `config.yaml`.
+
+    Returns:
+        list[dict[str, Any]]: One pipeline config per preset and supported model.
+    """
+    with open(config_path) as file:
+        config = yaml.safe_load(file) or {}
+
+    pipeline_configs = []
+    for preset in config.get("presets", []):
+        preset_config = {key: value for key, value in preset.items() if key != "supported_models"}
+        for model_name in preset.get("supported_models", []):
+            pipeline_configs.append({**preset_config, "model_name": model_name})
+    return pipeline_configs
+
+
+async def warm_up(builder: _PipelineBuilder, config_path: str | Path) -> int:
+    """Build the pipeline of every preset and supported model of a `config.yaml`, so that requests find them cached.
+
+    Args:
+        builder (_PipelineBuilder): The builder.
+        config_path (str | Path): The path of the `config.yaml`.
+
+    Returns:
+        int: The number of pipelines built. Presets that fail to build are logged and skipped.
+    """
+    built = 0
+    for pipeline_config in get_preset_configs(config_path):
+        try:
+            await builder.build(pipeline_config)
+            built += 1
+        except Exception as e:
+            logger.warning("Could not warm up preset %s: %s", pipeline_config, e)
+    return built
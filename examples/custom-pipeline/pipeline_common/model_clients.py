@@ -0,0 +1,352 @@
+"""Process-wide registry of language model clients and their HTTP connection pools.
+
+Creating a model client per request or per pipeline build gives each one its own HTTP client, so connections and
+TLS sessions to the provider are never reused. The registry creates each client once per (provider, model,
+credential environment variable, factory) and backs the clients of one provider with a shared keep-alive connection
+pool.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+
+from pipeline_common.model_providers import get_model_provider
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_HTTP_TIMEOUT = 60.0
+
+
+@dataclass(frozen=True)
+class HttpPoolLimits:
+    """The limits of the connection pool of one provider.
+
+    Attributes:
+        max_connections (int): The maximum number of open connections.
+        max_keepalive_connections (int): The maximum number of idle connections kept open for reuse.
+        keepalive_expiry (float): Seconds after which an idle connection is closed.
+        timeout (float): Seconds after which an HTTP request is abandoned.
+    """
+
+    max_connections: int = DEFAULT_MAX_CONNECTIONS
+    max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS
+    keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY
+    timeout: float = DEFAULT_HTTP_TIMEOUT
+
+    @classmethod
+    def from_env(cls) -> "HttpPoolLimits":
+        """Read the limits from the environment.
+
+        Returns:
+            HttpPoolLimits: The configured limits.
+        """
+        return cls(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=int(
+                os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+            ),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+            timeout=float(os.getenv("LLM_HTTP_TIMEOUT", DEFAULT_HTTP_TIMEOUT)),
+        )
+
+    def to_httpx(self) -> httpx.Limits:
+        """Convert the limits to `httpx.Limits`.
+
+        Returns:
+            httpx.Limits: The limits of the connection pool.
+        """
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class _CountingAsyncTransport(httpx.AsyncBaseTransport):
+    """An async transport that counts the requests it sends and keeps one connection pool per event loop.
+
+    Connections belong to the event loop that opened them, so a client shared across `asyncio.run` calls would
+    otherwise fail with "Event loop is closed" on the second run.
+
+    Attributes:
+        transport (httpx.AsyncHTTPTransport | None): The transport of the current event loop, once created.
+    """
+
+    def __init__(self, **kwargs: Any):
+        self._kwargs = kwargs
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.transport: httpx.AsyncHTTPTransport | None = None
+        self.in_flight = 0
+        self.total = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.total += 1
+        try:
+            return await self._get_transport().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+    async def aclose(self) -> None:
+        transport, loop = self.transport, self._loop
+        self.transport = self._loop = None
+        if transport is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await transport.aclose()
+        else:
+            _close_soon(transport, loop)
+
+    def _get_transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self.transport is not None:
+                _close_soon(self.transport, self._loop)
+            self.transport = httpx.AsyncHTTPTransport(**self._kwargs)
+            self._loop = loop
+        return self.transport
+
+
+def _close_soon(transport: httpx.AsyncHTTPTransport, loop: asyncio.AbstractEventLoop) -> None:
+    # The connections of a transport can only be closed on the loop that opened them. A closed loop has already
+    # dropped them.
+    if not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(transport.aclose(), loop)
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """A sync transport that counts the requests it sends."""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.total = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.in_flight += 1
+            self.total += 1
+        try:
+            return super().handle_request(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class ProviderHttpPool:
+    """The sync and async HTTP clients of one provider, created on first use.
+
+    Attributes:
+        limits (HttpPoolLimits): The limits of each of the two connection pools.
+        async_client (httpx.AsyncClient | None): The async client, once created.
+        client (httpx.Client | None): The sync client, once created.
+    """
+
+    def __init__(self, limits: HttpPoolLimits):
+        self.limits = limits
+        self._async_transport: _CountingAsyncTransport | None = None
+        self._transport: _CountingTransport | None = None
+        self.async_client: httpx.AsyncClient | None = None
+        self.client: httpx.Client | None = None
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        """Return the async client of the provider.
+
+        Returns:
+            httpx.AsyncClient: The shared async client. It opens a separate connection pool in every event loop it is
+                used from.
+        """
+        if self.async_client is None:
+            self._async_transport = _CountingAsyncTransport(limits=self.limits.to_httpx())
+            self.async_client = httpx.AsyncClient(transport=self._async_transport, timeout=self.limits.timeout)
+        return self.async_client
+
+    def get_client(self) -> httpx.Client:
+        """Return the sync client of the provider.
+
+        Returns:
+            httpx.Client: The shared sync client.
+        """
+        if self.client is None:
+            self._transport = _CountingTransport(limits=self.limits.to_httpx())
+            self.client = httpx.Client(transport=self._transport, timeout=self.limits.timeout)
+        return self.client
+
+    def stats(self) -> dict[str, Any]:
+        """Return the connection and request counts of both clients.
+
+        Returns:
+            dict[str, Any]: The counts of the async and sync clients, None for a client not created yet.
+        """
+        return {
+            "async": _get_transport_stats(self._async_transport),
+            "sync": _get_transport_stats(self._transport),
+        }
+
+
+def _get_transport_stats(
+    transport: _CountingAsyncTransport | _CountingTransport | None,
+) -> dict[str, int | None] | None:
+    if transport is None:
+        return None
+    http_transport = transport.transport if isinstance(transport, _CountingAsyncTransport) else transport
+    try:
+        # httpx does not expose its connection pool, so the connection counts rely on private attributes of httpcore
+        # and are None when they are not available.
+        connections = list(http_transport._pool.connections) if http_transport is not None else []
+        open_connections = len(connections)
+        idle_connections = sum(connection.is_idle() for connection in connections)
+    except (AttributeError, TypeError):
+        open_connections = idle_connections = None
+    return {
+        "open_connections": open_connections,
+        "idle_connections": idle_connections,
+        "in_flight_requests": transport.in_flight,
+        "total_requests": transport.total,
+    }
+
+
+class ModelClientRegistry:
+    """Creates language model clients once and shares them across requests and pipeline builds.
+
+    Clients are keyed by (kind, provider, model, credential environment variable, factory). Factories are compared by
+    equality, so a bound method of the same object or a frozen dataclass with the same fields finds the same client,
+    while a lambda created anew on every lookup does not. When the value of the credential variable changes, e.g.
+    after a key rotation, the client is recreated on the next lookup.
+
+    Attributes:
+        limits (HttpPoolLimits): The limits of the connection pool of each provider.
+    """
+
+    def __init__(self, limits: HttpPoolLimits | None = None):
+        self.limits = limits or HttpPoolLimits()
+        # Reentrant, because client factories look up the connection pool of their provider.
+        self._lock = threading.RLock()
+        self._pools: dict[str, ProviderHttpPool] = {}
+        self._clients: dict[tuple[str, str, str, str, Callable[[str, str], Any]], tuple[str, Any]] = {}
+
+    def get_http_pool(self, provider: str) -> ProviderHttpPool:
+        """Return the connection pool of a provider.
+
+        Args:
+            provider (str): The provider, e.g. `openai`.
+
+        Returns:
+            ProviderHttpPool: The pool, which hands out the shared sync and async HTTP clients of the provider.
+        """
+        with self._lock:
+            pool = self._pools.get(provider)
+            if pool is None:
+                pool = ProviderHttpPool(self.limits)
+                self._pools[provider] = pool
+            return pool
+
+    def get_client(self, kind: str, model: str, credential_env: str, factory: Callable[[str, str], T]) -> T:
+        """Return the client of a model, creating it on first use.
+
+        Args:
+            kind (str): The kind of client, so that different wrappers of the same model do not collide.
+            model (str): The model, e.g. `openai/gpt-4.1`.
+            credential_env (str): The name of the environment variable holding the API key.
+            factory (Callable[[str, str], T]): Creates the client from the model and the API key. Clients of
+                different factories are kept apart, so the factory must be the same object, or an equal one, on every
+                lookup.
+
+        Returns:
+            T: The shared client.
+        """
+        provider, _, model_name = model.partition("/")
+        key = (kind, provider, model_name, credential_env, factory)
+        api_key = os.getenv(credential_env, "")
+        fingerprint = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._lock:
+            cached = self._clients.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            client = factory(model, api_key)
+            self._clients[key] = (fingerprint, client)
+            return client
+
+    def get_chat_model(self, model: str, credential_env: str) -> BaseChatModel:
+        """Return the LangChain chat model of a model, backed by the connection pool of its provider.
+
+        Args:
+            model (str): The model, e.g. `openai/gpt-4.1`.
+            credential_env (str): The name of the environment variable holding the API key.
+
+        Returns:
+            BaseChatModel: The shared chat model.
+
+        Raises:
+            ValueError: If the provider is not registered.
+        """
+        return self.get_client("chat", model, credential_env, self._create_chat_model)
+
+    def _create_chat_model(self, model: str, api_key: str) -> BaseChatModel:
+        provider, _, model_name = model.partition("/")
+        factory = get_model_provider(provider)
+        pool = self.get_http_pool(provider)
+        return factory(model_name, api_key, pool.get_client(), pool.get_async_client())
+
+    def stats(self) -> dict[str, Any]:
+        """Return the registered clients and the utilization of each provider's connection pool.
+
+        Returns:
+            dict[str, Any]: The pool limits, the registered clients and the connection and request counts per
+                provider.
+        """
+        with self._lock:
+            return {
+                "limits": {
+                    "max_connections": self.limits.max_connections,
+                    "max_keepalive_connections": self.limits.max_keepalive_connections,
+                },
+                "clients": [
+                    {
+                        "kind": kind,
+                        "provider": provider,
+                        "model": model_name,
+                        "credential_env": credential_env,
+                        "factory": getattr(factory, "__qualname__", type(factory).__qualname__),
+                    }
+                    for kind, provider, model_name, credential_env, factory in self._clients
+                ],
+                "pools": {provider: pool.stats() for provider, pool in self._pools.items()},
+            }
+
+    async def aclose(self) -> None:
+        """Close the HTTP clients of every provider and forget the registered clients."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            self._clients.clear()
+        for pool in pools:
+            if pool.async_client is not None:
+                await pool.async_client.aclose()
+            if pool.client is not None:
+                pool.client.close()
+
+
+_default_registry: ModelClientRegistry | None = None
+
+
+def get_model_client_registry() -> ModelClientRegistry:
+    """Return the process-wide model client registry, configured from the environment on first use.
+
+    Returns:
+        ModelClientRegistry: The shared registry.
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ModelClientRegistry(limits=HttpPoolLimits.from_env())
+    return _default_registry
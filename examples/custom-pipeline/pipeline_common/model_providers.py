@@ -0,0 +1,77 @@
+"""Registry of the language model providers that model strings such as `openai/gpt-4.1` can refer to.
+
+A provider is a factory that creates a LangChain chat model from the model name after the slash, the API key and
+the shared HTTP clients of the provider. Providers whose integration package is not installed fail with an
+explanatory error only when one of their models is requested.
+"""
+
+from typing import Callable
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+
+ModelProviderFactory = Callable[[str, str, httpx.Client, httpx.AsyncClient], BaseChatModel]
+
+_providers: dict[str, ModelProviderFactory] = {}
+
+
+def register_model_provider(name: str, factory: ModelProviderFactory) -> None:
+    """Register a provider, replacing any provider registered under the same name.
+
+    Args:
+        name (str): The prefix of the model strings of the provider, e.g. `openai`.
+        factory (ModelProviderFactory): Creates a chat model from the model name, the API key and the sync and async
+            HTTP clients of the provider.
+    """
+    _providers[name] = factory
+
+
+def get_model_provider(name: str) -> ModelProviderFactory:
+    """Return the factory of a provider.
+
+    Args:
+        name (str): The name of the provider.
+
+    Returns:
+        ModelProviderFactory: The factory of the provider.
+
+    Raises:
+        ValueError: If the provider is not registered.
+    """
+    factory = _providers.get(name)
+    if factory is None:
+        raise ValueError(f"Unsupported model provider: {name}. Supported providers: {', '.join(sorted(_providers))}")
+    return factory
+
+
+def _create_openai_model(
+    model_name: str, api_key: str, http_client: httpx.Client, http_async_client: httpx.AsyncClient
+) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model_name,
+        api_key=api_key,
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+def _create_anthropic_model(
+    model_name: str, api_key: str, http_client: httpx.Client, http_async_client: httpx.AsyncClient
+) -> BaseChatModel:
+    try:
+        from langchain_anthropic import ChatAnthropic
+    except ImportError as e:
+        raise ImportError(
+            "Anthropic models require the `langchain-anthropic` package. Install it with "
+            "`pip install langchain-anthropic`."
+        ) from e
+
+    # ChatAnthropic manages its own HTTP client, so it does not use the shared pool.
+    return ChatAnthropic(model=model_name, api_key=api_key, stream_usage=True)
+
+
+register_model_provider("openai", _create_openai_model)
+register_model_provider("anthropic", _create_anthropic_model)
@@ -0,0 +1,235 @@
+"""Routing of model calls across providers with ordered fallbacks and hedged requests.
+
+A routed model tries its models in order and moves on to the next one when a call fails, e.g. on a provider error
+or an HTTP timeout. With hedging enabled, a duplicate request is sent to the second model when the first one has
+not produced a token within a latency threshold, and whichever model starts answering first wins. The slow tail
+of one provider therefore does not become the tail of the pipeline.
+"""
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+
+from pipeline_common.model_clients import ModelClientRegistry, get_model_client_registry
+
+_END = object()
+
+
+class HedgedChatModel(BaseChatModel):
+    """Streams from a primary model and hedges with a secondary model when the first token is slow.
+
+    The secondary model is also asked right away when the primary model fails before the threshold. The callbacks of
+    the request are attached to this model only, so the tokens of the losing model are never reported. Synchronous
+    calls are not hedged and go to the primary model.
+
+    Attributes:
+        primary (Runnable): The model that is asked first.
+        secondary (Runnable): The model that receives the duplicate request.
+        hedge_after (float): Seconds to wait for the first token of the primary model before hedging.
+    """
+
+    primary: Runnable
+    secondary: Runnable
+    hedge_after: float = 2.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "HedgedChatModel":
+        """Bind the tools to both models.
+
+        Args:
+            tools (Sequence[Any]): The tools.
+            **kwargs (Any): Other arguments of `bind_tools`.
+
+        Returns:
+            HedgedChatModel: A hedged model over the models with the tools bound.
+        """
+        return self.model_copy(
+            update={
+                "primary": self.primary.bind_tools(tools, **kwargs),
+                "secondary": self.secondary.bind_tools(tools, **kwargs),
+            }
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.primary.invoke(messages, {"callbacks": []}, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # An explicit empty callback list keeps the callbacks of the surrounding run away from the child models.
+        config = {"callbacks": []}
+        streams = {}
+        primary_stream = self.primary.astream(messages, config, stop=stop, **kwargs)
+        primary_first = asyncio.ensure_future(anext(primary_stream, _END))
+        streams[primary_first] = primary_stream
+        try:
+            done, _ = await asyncio.wait({primary_first}, timeout=self.hedge_after)
+            if not done or primary_first.exception() is not None:
+                secondary_stream = self.secondary.astream(messages, config, stop=stop, **kwargs)
+                streams[asyncio.ensure_future(anext(secondary_stream, _END))] = secondary_stream
+
+            winner, first_chunk, error = None, _END, None
+            while streams and winner is None:
+                done, _ = await asyncio.wait(streams, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary model when both answered in the same iteration.
+                for task in sorted(done, key=lambda task: task is not primary_first):
+                    stream = streams.pop(task)
+                    if task.exception() is None:
+                        winner, first_chunk = stream, task.result()
+                        break
+                    error = error or task.exception()
+                    await stream.aclose()
+            if winner is None:
+                raise error
+        finally:
+            for task, stream in streams.items():
+                await _discard_stream(task, stream)
+
+        try:
+            if first_chunk is not _END:
+                yield ChatGenerationChunk(message=first_chunk)
+            async for chunk in winner:
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            await winner.aclose()
+
+
+async def _discard_stream(task: asyncio.Future, stream: Any) -> None:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await stream.aclose()
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """A model and the environment variable holding its API key.
+
+    Attributes:
+        model (str): The model, e.g. `anthropic/claude-3-5-sonnet`.
+        api_key_env (str): The name of the environment variable holding the API key.
+    """
+
+    model: str
+    api_key_env: str
+
+
+def parse_model_routes(value: str, default_api_key_env: str, primary_model: str) -> list[ModelRoute]:
+    """Parse comma-separated `model` or `model=API_KEY_ENV` entries.
+
+    Args:
+        value (str): The entries, e.g. `openai/gpt-4o-mini,anthropic/claude-3-5-sonnet=ANTHROPIC_API_KEY`.
+        default_api_key_env (str): The variable of the primary model, used for entries of the same provider that do
+            not name one.
+        primary_model (str): The primary model.
+
+    Returns:
+        list[ModelRoute]: The routes, in order. Entries of another provider default to `<PROVIDER>_API_KEY`.
+    """
+    primary_provider = primary_model.partition("/")[0]
+    routes = []
+    for item in value.split(","):
+        model, _, api_key_env = item.strip().partition("=")
+        if not model:
+            continue
+        provider = model.partition("/")[0]
+        if not api_key_env:
+            api_key_env = default_api_key_env if provider == primary_provider else f"{provider.upper()}_API_KEY"
+        routes.append(ModelRoute(model, api_key_env))
+    return routes
+
+
+def get_routed_chat_model(
+    model: str,
+    api_key_env: str,
+    fallbacks: Sequence[ModelRoute] = (),
+    hedge_after: float | None = None,
+    registry: ModelClientRegistry | None = None,
+) -> Runnable:
+    """Return a model that falls back to other models on errors and optionally hedges with the first fallback.
+
+    Args:
+        model (str): The primary model.
+        api_key_env (str): The name of the environment variable holding the API key of the primary model.
+        fallbacks (Sequence[ModelRoute], optional): The models tried in order when the previous one fails.
+            Defaults to no fallback.
+        hedge_after (float | None, optional): Seconds without a first token after which the first fallback receives a
+            duplicate request. Defaults to None, which disables hedging.
+        registry (ModelClientRegistry | None, optional): The registry of the model clients. Defaults to the
+            process-wide registry.
+
+    Returns:
+        Runnable: The primary chat model itself when there is no fallback, a routed model otherwise.
+    """
+    registry = registry or get_model_client_registry()
+    models = [registry.get_chat_model(model, api_key_env)]
+    models.extend(registry.get_chat_model(route.model, route.api_key_env) for route in fallbacks)
+    if len(models) == 1:
+        return models[0]
+
+    if hedge_after is not None:
+        hedged = HedgedChatModel(primary=models[0], secondary=models[1], hedge_after=hedge_after)
+        return hedged.with_fallbacks(models[2:]) if len(models) > 2 else hedged
+    return models[0].with_fallbacks(models[1:])
+
+
+def get_language_model_from_env(model: str, api_key_env: str) -> Runnable:
+    """Return the routed model configured by `LANGUAGE_MODEL_FALLBACKS` and `LANGUAGE_MODEL_HEDGE_AFTER`.
+
+    The routed model is shared like the clients it is built from, so repeated calls return the same instance.
+
+    Args:
+        model (str): The primary model.
+        api_key_env (str): The name of the environment variable holding the API key of the primary model.
+
+    Returns:
+        Runnable: The routed model.
+    """
+    fallbacks = parse_model_routes(os.getenv("LANGUAGE_MODEL_FALLBACKS", ""), api_key_env, model)
+    hedge_after = os.getenv("LANGUAGE_MODEL_HEDGE_AFTER")
+    if not fallbacks:
+        return get_model_client_registry().get_chat_model(model, api_key_env)
+
+    factory = _RoutedModelFactory(api_key_env, tuple(fallbacks), float(hedge_after) if hedge_after else None)
+    return get_model_client_registry().get_client("routed", model, api_key_env, factory)
+
+
+@dataclass(frozen=True)
+class _RoutedModelFactory:
+    # A frozen dataclass rather than a closure, so that equal routes find the same client in the registry.
+    api_key_env: str
+    fallbacks: tuple[ModelRoute, ...]
+    hedge_after: float | None
+
+    def __call__(self, model: str, api_key: str) -> Runnable:
+        return get_routed_chat_model(model, self.api_key_env, self.fallbacks, self.hedge_after)
@@ -0,0 +1,252 @@
+"""Batch invocation of the simple pipeline over JSONL files.
+
+Every non-empty input line is a JSON object with a `message` and an optional `id`. Every output line holds the
+`index` of its input line, its `id`, the `response` and an `error`, in the order of the input. A line that is not
+valid JSON gets an error result like a failed request. Requests run with bounded concurrency and an optional rate
+limit over one pipeline built from the shared `LM` preset. Progress is recorded in a checkpoint file, so that a
+crashed or interrupted run resumes after the last written line.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+from simple_pipeline.pipeline import SimplePipelineBuilder
+
+DEFAULT_CONCURRENCY = 8
+CHECKPOINT_INTERVAL_SECONDS = 1.0
+
+
+class RateLimiter:
+    """A token bucket that allows a number of requests per second with short bursts.
+
+    Attributes:
+        rate (float): The sustained number of requests per second.
+        burst (int): The maximum number of requests allowed at once after an idle period.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may start."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BatchCheckpoint:
+    """The progress of a batch run.
+
+    Attributes:
+        input_path (str): The input file.
+        next_index (int): The index of the first input line without a written result.
+        output_size (int): The size of the output file after the last written result. Anything after it is a partial
+            write of a crashed run and is truncated on resume.
+    """
+
+    input_path: str
+    next_index: int = 0
+    output_size: int = 0
+
+    @classmethod
+    def load(cls, path: Path, input_path: Path) -> "BatchCheckpoint":
+        """Load the checkpoint of an input file, or start a new one.
+
+        Args:
+            path (Path): The checkpoint file.
+            input_path (Path): The input file of the run.
+
+        Returns:
+            BatchCheckpoint: The checkpoint.
+
+        Raises:
+            ValueError: If the checkpoint belongs to another input file.
+        """
+        if not path.exists():
+            return cls(input_path=str(input_path.resolve()))
+        checkpoint = cls(**json.loads(path.read_text()))
+        if checkpoint.input_path != str(input_path.resolve()):
+            raise ValueError(f"Checkpoint {path} belongs to {checkpoint.input_path}, not to {input_path}.")
+        return checkpoint
+
+    def save(self, path: Path) -> None:
+        """Write the checkpoint atomically.
+
+        Args:
+            path (Path): The checkpoint file.
+        """
+        temporary_path = path.with_name(path.name + ".tmp")
+        temporary_path.write_text(json.dumps(asdict(self)))
+        os.replace(temporary_path, path)
+
+
+@dataclass
+class BatchSummary:
+    """The outcome of a batch run.
+
+    Attributes:
+        processed (int): The number of requests processed by this run.
+        failed (int): The number of those requests that failed.
+        skipped (int): The number of requests skipped because a previous run already wrote them.
+        duration (float): The duration of the run in seconds.
+    """
+
+    processed: int
+    failed: int
+    skipped: int
+    duration: float
+
+
+class BatchRunner:
+    """Runs many requests through one simple pipeline and writes the results in input order.
+
+    Attributes:
+        builder (SimplePipelineBuilder): The builder of the pipeline.
+        pipeline_config (dict[str, Any]): The pipeline configuration of every request.
+        concurrency (int): The maximum number of requests in flight.
+        rate_limiter (RateLimiter | None): Limits the number of requests started per second, if set.
+    """
+
+    def __init__(
+        self,
+        builder: SimplePipelineBuilder,
+        pipeline_config: dict[str, Any],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        requests_per_second: float | None = None,
+    ):
+        self.builder = builder
+        self.pipeline_config = pipeline_config
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(requests_per_second, burst=concurrency) if requests_per_second else None
+
+    async def run(self, input_path: str | Path, output_path: str | Path, checkpoint_path: str | Path) -> BatchSummary:
+        """Process an input file, resuming from the checkpoint if there is one.
+
+        Args:
+            input_path (str | Path): The JSONL input file.
+            output_path (str | Path): The JSONL output file.
+            checkpoint_path (str | Path): The checkpoint file. It is removed once the whole input is processed.
+
+        Returns:
+            BatchSummary: The outcome of the run.
+        """
+        start = time.perf_counter()
+        input_path, output_path, checkpoint_path = Path(input_path), Path(output_path), Path(checkpoint_path)
+        checkpoint = BatchCheckpoint.load(checkpoint_path, input_path)
+        if checkpoint.output_size and not output_path.exists():
+            raise ValueError(f"Checkpoint {checkpoint_path} refers to the missing output {output_path}.")
+        pipeline = await self.builder.build(self.pipeline_config)
+
+        # Results are written in input order, so at most this many results wait for an earlier one.
+        window = asyncio.Semaphore(self.concurrency * 4)
+        in_flight = asyncio.Semaphore(self.concurrency)
+        pending: dict[int, dict[str, Any]] = {}
+        tasks: set[asyncio.Task] = set()
+        processed = failed = 0
+        last_checkpoint_at = time.monotonic()
+
+        async def process(index: int, request: dict[str, Any]) -> None:
+            async with in_flight:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                pending[index] = await self._invoke(pipeline, index, request)
+
+        with _open_output(output_path, checkpoint.output_size) as output:
+
+            def flush() -> None:
+                nonlocal processed, failed, last_checkpoint_at
+                while checkpoint.next_index in pending:
+                    result = pending.pop(checkpoint.next_index)
+                    output.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+                    processed += 1
+                    failed += result["error"] is not None
+                    checkpoint.next_index += 1
+                    window.release()
+                if time.monotonic() - last_checkpoint_at >= CHECKPOINT_INTERVAL_SECONDS:
+                    write_checkpoint()
+
+            def write_checkpoint() -> None:
+                nonlocal last_checkpoint_at
+                output.flush()
+                os.fsync(output.fileno())
+                checkpoint.output_size = output.tell()
+                checkpoint.save(checkpoint_path)
+                last_checkpoint_at = time.monotonic()
+
+            skipped = checkpoint.next_index
+            try:
+                for index, request in _read_requests(input_path, skip=skipped):
+                    await window.acquire()
+                    if isinstance(request, json.JSONDecodeError):
+                        pending[index] = {"index": index, "id": None, "response": None, "error": _format_error(request)}
+                        flush()
+                        continue
+                    task = asyncio.create_task(process(index, request))
+                    tasks.add(task)
+                    task.add_done_callback(lambda task: (tasks.discard(task), flush()))
+                if tasks:
+                    await asyncio.gather(*tasks)
+            finally:
+                for task in list(tasks):
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                flush()
+                write_checkpoint()
+
+        checkpoint_path.unlink()
+        return BatchSummary(processed, failed, skipped, time.perf_counter() - start)
+
+    async def _invoke(self, pipeline: Any, index: int, request: dict[str, Any]) -> dict[str, Any]:
+        result = {"index": index, "id": request.get("id"), "response": None, "error": None}
+        try:
+            state = self.builder.build_initial_state(request, self.pipeline_config)
+            output = await pipeline.invoke(initial_state=state, config={"user_multimodal_contents": []})
+            result["response"] = output.get("response")
+        except Exception as e:
+            result["error"] = _format_error(e)
+        return result
+
+
+def _read_requests(input_path: Path, skip: int) -> Iterator[tuple[int, dict[str, Any] | json.JSONDecodeError]]:
+    index = 0
+    with open(input_path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            if index >= skip:
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    # Raising would checkpoint this line as the next one, and every resume would fail on it again.
+                    yield index, e
+                else:
+                    yield index, request if isinstance(request, dict) else {"message": request}
+            index += 1
+
+
+def _format_error(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _open_output(output_path: Path, size: int) -> BinaryIO:
+    # Anything after the last checkpointed result is a partial write of a crashed run.
+    output = open(output_path, "r+b" if output_path.exists() else "wb")
+    output.truncate(size)
+    output.seek(size)
+    return output
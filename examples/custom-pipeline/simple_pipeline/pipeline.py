@@ -9,16 +9,51 @@ References:
 """
 
 import os
+import threading
+from dataclasses import dataclass
 from dotenv import load_dotenv
-from typing import Any
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
 
 from gllm_pipeline.pipeline.pipeline import Pipeline
 from gllm_plugin.pipeline.pipeline_plugin import PipelineBuilderPlugin
 from gllm_rag.preset.lm import LM, LMState
+from pipeline_common.build_cache import PipelineBuildCache, get_build_cache_max_entries, warm_up
+from pipeline_common.model_clients import get_model_client_registry
 from simple_pipeline.preset_config import SimplePresetConfig
 
 load_dotenv()
 
+CONFIG_PATH = Path(__file__).parent / "config.yaml"
+BUILD_CONFIG_KEYS = ("model_name", "api_key")
+
+
+def create_lm_preset(model_name: str, api_key: str) -> LM:
+    """Create the `LM` preset of a model.
+
+    Args:
+        model_name (str): The model, e.g. `openai/gpt-4o-mini`.
+        api_key (str): The API key of the model.
+
+    Returns:
+        LM: The preset.
+    """
+    return LM(language_model_id=model_name, language_model_credentials=api_key)
+
+
+@dataclass(frozen=True)
+class BuiltPreset:
+    """A built pipeline and the preset that builds its initial states.
+
+    Attributes:
+        lm (LM): The preset the pipeline was built from.
+        pipeline (Pipeline): The built pipeline.
+    """
+
+    lm: LM
+    pipeline: Pipeline
+
 
 class SimplePipelineBuilder(PipelineBuilderPlugin[LMState, SimplePresetConfig]):
     """Simple pipeline builder.
@@ -26,18 +61,37 @@ class SimplePipelineBuilder(PipelineBuilderPlugin[LMState, SimplePresetConfig]):
     This pipeline will simply pass the user query to the response synthesizer.
     There are no prompt templates used in this pipeline.
 
+    Built presets are kept in an immutable mapping keyed by model and API key variable. A build publishes a new
+    mapping instead of changing the current one, so any number of presets can be built and served concurrently by
+    one builder, and `build_initial_state` always uses the preset of the pipeline config it is given. Built pipelines
+    are cached, so repeated builds of the same config return the same pipeline.
+
     Inherits attributes from `PipelineBuilderPlugin`.
     """
 
     name = "simple-pipeline"
     preset_config_class = SimplePresetConfig
 
-    def __init__(self):
-        """Initialize the simple pipeline builder."""
+    def __init__(self, preset_factory: Callable[[str, str], LM] = create_lm_preset):
+        """Initialize the simple pipeline builder.
+
+        Args:
+            preset_factory (Callable[[str, str], LM], optional): Creates the preset of a model from the model name and
+                the API key. Defaults to `create_lm_preset`.
+        """
         super().__init__()
+        self.preset_factory = preset_factory
+        self._presets: Mapping[tuple[str, str], BuiltPreset] = MappingProxyType({})
+        self._presets_lock = threading.Lock()
+        self.build_cache = PipelineBuildCache(max_entries=get_build_cache_max_entries())
+
+    @property
+    def presets(self) -> Mapping[tuple[str, str], BuiltPreset]:
+        """The built presets keyed by model and API key variable."""
+        return self._presets
 
     async def build(self, pipeline_config: dict[str, Any]) -> Pipeline:
-        """Build the pipeline.
+        """Build the pipeline, or return the cached pipeline of the same config and environment.
 
         Args:
             pipeline_config (dict[str, Any]): The pipeline configuration.
@@ -45,13 +99,37 @@ class SimplePipelineBuilder(PipelineBuilderPlugin[LMState, SimplePresetConfig]):
         Returns:
             Pipeline: The simple pipeline.
         """
-        model_name = str(pipeline_config.get("model_name") or os.getenv("SIMPLE_PIPELINE_LANGUAGE_MODEL", ""))
-        api_key = os.getenv(pipeline_config.get("api_key") or os.getenv("SIMPLE_PIPELINE_LLM_API_KEY"), "")
-        self.lm = LM(
-            language_model_id=model_name,
-            language_model_credentials=api_key,
+        return await self.build_cache.get_or_build(
+            pipeline_config, self._get_build_env_names(pipeline_config), self._build, config_keys=BUILD_CONFIG_KEYS
         )
-        return self.lm.build()
+
+    async def warm_up(self) -> int:
+        """Build the pipeline of every preset and supported model in `config.yaml`.
+
+        Returns:
+            int: The number of pipelines built.
+        """
+        return await warm_up(self, CONFIG_PATH)
+
+    def invalidate(self, pipeline_config: dict[str, Any] | None = None) -> None:
+        """Drop the cached pipeline of a config, or every cached pipeline, so that the next build reconstructs it.
+
+        Args:
+            pipeline_config (dict[str, Any] | None, optional): The config whose pipeline is dropped. Defaults to None,
+                which drops every pipeline.
+        """
+        env_names = self._get_build_env_names(pipeline_config) if pipeline_config is not None else ()
+        self.build_cache.invalidate(pipeline_config, env_names, config_keys=BUILD_CONFIG_KEYS)
+
+    async def _build(self, pipeline_config: dict[str, Any]) -> Pipeline:
+        model_name, api_key_env = self._get_preset_key(pipeline_config)
+        # The preset owns the model client, so sharing it across builds reuses its HTTP connections.
+        lm = get_model_client_registry().get_client("lm-preset", model_name, api_key_env, self.preset_factory)
+        built = BuiltPreset(lm=lm, pipeline=lm.build())
+
+        with self._presets_lock:
+            self._presets = MappingProxyType({**self._presets, (model_name, api_key_env): built})
+        return built.pipeline
 
     def build_initial_state(
         self, request: dict[str, Any], pipeline_config: dict[str, Any], **kwargs: Any
@@ -65,8 +143,23 @@ class SimplePipelineBuilder(PipelineBuilderPlugin[LMState, SimplePresetConfig]):
 
         Returns:
             LMState: The initial state.
+
+        Raises:
+            ValueError: If the pipeline of the pipeline config has not been built.
         """
-        return self.lm.build_initial_state(
+        key = self._get_preset_key(pipeline_config)
+        built = self._presets.get(key)
+        if built is None:
+            raise ValueError(f"The pipeline of model {key[0]!r} has not been built yet.")
+        return built.lm.build_initial_state(
             query=request.get("message"),
             config={"event_emitter": kwargs.get("event_emitter")},
         )
+
+    def _get_preset_key(self, pipeline_config: dict[str, Any]) -> tuple[str, str]:
+        model_name = str(pipeline_config.get("model_name") or os.getenv("SIMPLE_PIPELINE_LANGUAGE_MODEL", ""))
+        api_key_env = pipeline_config.get("api_key") or "SIMPLE_PIPELINE_LLM_API_KEY"
+        return model_name, api_key_env
+
+    def _get_build_env_names(self, pipeline_config: dict[str, Any]) -> list[str]:
+        return ["SIMPLE_PIPELINE_LANGUAGE_MODEL", self._get_preset_key(pipeline_config)[1]]
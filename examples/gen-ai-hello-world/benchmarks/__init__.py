@@ -0,0 +1 @@
+"""Benchmarks for the gen_ai_hello_world example."""
@@ -0,0 +1,133 @@
+"""Benchmark of the recall and latency of `VectorIndex` searches.
+
+A synthetic corpus of clustered embeddings is written to a temporary index, and a sample of queries is searched
+exhaustively to get the exact top-k. The same queries are then searched with increasing `nprobe`, reporting the
+recall@k against the exact results and the p50/p95 latency, so that `VECTOR_INDEX_NPROBE` can be chosen for a corpus
+size. The index is memory-mapped as in production, so the first rows include page faults unless the file is cached.
+
+Run it from the `gen-ai-hello-world` directory:
+
+    python -m benchmarks.vector_index_benchmark --rows 200000 --dimension 384 --nprobe 1 4 16 64
+"""
+
+import argparse
+import math
+import tempfile
+import time
+
+import numpy as np
+
+from gen_ai_hello_world.vector_index import VectorIndex, VectorIndexWriter
+
+
+def generate_embeddings(rng: np.random.Generator, centers: np.ndarray, rows: int, noise: float) -> np.ndarray:
+    """Generate embeddings scattered around random cluster centers.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        centers (np.ndarray): The cluster centers.
+        rows (int): The number of embeddings.
+        noise (float): The standard deviation of the scatter around the centers.
+
+    Returns:
+        np.ndarray: The embeddings.
+    """
+    return centers[rng.integers(0, len(centers), rows)] + noise * rng.standard_normal((rows, centers.shape[1]))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values (list[float]): The values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * q / 100) - 1, 0)]
+
+
+def build_index(path: str, args: argparse.Namespace, rng: np.random.Generator, centers: np.ndarray) -> float:
+    """Write the synthetic corpus to an index.
+
+    Args:
+        path (str): The index directory.
+        args (argparse.Namespace): The command line arguments.
+        rng (np.random.Generator): The random generator.
+        centers (np.ndarray): The cluster centers of the corpus.
+
+    Returns:
+        float: The duration of the build in seconds, including the training of the IVF lists.
+    """
+    start = time.perf_counter()
+    with VectorIndexWriter(path, args.dimension) as writer:
+        for offset in range(0, args.rows, args.batch_size):
+            rows = min(args.batch_size, args.rows - offset)
+            chunks = [{"id": f"chunk-{offset + i}", "content": ""} for i in range(rows)]
+            writer.add(chunks, generate_embeddings(rng, centers, rows, args.noise))
+        if args.nlist:
+            writer.train(args.nlist)
+    return time.perf_counter() - start
+
+
+def measure(index: VectorIndex, queries: np.ndarray, top_k: int, nprobe: int | None) -> tuple[list[set], list[float]]:
+    """Search every query and time each search.
+
+    Args:
+        index (VectorIndex): The index.
+        queries (np.ndarray): The query embeddings.
+        top_k (int): The number of rows per search.
+        nprobe (int | None): The number of IVF lists scanned, or None for an exhaustive search.
+
+    Returns:
+        tuple[list[set], list[float]]: The rows found for every query and the latency of every search in seconds.
+    """
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows, _ = index.search_rows(query, top_k, nprobe)
+        latencies.append(time.perf_counter() - start)
+        results.append(set(rows.tolist()))
+    return results, latencies
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1_000, help="Number of clusters in the synthetic corpus.")
+    parser.add_argument("--noise", type=float, default=1.0, help="Scatter of the embeddings around their cluster.")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists. Defaults to sqrt(rows).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dimension))
+    with tempfile.TemporaryDirectory() as path:
+        duration = build_index(path, args, rng, centers)
+        index = VectorIndex(path)
+        print(f"rows: {index.count}, dimension: {args.dimension}, lists: {index.manifest.nlist}")
+        print(f"build: {duration:.1f} s ({index.count / duration:.0f} rows/s)")
+
+        queries = generate_embeddings(rng, centers, args.queries, args.noise)
+        exact, latencies = measure(index, queries, args.top_k, None)
+        print(f"{'nprobe':>8} {'recall@' + str(args.top_k):>10} {'p50 ms':>9} {'p95 ms':>9}")
+        p50, p95 = percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000
+        print(f"{'exact':>8} {1:>10.3f} {p50:>9.2f} {p95:>9.2f}")
+        for nprobe in args.nprobe:
+            results, latencies = measure(index, queries, args.top_k, nprobe)
+            recall = np.mean([len(found & expected) / args.top_k for found, expected in zip(results, exact)])
+            p50, p95 = percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000
+            print(f"{nprobe:>8} {recall:>10.3f} {p50:>9.2f} {p95:>9.2f}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
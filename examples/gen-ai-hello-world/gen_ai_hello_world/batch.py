@@ -0,0 +1,170 @@
+"""Batch runner for the gen_ai_hello_world pipeline.
+
+The pipeline is built once and the questions are streamed from a file or stdin. They run concurrently on one event
+loop, up to a configurable number in flight, and each result is written as soon as it is ready, with the time spent
+in every stage of the pipeline. A summary of the latencies is printed at the end.
+
+Every input line is either a JSON object with a `query` and optional `id` and `top_k`, or a plain question:
+
+    {"id": "greeting", "query": "What are the documents?", "top_k": 2}
+    What are the documents?
+
+Usage:
+
+    python gen_ai_hello_world/batch.py questions.jsonl --output results.jsonl --max-in-flight 8
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import Any, AsyncIterator, TextIO
+
+from dotenv import load_dotenv
+from gen_ai_hello_world.main import build_pipeline, ingest_source
+from gen_ai_hello_world.timing import collect_stage_timings
+from gen_ai_hello_world.tracing import trace_invocation
+
+DEFAULT_TOP_K = 4
+DEFAULT_MAX_IN_FLIGHT = 8
+
+
+async def read_questions(source: TextIO) -> AsyncIterator[dict[str, Any]]:
+    """Read questions line by line without blocking the event loop.
+
+    Args:
+        source (TextIO): The file or stdin.
+
+    Yields:
+        dict[str, Any]: The question, with at least a `query`.
+    """
+    loop = asyncio.get_running_loop()
+    while line := await loop.run_in_executor(None, source.readline):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            question = json.loads(line)
+        except json.JSONDecodeError:
+            question = line
+        yield question if isinstance(question, dict) else {"query": str(question)}
+
+
+async def run_question(pipeline: Any, index: int, question: dict[str, Any], default_top_k: int) -> dict[str, Any]:
+    """Run one question through the pipeline.
+
+    Args:
+        pipeline (Any): The pipeline.
+        index (int): The position of the question in the input.
+        question (dict[str, Any]): The question.
+        default_top_k (int): The number of chunks retrieved when the question does not set `top_k`.
+
+    Returns:
+        dict[str, Any]: The result, with the response or the error and the seconds spent per stage.
+    """
+    result = {"index": index, "id": question.get("id"), "query": question.get("query"), "response": None, "error": None}
+    start = time.perf_counter()
+    with collect_stage_timings() as timings:
+        try:
+            with trace_invocation() as span:
+                if span is not None:
+                    span.attributes.update({"batch.index": index, "batch.id": str(question.get("id"))})
+                state = await pipeline.invoke(
+                    {"user_query": question.get("query")}, {"top_k": question.get("top_k", default_top_k)}
+                )
+            result["response"] = state.get("response")
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["timings"] = {**timings, "total": time.perf_counter() - start}
+    return result
+
+
+async def run_batch(
+    source: TextIO, sink: TextIO, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, top_k: int = DEFAULT_TOP_K
+) -> list[dict[str, Any]]:
+    """Run every question of a source through one pipeline and write the results as they complete.
+
+    Args:
+        source (TextIO): The questions.
+        sink (TextIO): Receives one JSON line per result, in the order the questions complete.
+        max_in_flight (int, optional): The maximum number of questions running at once. Defaults to 8.
+        top_k (int, optional): The number of chunks retrieved when a question does not set `top_k`. Defaults to 4.
+
+    Returns:
+        list[dict[str, Any]]: The stage timings and error of every question, for the summary.
+    """
+    await ingest_source()
+    pipeline = build_pipeline()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks: set[asyncio.Task] = set()
+    summaries = []
+
+    async def run(index: int, question: dict[str, Any]) -> None:
+        try:
+            result = await run_question(pipeline, index, question, top_k)
+            sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sink.flush()
+            summaries.append({"error": result["error"], "timings": result["timings"]})
+        finally:
+            in_flight.release()
+
+    index = 0
+    async for question in read_questions(source):
+        # Questions are only read when one of the running questions has finished, so memory stays bounded.
+        await in_flight.acquire()
+        task = asyncio.create_task(run(index, question))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        index += 1
+    await asyncio.gather(*tasks)
+    return summaries
+
+
+def summarize(summaries: list[dict[str, Any]], duration: float) -> str:
+    """Summarize the latencies of a batch.
+
+    Args:
+        summaries (list[dict[str, Any]]): The stage timings and error of every question.
+        duration (float): The wall-clock duration of the batch in seconds.
+
+    Returns:
+        str: The number of questions and failures, and the p50, p95 and max latency of every stage.
+    """
+    failed = sum(summary["error"] is not None for summary in summaries)
+    lines = [f"questions: {len(summaries)}, failed: {failed}, duration: {duration:.2f} s"]
+    stages = dict.fromkeys(stage for summary in summaries for stage in summary["timings"])
+    for stage in stages:
+        values = sorted(summary["timings"][stage] for summary in summaries if stage in summary["timings"])
+        p50, p95 = (values[max(math.ceil(len(values) * q) - 1, 0)] for q in (0.5, 0.95))
+        maximum = values[-1]
+        lines.append(f"{stage:>22}: p50 {p50 * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  max {maximum * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+def main():
+    """Run a batch of questions from the command line."""
+    parser = argparse.ArgumentParser(description="Run a batch of questions through the gen_ai_hello_world pipeline.")
+    parser.add_argument("input", nargs="?", default="-", help="The questions, one per line. Defaults to stdin.")
+    parser.add_argument("--output", default="-", help="The JSONL file the results are written to. Defaults to stdout.")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    load_dotenv()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        summaries = asyncio.run(run_batch(source, sink, args.max_in_flight, args.top_k))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(summarize(summaries, time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
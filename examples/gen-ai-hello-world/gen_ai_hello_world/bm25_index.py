@@ -0,0 +1,310 @@
+"""BM25 keyword index over the chunks of a vector index.
+
+Keyword search finds exact identifiers, e.g. repository names or ticket IDs, that embeddings tend to blur. The index
+is derived from the chunks of a `VectorIndex` and shares its rows, so the two rankings can be fused and deleted rows
+are skipped by both. It is kept in the `bm25` directory of the vector index as immutable segments, each covering a
+range of rows:
+
+- `vocabulary.json`: the position of every term of the segment.
+- `postings_offsets.npy`, `postings_rows.npy` and `postings_tfs.npy`: the rows containing each term, as uint32
+  relative to the first row of the segment, and the uint16 frequency of the term in each row.
+- `document_lengths.npy`: the number of tokens of every row.
+
+`sync` is run by the writer of the vector index, e.g. the ingestion. It indexes the rows added since the last sync as
+a new segment, and rebuilds the segments once there are more than `MAX_SEGMENTS`. Writers in other processes are
+serialized by a lock file, and the replaced segments are only deleted `SEGMENT_GRACE_PERIOD` seconds later, since
+readers may still be searching them. Searches never write: segments are loaded lazily on the first search, their
+postings are memory-mapped, and `refresh` picks up the segments of a newer sync.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import numpy as np
+
+from gen_ai_hello_world.vector_index import VectorIndex
+
+BM25_DIRECTORY = "bm25"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+MAX_SEGMENTS = 10
+MAX_SEGMENT_ROWS = 1_000_000
+SEGMENT_GRACE_PERIOD = 600.0
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+_COMPOUND_TOKEN = re.compile(r"\w+(?:[-./#:]\w+)*")
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase tokens, keeping identifiers whole.
+
+    Compound tokens such as `GDP-ADMIN/bosa-sdk` or `PROJ-1234` are kept as one token and also split into their words,
+    so that they match both exactly and by part.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The tokens.
+    """
+    tokens = []
+    for match in _COMPOUND_TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_WORD.findall(token))
+    return tokens
+
+
+@dataclass
+class _Segment:
+    path: Path
+    start_row: int
+    row_count: int
+    total_length: int
+
+    def __post_init__(self):
+        self._vocabulary: dict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._lock:
+            if self._vocabulary is not None:
+                return
+            self.postings_offsets = np.load(self.path / "postings_offsets.npy")
+            self.postings_rows = np.load(self.path / "postings_rows.npy", mmap_mode="r")
+            self.postings_tfs = np.load(self.path / "postings_tfs.npy", mmap_mode="r")
+            self.document_lengths = np.load(self.path / "document_lengths.npy", mmap_mode="r")
+            self._vocabulary = json.loads((self.path / "vocabulary.json").read_text())
+
+    def get_postings(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        position = self._vocabulary.get(term)
+        if position is None:
+            return None
+        start, end = self.postings_offsets[position], self.postings_offsets[position + 1]
+        return self.postings_rows[start:end], self.postings_tfs[start:end]
+
+
+class BM25Index:
+    """A segmented BM25 index that follows the rows of a vector index.
+
+    Attributes:
+        path (Path): The directory of the BM25 index.
+        k1 (float): The term frequency saturation of BM25.
+        b (float): The document length normalization of BM25.
+    """
+
+    def __init__(self, path: str | Path, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self._segments: list[_Segment] | None = None
+        self._manifest_mtime: int | None = None
+        self._sync_lock = threading.Lock()
+
+    @classmethod
+    def for_vector_index(cls, index_path: str | Path) -> "BM25Index":
+        """Return the BM25 index kept next to a vector index.
+
+        Args:
+            index_path (str | Path): The directory of the vector index.
+
+        Returns:
+            BM25Index: The BM25 index.
+        """
+        return cls(Path(index_path) / BM25_DIRECTORY)
+
+    @property
+    def indexed_rows(self) -> int:
+        """The number of rows of the vector index covered by the segments."""
+        return self._load_manifest()["indexed_rows"]
+
+    def sync(self, index: VectorIndex) -> int:
+        """Index the rows added to a vector index since the last sync. Only the writer of the index should call this.
+
+        Args:
+            index (VectorIndex): The vector index.
+
+        Returns:
+            int: The number of rows indexed.
+        """
+        with self._sync_lock, _lock_file(self.path / LOCK_FILE):
+            manifest = self._load_manifest()
+            now = time.time()
+            retired = manifest.get("retired", [])
+            expired = [segment for segment in retired if now - segment["retired_at"] >= SEGMENT_GRACE_PERIOD]
+            manifest["retired"] = [segment for segment in retired if segment not in expired]
+            start_row = manifest["indexed_rows"]
+            if start_row >= index.count and not expired:
+                return 0
+            if start_row < index.count and len(manifest["segments"]) >= MAX_SEGMENTS:
+                for segment in manifest["segments"]:
+                    manifest["retired"].append({"name": segment["name"], "retired_at": now})
+                manifest["segments"], start_row = [], 0
+
+            for segment_start in range(start_row, index.count, MAX_SEGMENT_ROWS):
+                segment_end = min(segment_start + MAX_SEGMENT_ROWS, index.count)
+                name = f"segment-{manifest['next_segment']:06d}"
+                manifest["next_segment"] += 1
+                manifest["segments"].append(_write_segment(self.path / name, index, segment_start, segment_end))
+            manifest["indexed_rows"] = max(index.count, manifest["indexed_rows"])
+            self._save_manifest(manifest)
+            for segment in expired:
+                shutil.rmtree(self.path / segment["name"], ignore_errors=True)
+            self._segments = None
+            return max(index.count - start_row, 0)
+
+    def refresh(self) -> None:
+        """Pick up the segments of a sync made since they were loaded, e.g. by another process."""
+        manifest_path = self.path / MANIFEST_FILE
+        mtime = manifest_path.stat().st_mtime_ns if manifest_path.exists() else None
+        if mtime != self._manifest_mtime:
+            self._segments = None
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        is_deleted: Callable[[np.ndarray], np.ndarray] | None = None,
+        predicate: Callable[[int], bool] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the rows that best match the keywords of a query.
+
+        Args:
+            query (str): The query.
+            top_k (int): The maximum number of rows returned.
+            is_deleted (Callable[[np.ndarray], np.ndarray] | None, optional): Flags the deleted rows, e.g.
+                `VectorIndex.is_deleted`. Defaults to None.
+            predicate (Callable[[int], bool] | None, optional): Accepts or rejects a row. Rows are checked in order
+                of score until `top_k` are accepted. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The rows and their BM25 scores, best first.
+        """
+        segments = self._get_segments()
+        terms = set(tokenize(query))
+        document_count = sum(segment.row_count for segment in segments)
+        if not terms or not document_count:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        average_length = sum(segment.total_length for segment in segments) / document_count
+
+        postings = [(segment, term, segment.get_postings(term)) for segment in segments for term in terms]
+        postings = [(segment, term, found) for segment, term, found in postings if found is not None]
+        document_frequencies = Counter()
+        for _, term, (rows, _) in postings:
+            document_frequencies[term] += len(rows)
+
+        all_rows, all_scores = [], []
+        for segment, term, (rows, tfs) in postings:
+            frequency = document_frequencies[term]
+            idf = math.log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+            tfs = np.asarray(tfs, dtype=np.float32)
+            lengths = np.asarray(segment.document_lengths[rows], dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            all_rows.append(np.asarray(rows, dtype=np.int64) + segment.start_row)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        if is_deleted is not None:
+            live = ~is_deleted(rows)
+            rows, scores = rows[live], scores[live]
+        order = np.argsort(-scores, kind="stable")
+        selected = []
+        for i in order.tolist():
+            if predicate is None or predicate(int(rows[i])):
+                selected.append(i)
+                if len(selected) == top_k:
+                    break
+        return rows[selected], scores[selected]
+
+    def _get_segments(self) -> list[_Segment]:
+        segments = self._segments
+        if segments is None:
+            manifest_path = self.path / MANIFEST_FILE
+            self._manifest_mtime = manifest_path.stat().st_mtime_ns if manifest_path.exists() else None
+            segments = [
+                _Segment(self.path / entry["name"], entry["start_row"], entry["row_count"], entry["total_length"])
+                for entry in self._load_manifest()["segments"]
+            ]
+            for segment in segments:
+                segment.load()
+            self._segments = segments
+        return segments
+
+    def _load_manifest(self) -> dict:
+        manifest_path = self.path / MANIFEST_FILE
+        if not manifest_path.exists():
+            return {"segments": [], "indexed_rows": 0, "next_segment": 0}
+        return {"retired": [], **json.loads(manifest_path.read_text())}
+
+    def _save_manifest(self, manifest: dict) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path / f"{MANIFEST_FILE}.tmp"
+        temporary_path.write_text(json.dumps(manifest))
+        os.replace(temporary_path, self.path / MANIFEST_FILE)
+
+
+@contextmanager
+def _lock_file(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as file:
+        if os.name == "nt":
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        # The lock is released when the file is closed.
+        yield
+
+
+def _iter_contents(index: VectorIndex, start_row: int, end_row: int) -> Iterator[str]:
+    for row in range(start_row, end_row):
+        yield index.get_chunk(row)["content"]
+
+
+def _write_segment(path: Path, index: VectorIndex, start_row: int, end_row: int) -> dict:
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    document_lengths = np.zeros(end_row - start_row, dtype=np.uint32)
+    for local_row, content in enumerate(_iter_contents(index, start_row, end_row)):
+        tokens = tokenize(content)
+        document_lengths[local_row] = len(tokens)
+        for term, frequency in Counter(tokens).items():
+            postings[term].append((local_row, min(frequency, np.iinfo(np.uint16).max)))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+    rows = np.fromiter((row for term in terms for row, _ in postings[term]), dtype=np.uint32, count=offsets[-1])
+    tfs = np.fromiter((tf for term in terms for _, tf in postings[term]), dtype=np.uint16, count=offsets[-1])
+
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "postings_offsets.npy", offsets)
+    np.save(path / "postings_rows.npy", rows)
+    np.save(path / "postings_tfs.npy", tfs)
+    np.save(path / "document_lengths.npy", document_lengths)
+    (path / "vocabulary.json").write_text(json.dumps({term: position for position, term in enumerate(terms)}))
+    return {
+        "name": path.name,
+        "start_row": start_row,
+        "row_count": end_row - start_row,
+        "total_length": int(document_lengths.sum()),
+    }
@@ -0,0 +1,220 @@
+"""Token-budget context packing for the gen_ai_hello_world pipeline.
+
+The packer turns the retrieved chunks into the context of the prompt. It drops near-duplicate chunks, orders the rest
+by score and adds them until a token budget is filled, so the prompt stays small however many chunks are retrieved.
+
+Tokens are counted with `tiktoken` when it is installed and the encoding of the model can be loaded, and estimated
+from the words and punctuation of the text otherwise.
+"""
+
+import math
+import os
+import re
+from typing import Any
+
+from gllm_core.schema import Chunk, Component
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_DEDUPE_THRESHOLD = 0.8
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_DELIMITER = "\n\n"
+FALLBACK_ENCODING = "o200k_base"
+
+_ESTIMATE_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w+")
+
+
+class TokenCounter:
+    """Counts and truncates tokens with the tokenizer of a model, or an estimate if it is unavailable.
+
+    Attributes:
+        model (str | None): The model whose tokenizer is used.
+        encoding (Any): The `tiktoken` encoding, or None if the tokens are estimated.
+    """
+
+    def __init__(self, model: str | None = None):
+        """Initialize the token counter.
+
+        Args:
+            model (str | None, optional): The model whose tokenizer is used. Defaults to None, which uses the
+                `o200k_base` encoding.
+        """
+        self.model = model
+        self.encoding = _load_encoding(model)
+
+    def count(self, text: str) -> int:
+        """Count the tokens of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if self.encoding is not None:
+            return len(self.encoding.encode_ordinary(text))
+        return sum(_estimate(match.group()) for match in _ESTIMATE_TOKEN.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text to a number of tokens.
+
+        Args:
+            text (str): The text.
+            max_tokens (int): The maximum number of tokens kept.
+
+        Returns:
+            str: The start of the text with at most `max_tokens` tokens.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        count = 0
+        for match in _ESTIMATE_TOKEN.finditer(text):
+            count += _estimate(match.group())
+            if count > max_tokens:
+                return text[: match.start()].rstrip()
+        return text
+
+
+class ContextPacker(Component):
+    """Packs the best distinct chunks into a context that fits a token budget.
+
+    Chunks are ordered by score, best first, and chunks without a score keep the order of the retriever. A chunk whose
+    word shingles overlap a better chunk by at least `dedupe_threshold` (Jaccard similarity) is dropped. The rest are
+    added while they fit the budget, and smaller chunks further down can fill what is left. Only if no chunk fits at
+    all is the best one truncated to the budget.
+
+    Attributes:
+        token_budget (int): The maximum number of tokens of the context.
+        dedupe_threshold (float): The shingle overlap from which a chunk counts as a duplicate.
+        shingle_size (int): The number of words per shingle.
+        delimiter (str): Separates the chunks in the context.
+        token_counter (TokenCounter): Counts the tokens.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        dedupe_threshold: float = DEFAULT_DEDUPE_THRESHOLD,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        delimiter: str = DEFAULT_DELIMITER,
+        token_counter: TokenCounter | None = None,
+    ):
+        """Initialize the context packer.
+
+        Args:
+            token_budget (int, optional): The maximum number of tokens of the context. Defaults to 3000.
+            dedupe_threshold (float, optional): The shingle overlap from which a chunk counts as a duplicate.
+                Defaults to 0.8.
+            shingle_size (int, optional): The number of words per shingle. Defaults to 5.
+            delimiter (str, optional): Separates the chunks in the context. Defaults to a blank line.
+            token_counter (TokenCounter | None, optional): Counts the tokens. Defaults to None, which uses the
+                `o200k_base` encoding.
+        """
+        super().__init__()
+        self.token_budget = token_budget
+        self.dedupe_threshold = dedupe_threshold
+        self.shingle_size = shingle_size
+        self.delimiter = delimiter
+        self.token_counter = token_counter or TokenCounter()
+
+    async def _run(self, chunks: list[Chunk], **kwargs: Any) -> str:
+        """Pack the chunks into a context.
+
+        Args:
+            chunks (list[Chunk]): The retrieved chunks.
+            **kwargs (Any): Ignored.
+
+        Returns:
+            str: The context.
+        """
+        return self.pack(chunks)
+
+    def pack(self, chunks: list[Chunk]) -> str:
+        """Pack chunks into a context.
+
+        Args:
+            chunks (list[Chunk]): The chunks.
+
+        Returns:
+            str: The contents of the selected chunks, best first, joined by the delimiter.
+        """
+        ranked = sorted(
+            enumerate(chunks),
+            key=lambda entry: (entry[1].score is None, -(entry[1].score or 0.0), entry[0]),
+        )
+        delimiter_tokens = self.token_counter.count(self.delimiter)
+        remaining = self.token_budget
+        selected: list[str] = []
+        kept_shingles: list[set[int]] = []
+        best_content = None
+        for _, chunk in ranked:
+            content = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+            if not content.strip():
+                continue
+            shingles = self._get_shingles(content)
+            if any(_jaccard(shingles, kept) >= self.dedupe_threshold for kept in kept_shingles):
+                continue
+            best_content = best_content or content
+            cost = self.token_counter.count(content) + (delimiter_tokens if selected else 0)
+            if cost > remaining:
+                continue
+            selected.append(content)
+            kept_shingles.append(shingles)
+            remaining -= cost
+            if remaining <= delimiter_tokens:
+                break
+        if not selected and best_content is not None:
+            return self.token_counter.truncate(best_content, self.token_budget)
+        return self.delimiter.join(selected)
+
+    def _get_shingles(self, content: str) -> set[int]:
+        words = _WORD.findall(content.lower())
+        if len(words) <= self.shingle_size:
+            return {hash(tuple(words))}
+        return {hash(tuple(words[i : i + self.shingle_size])) for i in range(len(words) - self.shingle_size + 1)}
+
+
+def get_context_packer(model: str | None = None) -> ContextPacker:
+    """Create the context packer configured by the environment.
+
+    Args:
+        model (str | None, optional): The model whose tokenizer counts the tokens. Defaults to None.
+
+    Returns:
+        ContextPacker: The packer, with the budget of `CONTEXT_TOKEN_BUDGET` and the duplicate threshold of
+            `CONTEXT_DEDUPE_THRESHOLD`.
+    """
+    return ContextPacker(
+        token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET))),
+        dedupe_threshold=float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", str(DEFAULT_DEDUPE_THRESHOLD))),
+        token_counter=TokenCounter(model),
+    )
+
+
+def _load_encoding(model: str | None) -> Any:
+    try:
+        import tiktoken
+
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception:
+        # tiktoken is not installed, or its encodings, which are downloaded on first use, cannot be fetched offline.
+        return None
+
+
+def _estimate(token: str) -> int:
+    # Words average about four characters per token, and punctuation is a token of its own.
+    return max(1, math.ceil(len(token) / 4))
+
+
+def _jaccard(first: set[int], second: set[int]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
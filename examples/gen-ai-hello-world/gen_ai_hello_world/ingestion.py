@@ -0,0 +1,460 @@
+"""Incremental ingestion of documents into a vector index.
+
+Documents are read from text and Markdown files, or from JSONL files with one document per line. Each document is
+split into overlapping chunks, and the chunks are embedded in batches, several batches at a time, and appended to a
+`VectorIndex`. Everything streams, so memory stays flat however large the corpus is.
+
+The content hash of every ingested document is kept in `ingestion.sqlite3` next to the index. On a re-run, unchanged
+documents are skipped, changed documents replace their previous chunks, and, with `prune`, documents that are gone
+from the source are deleted. The index is committed every `commit_every` chunks. A crashed run leaves at most the
+chunks of its last document in the index; they are deleted by the next run. The BM25 index of the chunks is brought
+up to date at the end of every run.
+
+Usage:
+
+    python gen_ai_hello_world/ingestion.py ./documents --index ./vector_index --batch-size 64 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from dotenv import load_dotenv
+from gen_ai_hello_world.bm25_index import BM25Index
+from gen_ai_hello_world.vector_index import IndexManifest, VectorIndex, VectorIndexWriter
+
+STATE_FILE = "ingestion.sqlite3"
+TEXT_SUFFIXES = (".txt", ".md")
+DOCUMENT_SUFFIXES = (*TEXT_SUFFIXES, ".jsonl")
+READ_BLOCK_SIZE = 1 << 20
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CONCURRENCY = 4
+DEFAULT_COMMIT_EVERY = 10_000
+
+
+@dataclass
+class SourceDocument:
+    """A document of the source.
+
+    Attributes:
+        id (str): The ID of the document, e.g. its path relative to the source.
+        content_hash (str): The hash of the content and metadata of the document.
+        metadata (dict[str, Any]): The metadata copied to every chunk.
+        read (Callable[[], Iterable[str]]): Reads the content of the document in blocks.
+    """
+
+    id: str
+    content_hash: str
+    metadata: dict[str, Any]
+    read: Callable[[], Iterable[str]]
+
+
+@dataclass
+class IngestionSummary:
+    """The outcome of an ingestion run.
+
+    Attributes:
+        added (int): The number of new documents.
+        updated (int): The number of changed documents, whose previous chunks were deleted.
+        unchanged (int): The number of documents skipped because their content hash did not change.
+        deleted (int): The number of documents deleted because they are gone from the source.
+        chunks (int): The number of chunks embedded.
+        duration (float): The duration of the run in seconds.
+    """
+
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    chunks: int = 0
+    duration: float = 0.0
+
+
+def iter_documents(source: str | Path) -> Iterator[SourceDocument]:
+    """Read the documents of a file or directory lazily.
+
+    Text and Markdown files are one document each, whose ID is the path relative to the source. JSONL files hold one
+    document per line, with an `id`, a `content` and optional `metadata`.
+
+    Args:
+        source (str | Path): A file or a directory, which is read recursively.
+
+    Yields:
+        SourceDocument: The documents, in path order.
+    """
+    source = Path(source)
+    paths = [source] if source.is_file() else sorted(source.rglob("*"))
+    for path in paths:
+        if not path.is_file() or path.suffix not in DOCUMENT_SUFFIXES:
+            continue
+        relative_path = path.name if path == source else path.relative_to(source).as_posix()
+        if path.suffix == ".jsonl":
+            yield from _iter_jsonl_documents(path)
+        else:
+            yield SourceDocument(
+                id=relative_path,
+                content_hash=_hash_blocks(_read_blocks(path), {"path": relative_path}),
+                metadata={"source": relative_path},
+                read=lambda path=path: _read_blocks(path),
+            )
+
+
+def split_text(
+    blocks: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
+) -> Iterator[str]:
+    """Split a stream of text into overlapping chunks, preferably at paragraph, line, sentence or word breaks.
+
+    Args:
+        blocks (Iterable[str]): The text, in blocks of any size.
+        chunk_size (int, optional): The maximum number of characters of a chunk. Defaults to 1000.
+        chunk_overlap (int, optional): The number of characters repeated from the end of the previous chunk. Must be
+            less than half of `chunk_size`. Defaults to 200.
+
+    Yields:
+        str: The chunks, without surrounding whitespace.
+
+    Raises:
+        ValueError: If the overlap is too large for the chunk size.
+    """
+    if chunk_overlap * 2 >= chunk_size:
+        raise ValueError("chunk_overlap must be less than half of chunk_size.")
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        while len(buffer) > chunk_size:
+            end = _find_break(buffer, chunk_size)
+            if chunk := buffer[:end].strip():
+                yield chunk
+            buffer = buffer[end - chunk_overlap :]
+    if chunk := buffer.strip():
+        yield chunk
+
+
+class IngestionState:
+    """The content hash and the rows of every ingested document, kept in SQLite.
+
+    Attributes:
+        path (Path): The SQLite file.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, first_row INTEGER NOT NULL, row_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+
+    def get(self, document_id: str) -> tuple[str, int, int] | None:
+        """Return the content hash, first row and number of rows of a document.
+
+        Args:
+            document_id (str): The ID of the document.
+
+        Returns:
+            tuple[str, int, int] | None: The state of the document, or None if it was never ingested.
+        """
+        return self._connection.execute(
+            "SELECT content_hash, first_row, row_count FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterate the IDs of the ingested documents.
+
+        Yields:
+            str: The IDs.
+        """
+        for (document_id,) in self._connection.execute("SELECT id FROM documents").fetchall():
+            yield document_id
+
+    @property
+    def ingested_rows(self) -> int | None:
+        """The number of index rows accounted for by ingested or deleted documents, or None before the first run."""
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'ingested_rows'").fetchone()
+        return row[0] if row else None
+
+    def save(self, documents: Iterable[tuple[str, str, int, int]], deleted: Iterable[str], ingested_rows: int) -> None:
+        """Record the documents of a committed part of the index in one transaction.
+
+        Args:
+            documents (Iterable[tuple[str, str, int, int]]): The ID, content hash, first row and number of rows of the
+                ingested documents.
+            deleted (Iterable[str]): The IDs of the deleted documents.
+            ingested_rows (int): The number of rows accounted for.
+        """
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)", documents)
+            self._connection.executemany("DELETE FROM documents WHERE id = ?", ((id_,) for id_ in deleted))
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('ingested_rows', ?)", (ingested_rows,))
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        self._connection.close()
+
+
+@dataclass
+class _Batch:
+    chunks: list[dict[str, Any]] = field(default_factory=list)
+    # The documents that end in this batch, with their content hash and the position after their last chunk.
+    completed: list[tuple[str, str, int]] = field(default_factory=list)
+
+
+class Ingestor:
+    """Ingests documents into a vector index, skipping the documents that did not change since the last run.
+
+    Attributes:
+        index_path (Path): The directory of the index.
+        em_invoker (Any): The embedding model invoker. Its `invoke` receives a list of texts.
+        batch_size (int): The number of chunks embedded per call.
+        concurrency (int): The maximum number of embedding calls in flight.
+        chunk_size (int): The maximum number of characters of a chunk.
+        chunk_overlap (int): The number of characters repeated between consecutive chunks.
+        commit_every (int): The number of chunks after which the index is committed.
+    """
+
+    def __init__(
+        self,
+        index_path: str | Path,
+        em_invoker: Any,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        commit_every: int = DEFAULT_COMMIT_EVERY,
+    ):
+        self.index_path = Path(index_path)
+        self.em_invoker = em_invoker
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.commit_every = commit_every
+
+    async def ingest(self, documents: Iterable[SourceDocument], prune: bool = False) -> IngestionSummary:
+        """Ingest documents.
+
+        Args:
+            documents (Iterable[SourceDocument]): The documents, e.g. from `iter_documents`. Their IDs must be unique.
+            prune (bool, optional): Whether to delete the documents that were ingested before but are not among
+                `documents`. Defaults to False.
+
+        Returns:
+            IngestionSummary: The outcome of the run.
+        """
+        start = time.perf_counter()
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        state = IngestionState(self.index_path / STATE_FILE)
+        summary = IngestionSummary()
+        # The writer is opened with the first embeddings, whose dimension is unknown before.
+        writer: VectorIndexWriter | None = None
+        manifest = IndexManifest.load(self.index_path)
+        if manifest is not None:
+            writer = VectorIndexWriter(self.index_path, manifest.dimension)
+            self._delete_orphaned_rows(writer, state)
+
+        seen: set[str] = set()
+        deletes: list[range] = []
+        pending_documents: list[tuple[str, str, int, int]] = []
+        document_rows: dict[str, int] = {}
+        uncommitted_chunks = 0
+        embeddings: deque[tuple[_Batch, asyncio.Task]] = deque()
+
+        async def write_next_batch() -> None:
+            nonlocal writer, uncommitted_chunks
+            batch, task = embeddings.popleft()
+            vectors = await task
+            if writer is None and vectors:
+                writer = VectorIndexWriter(self.index_path, len(vectors[0]))
+            first_row = writer.manifest.count if writer is not None else 0
+            for index, chunk in enumerate(batch.chunks):
+                document_rows.setdefault(chunk["metadata"]["document_id"], first_row + index)
+            for document_id, content_hash, end in batch.completed:
+                end_row = first_row + end
+                document_first_row = document_rows.pop(document_id, end_row)
+                pending_documents.append((document_id, content_hash, document_first_row, end_row - document_first_row))
+            if batch.chunks:
+                writer.add(batch.chunks, vectors)
+                uncommitted_chunks += len(batch.chunks)
+                summary.chunks += len(batch.chunks)
+            if uncommitted_chunks >= self.commit_every:
+                self._commit(writer, state, pending_documents, document_rows)
+                uncommitted_chunks = 0
+
+        try:
+            for batch in self._iter_batches(documents, state, seen, summary, deletes):
+                texts = [chunk["content"] for chunk in batch.chunks]
+                embeddings.append((batch, asyncio.create_task(self._embed(texts))))
+                if len(embeddings) >= self.concurrency:
+                    await write_next_batch()
+                if writer is not None and deletes:
+                    writer.delete_rows(row for rows in deletes for row in rows)
+                    deletes.clear()
+            while embeddings:
+                await write_next_batch()
+
+            deleted_ids = []
+            if prune and writer is not None:
+                for document_id in list(state.iter_ids()):
+                    if document_id not in seen:
+                        _, first_row, row_count = state.get(document_id)
+                        writer.delete_rows(range(first_row, first_row + row_count))
+                        deleted_ids.append(document_id)
+                summary.deleted = len(deleted_ids)
+            if writer is not None:
+                self._commit(writer, state, pending_documents, document_rows, deleted_ids)
+                BM25Index.for_vector_index(self.index_path).sync(VectorIndex(self.index_path))
+        finally:
+            for _, task in embeddings:
+                task.cancel()
+            if writer is not None:
+                writer.close()
+            state.close()
+
+        summary.duration = time.perf_counter() - start
+        return summary
+
+    async def _embed(self, texts: list[str]) -> list[list[float]]:
+        return await self.em_invoker.invoke(texts) if texts else []
+
+    def _iter_batches(
+        self,
+        documents: Iterable[SourceDocument],
+        state: IngestionState,
+        seen: set[str],
+        summary: IngestionSummary,
+        deletes: list[range],
+    ) -> Iterator[_Batch]:
+        batch = _Batch()
+        for document in documents:
+            seen.add(document.id)
+            content_hash = self._hash(document)
+            previous = state.get(document.id)
+            if previous is not None and previous[0] == content_hash:
+                summary.unchanged += 1
+                continue
+            if previous is not None:
+                summary.updated += 1
+                deletes.append(range(previous[1], previous[1] + previous[2]))
+            else:
+                summary.added += 1
+
+            chunks = split_text(document.read(), self.chunk_size, self.chunk_overlap)
+            for index, content in enumerate(chunks):
+                if len(batch.chunks) == self.batch_size:
+                    yield batch
+                    batch = _Batch()
+                batch.chunks.append(
+                    {
+                        "id": f"{document.id}#{index}",
+                        "content": content,
+                        "metadata": {**document.metadata, "document_id": document.id, "chunk_index": index},
+                    }
+                )
+            batch.completed.append((document.id, content_hash, len(batch.chunks)))
+        if batch.chunks or batch.completed:
+            yield batch
+
+    def _hash(self, document: SourceDocument) -> str:
+        # The chunking parameters are part of the hash, so that changing them re-ingests every document.
+        return hashlib.sha256(f"{document.content_hash}:{self.chunk_size}:{self.chunk_overlap}".encode()).hexdigest()
+
+    def _commit(
+        self,
+        writer: VectorIndexWriter,
+        state: IngestionState,
+        documents: list[tuple[str, str, int, int]],
+        document_rows: dict[str, int],
+        deleted_ids: Iterable[str] = (),
+    ) -> None:
+        writer.commit()
+        # The rows of a document that is still being written are not accounted for until it is complete.
+        ingested_rows = min(document_rows.values(), default=writer.manifest.count)
+        state.save(documents, deleted_ids, ingested_rows)
+        documents.clear()
+
+    def _delete_orphaned_rows(self, writer: VectorIndexWriter, state: IngestionState) -> None:
+        # Rows after the accounted ones were written by a run that crashed before completing their document.
+        ingested_rows = state.ingested_rows
+        if ingested_rows is not None and ingested_rows < writer.manifest.count:
+            writer.delete_rows(range(ingested_rows, writer.manifest.count))
+            writer.commit()
+            state.save([], [], writer.manifest.count)
+
+
+def _iter_jsonl_documents(path: Path) -> Iterator[SourceDocument]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            content, metadata = record["content"], record.get("metadata") or {}
+            yield SourceDocument(
+                id=str(record["id"]),
+                content_hash=_hash_blocks([content], metadata),
+                metadata=metadata,
+                read=lambda content=content: [content],
+            )
+
+
+def _read_blocks(path: Path) -> Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as file:
+        while block := file.read(READ_BLOCK_SIZE):
+            yield block
+
+
+def _hash_blocks(blocks: Iterable[str], metadata: dict[str, Any]) -> str:
+    digest = hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode())
+    for block in blocks:
+        digest.update(block.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _find_break(text: str, chunk_size: int) -> int:
+    for separator in ("\n\n", "\n", ". ", " "):
+        position = text.rfind(separator, chunk_size // 2, chunk_size)
+        if position != -1:
+            return position + len(separator)
+    return chunk_size
+
+
+def main():
+    """Ingest a file or directory from the command line."""
+    from gen_ai_hello_world.main import build_em_invoker
+
+    parser = argparse.ArgumentParser(description="Ingest documents into the vector index of gen_ai_hello_world.")
+    parser.add_argument("source", help="A file or directory of .txt, .md and .jsonl documents.")
+    parser.add_argument("--index", default="vector_index", help="The directory of the index.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunks per embedding call.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Embedding calls in flight.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--prune", action="store_true", help="Delete documents that are gone from the source.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    ingestor = Ingestor(
+        args.index, build_em_invoker(), args.batch_size, args.concurrency, args.chunk_size, args.chunk_overlap
+    )
+    summary = asyncio.run(ingestor.ingest(iter_documents(args.source), args.prune))
+    print(
+        f"added: {summary.added}, updated: {summary.updated}, unchanged: {summary.unchanged}, "
+        f"deleted: {summary.deleted}, chunks: {summary.chunks}, duration: {summary.duration:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
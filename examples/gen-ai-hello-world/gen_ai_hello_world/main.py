@@ -8,16 +8,25 @@ In production, you should use other implementation of DataStore.
 
 import asyncio
 import os
+import sys
 
 from dotenv import load_dotenv
 from gllm_generation.response_synthesizer import StuffResponseSynthesizer
+from gllm_inference.em_invoker import OpenAIEMInvoker
 from gllm_inference.lm_invoker import OpenAILMInvoker
 from gllm_inference.prompt_builder import OpenAIPromptBuilder
 from gllm_inference.request_processor import LMRequestProcessor
-from gllm_misc.context_manipulator import Repacker
 from gllm_pipeline.steps import BundlerStep, step
 from gllm_retrieval.retriever import BasicRetriever
+from gen_ai_hello_world.context_packer import get_context_packer
 from gen_ai_hello_world.custom_data_store import CustomDataStore
+from gen_ai_hello_world.ingestion import IngestionSummary, Ingestor, iter_documents
+from gen_ai_hello_world.prefetch import Prefetcher
+from gen_ai_hello_world.retrieval_cache import get_retrieval_cache
+from gen_ai_hello_world.streaming import StreamingPipeline
+from gen_ai_hello_world.timing import timed_step
+from gen_ai_hello_world.tracing import trace_invocation, traced_step
+from gen_ai_hello_world.vector_data_store import HybridDataStore, VectorDataStore
 
 SYSTEM_PROMPT = """
 You are an AI assistant.
@@ -29,15 +38,66 @@ Answer the user query below based on the context.
 USER_PROMPT = "{query}"
 
 
-def build_retriever():
-    """Build a retriever for the pipeline."""
-    data_store = CustomDataStore()
+def build_em_invoker():
+    """Build an embedding model invoker for the pipeline."""
+    return OpenAIEMInvoker(os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"), os.getenv("OPENAI_API_KEY"))
+
+
+def build_retriever(prefetcher: Prefetcher | None = None):
+    """Build a retriever for the pipeline.
+
+    The vector index at `VECTOR_INDEX_PATH` is used if it is set, the mock data store otherwise. Unless
+    `RETRIEVAL_MODE` is `vector`, its vector search is fused with a BM25 keyword search. Query embeddings and results
+    are cached unless `RETRIEVAL_CACHE` is `false`. The index must exist, see `ingest_source`.
+
+    Args:
+        prefetcher (Prefetcher | None, optional): Serves queries from the chunks of prefetched drafts. Defaults to
+            None.
+    """
+    index_path = os.getenv("VECTOR_INDEX_PATH")
+    nprobe = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+    cache = get_retrieval_cache(os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")) if index_path else None
+    if index_path and os.getenv("RETRIEVAL_MODE", "hybrid") == "hybrid":
+        candidate_depth = int(os.getenv("HYBRID_CANDIDATE_DEPTH", "50"))
+        data_store = HybridDataStore(index_path, build_em_invoker(), nprobe, candidate_depth, cache=cache)
+    elif index_path:
+        data_store = VectorDataStore(index_path, build_em_invoker(), nprobe, cache)
+    else:
+        data_store = CustomDataStore()
+    if prefetcher is not None:
+        data_store = prefetcher.wrap(data_store)
     return BasicRetriever(data_store)
 
 
+async def ingest_source() -> IngestionSummary | None:
+    """Ingest the new and changed documents of `VECTOR_INDEX_SOURCE` into the index at `VECTOR_INDEX_PATH`.
+
+    Await it before building the pipeline. Embedding calls run concurrently on the running event loop, with
+    `INGESTION_BATCH_SIZE` chunks per call and up to `INGESTION_CONCURRENCY` calls in flight.
+
+    Returns:
+        IngestionSummary | None: The outcome of the run, or None if either variable is not set.
+    """
+    index_path = os.getenv("VECTOR_INDEX_PATH")
+    source = os.getenv("VECTOR_INDEX_SOURCE")
+    if not index_path or not source:
+        return None
+    ingestor = Ingestor(
+        index_path,
+        build_em_invoker(),
+        batch_size=int(os.getenv("INGESTION_BATCH_SIZE", "64")),
+        concurrency=int(os.getenv("INGESTION_CONCURRENCY", "4")),
+    )
+    return await ingestor.ingest(iter_documents(source))
+
+
 def build_repacker():
-    """Build a repacker for the pipeline."""
-    return Repacker(mode="context")
+    """Build a repacker for the pipeline.
+
+    The distinct chunks are packed best first into a context of at most `CONTEXT_TOKEN_BUDGET` tokens, counted with
+    the tokenizer of `LANGUAGE_MODEL`.
+    """
+    return get_context_packer(os.getenv("LANGUAGE_MODEL"))
 
 
 def build_response_synthesizer():
@@ -48,30 +108,102 @@ def build_response_synthesizer():
     return StuffResponseSynthesizer(lm_request_processor)
 
 
-def build_pipeline():
-    """Build a pipeline for the gen_ai_hello_world application."""
-    retriever_step = step(build_retriever(), {"query": "user_query"}, "chunks", {"top_k": "top_k"})
-    repacker_step = step(build_repacker(), {"chunks": "chunks"}, "context")
-    bundler_step = BundlerStep("create_rs_bundle", ["context"], "response_synthesis_bundle")
+def build_context_pipeline(prefetcher: Prefetcher | None = None):
+    """Build the part of the pipeline that turns the query into the response synthesis bundle.
+
+    Args:
+        prefetcher (Prefetcher | None, optional): Serves queries from the chunks of prefetched drafts. Defaults to
+            None.
+    """
+    retriever_step, repacker_step, bundler_step = _build_context_steps(prefetcher)
+    return retriever_step | repacker_step | bundler_step
+
+
+def build_pipeline(prefetcher: Prefetcher | None = None):
+    """Build a pipeline for the gen_ai_hello_world application.
+
+    Every step is timed, and traced if `TRACING_EXPORTER` is set.
+
+    Args:
+        prefetcher (Prefetcher | None, optional): Serves queries from the chunks of prefetched drafts. Defaults to
+            None.
+    """
+    retriever_step, repacker_step, bundler_step = _build_context_steps(prefetcher)
     response_synthesizer_step = step(
         build_response_synthesizer(),
         {"query": "user_query", "variables": "response_synthesis_bundle"},
         "response",
     )
+    response_synthesizer_step = _instrument(response_synthesizer_step, "response_synthesizer")
 
     return retriever_step | repacker_step | bundler_step | response_synthesizer_step
 
 
+def build_streaming_pipeline(prefetcher: Prefetcher | None = None):
+    """Build a pipeline that streams the response as it is generated.
+
+    Args:
+        prefetcher (Prefetcher | None, optional): Serves queries from the chunks of prefetched drafts. Defaults to
+            None.
+    """
+    return StreamingPipeline(build_context_pipeline(prefetcher), build_response_synthesizer())
+
+
+async def stream_answer(query: str, top_k: int = 4) -> None:
+    """Print the response to a query as it is generated, with the latency of every stage on stderr.
+
+    Args:
+        query (str): The user's query.
+        top_k (int, optional): The number of chunks retrieved. Defaults to 4.
+    """
+    await ingest_source()
+    print("Response:")
+    async for event in build_streaming_pipeline().stream(query, top_k):
+        if event.kind == "token":
+            print(event.text, end="", flush=True)
+        else:
+            print(f"[{event.stage}: {event.seconds * 1000:.1f} ms]", file=sys.stderr, flush=True)
+    print()
+
+
 def main():
-    """Main function to run the gen_ai_hello_world application."""
+    """Main function to run the gen_ai_hello_world application.
+
+    The response is streamed unless `STREAM_RESPONSE` is `false`.
+    """
     load_dotenv()
+    query = input("Question: ")
+    if os.getenv("STREAM_RESPONSE", "true").lower() != "false":
+        asyncio.run(stream_answer(query))
+        return
+    asyncio.run(ingest_source())
     e2e_pipeline = build_pipeline()
-    state = {"user_query": input("Question: ")}
+    state = {"user_query": query}
     config = {"top_k": 4}
-    result = asyncio.run(e2e_pipeline.invoke(state, config))
+    result = asyncio.run(_invoke(e2e_pipeline, state, config))
     response = result.get("response")
     print(f"Response:\n{response}")
 
 
+async def _invoke(pipeline, state: dict, config: dict) -> dict:
+    with trace_invocation():
+        return await pipeline.invoke(state, config)
+
+
+def _build_context_steps(prefetcher: Prefetcher | None = None):
+    retriever_step = step(build_retriever(prefetcher), {"query": "user_query"}, "chunks", {"top_k": "top_k"})
+    repacker_step = step(build_repacker(), {"chunks": "chunks"}, "context")
+    bundler_step = BundlerStep("create_rs_bundle", ["context"], "response_synthesis_bundle")
+    return (
+        _instrument(retriever_step, "retriever"),
+        _instrument(repacker_step, "repacker"),
+        _instrument(bundler_step, "bundler"),
+    )
+
+
+def _instrument(pipeline_step, stage: str):
+    return timed_step(traced_step(pipeline_step, stage), stage)
+
+
 if __name__ == "__main__":
     main()
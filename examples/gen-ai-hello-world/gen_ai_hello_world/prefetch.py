@@ -0,0 +1,287 @@
+"""Speculative retrieval for draft queries.
+
+A chat front-end can send the query while the user is still typing. `Prefetcher.prefetch` starts the retrieval of such
+a draft in the background, and when the final query arrives, the retriever reuses the chunks of a draft that is close
+enough instead of retrieving again, so the retrieval overlaps with typing. A draft is close enough if, once both are
+normalized, it is a long enough prefix of the final query that ends at a word boundary, or if its embedding is similar
+enough to the embedding of the final query. Embeddings are only compared when the data store caches them, since the
+draft would otherwise be embedded twice. A draft that is still being retrieved is awaited.
+
+A new draft cancels the retrievals of the drafts it extends, since the user has typed past them, and drafts expire
+after a while, so the chunks do not get stale.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+from gllm_core.schema import Chunk
+from gllm_retrieval.constants import DEFAULT_TOP_K
+from gllm_retrieval.retriever.data_store.data_store import BaseDataStore
+from gen_ai_hello_world.retrieval_cache import normalize_query
+
+DEFAULT_MAX_DRAFTS = 64
+DEFAULT_TTL = 30.0
+DEFAULT_MIN_DRAFT_CHARS = 8
+DEFAULT_MIN_PREFIX_RATIO = 0.8
+DEFAULT_MIN_SIMILARITY = 0.95
+
+
+@dataclass
+class _Draft:
+    query: str
+    top_k: int
+    params_key: str
+    created_at: float = field(default_factory=time.monotonic)
+    embedding: np.ndarray | None = None
+    task: asyncio.Task | None = None
+
+
+class Prefetcher:
+    """Retrieves draft queries ahead of time and hands their chunks to the final query.
+
+    Attributes:
+        max_drafts (int): The maximum number of drafts kept. The oldest are dropped first.
+        ttl (float): The seconds after which a draft expires.
+        min_draft_chars (int): The minimum length of a normalized draft. Shorter drafts are not retrieved.
+        min_prefix_ratio (float): The minimum length of a draft that prefixes the final query, relative to the final
+            query.
+        min_similarity (float): The minimum cosine similarity between the embeddings of a draft and the final query.
+        data_store (BaseDataStore | None): The data store the drafts are retrieved from, set by `wrap`.
+        hits (int): The number of final queries that reused the chunks of a draft.
+        misses (int): The number of final queries that were retrieved again.
+    """
+
+    def __init__(
+        self,
+        max_drafts: int = DEFAULT_MAX_DRAFTS,
+        ttl: float = DEFAULT_TTL,
+        min_draft_chars: int = DEFAULT_MIN_DRAFT_CHARS,
+        min_prefix_ratio: float = DEFAULT_MIN_PREFIX_RATIO,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    ):
+        """Initialize the prefetcher.
+
+        Args:
+            max_drafts (int, optional): The maximum number of drafts kept. Defaults to 64.
+            ttl (float, optional): The seconds after which a draft expires. Defaults to 30.
+            min_draft_chars (int, optional): The minimum length of a normalized draft. Defaults to 8.
+            min_prefix_ratio (float, optional): The minimum length of a draft that prefixes the final query, relative
+                to the final query. Defaults to 0.8.
+            min_similarity (float, optional): The minimum cosine similarity between the embeddings of a draft and the
+                final query. Defaults to 0.95.
+        """
+        self.max_drafts = max_drafts
+        self.ttl = ttl
+        self.min_draft_chars = min_draft_chars
+        self.min_prefix_ratio = min_prefix_ratio
+        self.min_similarity = min_similarity
+        self.data_store: BaseDataStore | None = None
+        self.hits = 0
+        self.misses = 0
+        self._drafts: OrderedDict[str, _Draft] = OrderedDict()
+
+    def wrap(self, data_store: BaseDataStore) -> "PrefetchingDataStore":
+        """Serve the final queries of a data store from the prefetched drafts.
+
+        Args:
+            data_store (BaseDataStore): The data store.
+
+        Returns:
+            PrefetchingDataStore: The data store to give the retriever.
+        """
+        self.data_store = data_store
+        return PrefetchingDataStore(data_store, self)
+
+    def prefetch(
+        self, draft: str, top_k: int = DEFAULT_TOP_K, retrieval_params: dict[str, Any] | None = None
+    ) -> asyncio.Task | None:
+        """Start retrieving a draft query in the background. Must be called from the event loop of the pipeline.
+
+        Args:
+            draft (str): The query typed so far.
+            top_k (int, optional): The number of chunks retrieved. Defaults to DEFAULT_TOP_K.
+            retrieval_params (dict[str, Any] | None, optional): The retrieval parameters. Defaults to None.
+
+        Returns:
+            asyncio.Task | None: The retrieval, or None if the draft is too short or already being retrieved.
+
+        Raises:
+            RuntimeError: If the prefetcher does not wrap a data store.
+        """
+        if self.data_store is None:
+            raise RuntimeError("The prefetcher must wrap a data store before drafts can be prefetched.")
+        normalized = _normalize(draft)
+        if len(normalized) < self.min_draft_chars:
+            return None
+        params_key = _get_params_key(retrieval_params)
+        key = json.dumps([normalized, top_k, params_key])
+        self._expire()
+        if key in self._drafts:
+            self._drafts.move_to_end(key)
+            return None
+
+        for old_key, old_draft in list(self._drafts.items()):
+            if _is_word_prefix(old_draft.query, normalized) and old_draft.params_key == params_key:
+                # The user has typed past this draft, so its result will not be needed.
+                old_draft.task.cancel()
+                del self._drafts[old_key]
+
+        entry = _Draft(normalized, top_k, params_key)
+        entry.task = asyncio.create_task(self._retrieve(entry, draft, top_k, retrieval_params))
+        # Drafts that fail or are never matched must not log "exception was never retrieved".
+        entry.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self._drafts[key] = entry
+        while len(self._drafts) > self.max_drafts:
+            _, dropped = self._drafts.popitem(last=False)
+            dropped.task.cancel()
+        return entry.task
+
+    async def match(
+        self, query: str, top_k: int = DEFAULT_TOP_K, retrieval_params: dict[str, Any] | None = None
+    ) -> list[Chunk] | None:
+        """Return the chunks of a draft that is close enough to a final query.
+
+        Args:
+            query (str): The final query.
+            top_k (int, optional): The number of chunks needed. Defaults to DEFAULT_TOP_K.
+            retrieval_params (dict[str, Any] | None, optional): The retrieval parameters. Defaults to None.
+
+        Returns:
+            list[Chunk] | None: The best `top_k` chunks of the draft, or None if no draft matches.
+        """
+        self._expire()
+        normalized = _normalize(query)
+        params_key = _get_params_key(retrieval_params)
+        candidates = [
+            draft for draft in self._drafts.values() if draft.params_key == params_key and draft.top_k >= top_k
+        ]
+        prefixes = [
+            draft
+            for draft in candidates
+            if _is_word_prefix(draft.query, normalized)
+            and len(draft.query) >= self.min_prefix_ratio * len(normalized)
+        ]
+        if prefixes:
+            chunks = await self._get_chunks(max(prefixes, key=lambda draft: len(draft.query)))
+            if chunks is not None:
+                return chunks[:top_k]
+
+        embed_query = getattr(self.data_store, "embed_query", None)
+        if embed_query is not None and any(draft.embedding is not None for draft in candidates):
+            embedding = _normalize_vector(await embed_query(query))
+            similar = [
+                (float(embedding @ draft.embedding), draft) for draft in candidates if draft.embedding is not None
+            ]
+            similarity, draft = max(similar, key=lambda entry: entry[0])
+            if similarity >= self.min_similarity:
+                chunks = await self._get_chunks(draft)
+                if chunks is not None:
+                    return chunks[:top_k]
+        return None
+
+    async def _retrieve(
+        self, entry: _Draft, draft: str, top_k: int, retrieval_params: dict[str, Any] | None
+    ) -> list[Chunk]:
+        embed_query = getattr(self.data_store, "embed_query", None)
+        # The query below reuses this embedding from the cache. Without a cache, it would embed the draft a second time.
+        if embed_query is not None and getattr(self.data_store, "cache", None) is not None:
+            entry.embedding = _normalize_vector(await embed_query(draft))
+        return await self.data_store.query(draft, top_k, retrieval_params)
+
+    async def _get_chunks(self, draft: _Draft) -> list[Chunk] | None:
+        try:
+            # Shielded, so that a cancelled final query does not cancel a retrieval other queries may reuse.
+            return await asyncio.shield(draft.task)
+        except asyncio.CancelledError:
+            if not draft.task.cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._drafts:
+            key, draft = next(iter(self._drafts.items()))
+            if draft.created_at > deadline:
+                break
+            draft.task.cancel()
+            del self._drafts[key]
+
+
+class PrefetchingDataStore(BaseDataStore):
+    """Data store that answers a query with the chunks of a matching prefetched draft, if any.
+
+    Attributes:
+        data_store (BaseDataStore): The data store queried when no draft matches.
+        prefetcher (Prefetcher): The prefetched drafts.
+    """
+
+    def __init__(self, data_store: BaseDataStore, prefetcher: Prefetcher):
+        """Initialize the prefetching data store.
+
+        Args:
+            data_store (BaseDataStore): The data store queried when no draft matches.
+            prefetcher (Prefetcher): The prefetched drafts.
+        """
+        super().__init__()
+        self.data_store = data_store
+        self.prefetcher = prefetcher
+
+    async def query(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        retrieval_params: dict[str, Any] | None = None,
+    ) -> list[Chunk]:
+        """Query the data store.
+
+        Args:
+            query (str): The query.
+            top_k (int, optional): The maximum number of chunks returned. Defaults to DEFAULT_TOP_K.
+            retrieval_params (dict[str, Any] | None, optional): The retrieval parameters. Defaults to None.
+
+        Returns:
+            list[Chunk]: The chunks of the matching draft, or of the query otherwise.
+        """
+        chunks = await self.prefetcher.match(query, top_k, retrieval_params)
+        if chunks is not None:
+            self.prefetcher.hits += 1
+            return chunks
+        self.prefetcher.misses += 1
+        return await self.data_store.query(query, top_k, retrieval_params)
+
+    async def query_by_id(self, id_: str | list[str]) -> list[Chunk]:
+        """Query the data store by ID.
+
+        Args:
+            id_ (str | list[str]): The ID or IDs of the chunks.
+
+        Returns:
+            list[Chunk]: The chunks.
+        """
+        return await self.data_store.query_by_id(id_)
+
+
+def _normalize(query: str) -> str:
+    return normalize_query(query).rstrip(" ?!.")
+
+
+def _is_word_prefix(prefix: str, query: str) -> bool:
+    # "deploy the app" prefixes "deploy the app to staging", but "deploy the app" does not prefix "deploy the apple".
+    return query == prefix or query.startswith(prefix + " ")
+
+
+def _normalize_vector(embedding: Any) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _get_params_key(retrieval_params: dict[str, Any] | None) -> str:
+    return json.dumps(retrieval_params or {}, sort_keys=True, default=str)
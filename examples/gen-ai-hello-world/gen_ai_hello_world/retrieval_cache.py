@@ -0,0 +1,284 @@
+"""Two-level cache of query embeddings and retrieval results.
+
+The first level maps the normalized query text to its embedding, so a repeated question skips the embedding call. The
+second level maps the bucket of an embedding, the `top_k`, the retrieval parameters and the version of the index to
+the IDs and scores of the retrieved chunks, so it also skips the search. The bucket is a locality-sensitive hash of
+the embedding, the signs of its projections on random hyperplanes, so the same or nearly the same embedding lands in
+the same bucket. More hyperplanes make a hit stricter.
+
+Both levels are bounded LRU maps. They can be persisted in a SQLite file to survive restarts, and results cached for
+an older version of the index are dropped when a newer version is seen.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_EMBEDDINGS = 10_000
+DEFAULT_MAX_RESULTS = 10_000
+DEFAULT_BUCKET_BITS = 64
+BUCKET_SEED = 0
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that trivially different spellings share a cache entry.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The query in NFKC form, lower-cased, with collapsed whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class RetrievalCache:
+    """An LRU cache of query embeddings and retrieval results, optionally persisted in SQLite.
+
+    Attributes:
+        namespace (str): Separates the embeddings of different models, e.g. the embedding model name.
+        max_embeddings (int): The maximum number of embeddings kept.
+        max_results (int): The maximum number of results kept.
+        bucket_bits (int): The number of hyperplanes of the embedding buckets.
+        path (str | None): The SQLite file the entries are persisted in, or None to keep them in memory only.
+        hits (dict[str, int]): The number of hits per level, `embeddings` and `results`.
+        misses (dict[str, int]): The number of misses per level.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "",
+        max_embeddings: int = DEFAULT_MAX_EMBEDDINGS,
+        max_results: int = DEFAULT_MAX_RESULTS,
+        bucket_bits: int = DEFAULT_BUCKET_BITS,
+        path: str | None = None,
+    ):
+        """Initialize the retrieval cache.
+
+        Args:
+            namespace (str, optional): Separates the embeddings of different models. Defaults to "".
+            max_embeddings (int, optional): The maximum number of embeddings kept. Defaults to 10000.
+            max_results (int, optional): The maximum number of results kept. Defaults to 10000.
+            bucket_bits (int, optional): The number of hyperplanes of the embedding buckets. Defaults to 64.
+            path (str | None, optional): The SQLite file the entries are persisted in. Defaults to None, which keeps
+                them in memory only.
+        """
+        self.namespace = namespace
+        self.max_embeddings = max_embeddings
+        self.max_results = max_results
+        self.bucket_bits = bucket_bits
+        self.path = path
+        self.hits = {"embeddings": 0, "results": 0}
+        self.misses = {"embeddings": 0, "results": 0}
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._results: OrderedDict[str, list[tuple[str, float]]] = OrderedDict()
+        self._hyperplanes: np.ndarray | None = None
+        self._index_version: int | None = None
+        self._lock = threading.Lock()
+        self._connection = None
+        self._writes = {"embeddings": 0, "results": 0}
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                    "used_at REAL NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, index_version INTEGER NOT NULL, "
+                    "value TEXT NOT NULL, used_at REAL NOT NULL)"
+                )
+                for table in ("embeddings", "results"):
+                    self._connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_used_at ON {table} (used_at)")
+
+    def get_embedding(self, query: str) -> np.ndarray | None:
+        """Return the cached embedding of a query.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            np.ndarray | None: The embedding, or None if it is not cached.
+        """
+        key = self._embedding_key(query)
+        with self._lock:
+            embedding = _get_lru(self._embeddings, key)
+            if embedding is None and self._connection is not None:
+                row = self._connection.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    embedding = np.frombuffer(row[0], dtype=np.float32)
+                    _put_lru(self._embeddings, key, embedding, self.max_embeddings)
+                    self._touch("embeddings", key)
+            self._count("embeddings", embedding is not None)
+        return embedding
+
+    def set_embedding(self, query: str, embedding: Sequence[float]) -> np.ndarray:
+        """Cache the embedding of a query.
+
+        Args:
+            query (str): The query.
+            embedding (Sequence[float]): The embedding.
+
+        Returns:
+            np.ndarray: The embedding as cached.
+        """
+        key = self._embedding_key(query)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            _put_lru(self._embeddings, key, embedding, self.max_embeddings)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, used_at) VALUES (?, ?, ?)",
+                        (key, embedding.tobytes(), time.time()),
+                    )
+                    self._evict_rows("embeddings", self.max_embeddings)
+        return embedding
+
+    def result_key(self, embedding: np.ndarray, top_k: int, params: dict[str, Any], index_version: int) -> str:
+        """Compute the key of a retrieval result.
+
+        Args:
+            embedding (np.ndarray): The embedding of the query.
+            top_k (int): The maximum number of chunks retrieved.
+            params (dict[str, Any]): Everything else the result depends on, e.g. the filters. Must be JSON-serializable.
+            index_version (int): The version of the index searched.
+
+        Returns:
+            str: The key.
+        """
+        payload = json.dumps([self._bucket(embedding), top_k, params, index_version], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_result(self, key: str, index_version: int) -> list[tuple[str, float]] | None:
+        """Return a cached retrieval result.
+
+        Args:
+            key (str): The key computed by `result_key`.
+            index_version (int): The version of the index. Results of older versions are dropped.
+
+        Returns:
+            list[tuple[str, float]] | None: The IDs and scores of the chunks, or None if the result is not cached.
+        """
+        with self._lock:
+            self._invalidate(index_version)
+            result = _get_lru(self._results, key)
+            if result is None and self._connection is not None:
+                row = self._connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    result = [(chunk_id, score) for chunk_id, score in json.loads(row[0])]
+                    _put_lru(self._results, key, result, self.max_results)
+                    self._touch("results", key)
+            self._count("results", result is not None)
+        return result
+
+    def set_result(self, key: str, index_version: int, result: list[tuple[str, float]]) -> None:
+        """Cache a retrieval result.
+
+        Args:
+            key (str): The key computed by `result_key`.
+            index_version (int): The version of the index searched.
+            result (list[tuple[str, float]]): The IDs and scores of the chunks.
+        """
+        with self._lock:
+            self._invalidate(index_version)
+            if index_version != self._index_version:
+                return
+            _put_lru(self._results, key, result, self.max_results)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO results (key, index_version, value, used_at) VALUES (?, ?, ?, ?)",
+                        (key, index_version, json.dumps(result), time.time()),
+                    )
+                    self._evict_rows("results", self.max_results)
+
+    def close(self) -> None:
+        """Close the SQLite file, if any."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _embedding_key(self, query: str) -> str:
+        return hashlib.sha256(json.dumps([self.namespace, normalize_query(query)]).encode()).hexdigest()
+
+    def _bucket(self, embedding: np.ndarray) -> str:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != embedding.shape[0]:
+            rng = np.random.default_rng(BUCKET_SEED)
+            self._hyperplanes = rng.standard_normal((self.bucket_bits, embedding.shape[0])).astype(np.float32)
+        return np.packbits(self._hyperplanes @ embedding > 0).tobytes().hex()
+
+    def _invalidate(self, index_version: int) -> None:
+        # Versions only grow, so a result of an older version can never be hit again.
+        if self._index_version is not None and index_version <= self._index_version:
+            return
+        self._index_version = index_version
+        self._results.clear()
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute("DELETE FROM results WHERE index_version < ?", (index_version,))
+
+    def _evict_rows(self, table: str, max_entries: int) -> None:
+        # Rows are evicted in batches, once a tenth of the maximum has been written, to keep writes cheap.
+        self._writes[table] += 1
+        if self._writes[table] < max(max_entries // 10, 1):
+            return
+        self._writes[table] = 0
+        self._connection.execute(
+            f"DELETE FROM {table} WHERE key IN (SELECT key FROM {table} ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+
+    def _touch(self, table: str, key: str) -> None:
+        with self._connection:
+            self._connection.execute(f"UPDATE {table} SET used_at = ? WHERE key = ?", (time.time(), key))
+
+    def _count(self, level: str, hit: bool) -> None:
+        if hit:
+            self.hits[level] += 1
+        else:
+            self.misses[level] += 1
+
+
+def get_retrieval_cache(namespace: str = "") -> RetrievalCache | None:
+    """Create the retrieval cache configured by the environment.
+
+    Args:
+        namespace (str, optional): Separates the embeddings of different models. Defaults to "".
+
+    Returns:
+        RetrievalCache | None: The cache, or None if `RETRIEVAL_CACHE` disables it.
+    """
+    if os.getenv("RETRIEVAL_CACHE", "true").lower() in ("", "none", "false", "0"):
+        return None
+    return RetrievalCache(
+        namespace,
+        max_embeddings=int(os.getenv("RETRIEVAL_CACHE_MAX_EMBEDDINGS", str(DEFAULT_MAX_EMBEDDINGS))),
+        max_results=int(os.getenv("RETRIEVAL_CACHE_MAX_RESULTS", str(DEFAULT_MAX_RESULTS))),
+        bucket_bits=int(os.getenv("RETRIEVAL_CACHE_BUCKET_BITS", str(DEFAULT_BUCKET_BITS))),
+        path=os.getenv("RETRIEVAL_CACHE_PATH") or None,
+    )
+
+
+def _get_lru(entries: OrderedDict, key: str) -> Any:
+    value = entries.get(key)
+    if value is not None:
+        entries.move_to_end(key)
+    return value
+
+
+def _put_lru(entries: OrderedDict, key: str, value: Any, max_entries: int) -> None:
+    entries[key] = value
+    entries.move_to_end(key)
+    while len(entries) > max_entries:
+        entries.popitem(last=False)
+
@@ -0,0 +1,158 @@
+"""Streaming variant of the gen_ai_hello_world pipeline.
+
+The retriever, repacker and bundler run eagerly as one pipeline. The response synthesizer is then given an event
+emitter, so the language model streams its response, and the tokens are yielded as they arrive. Latency markers are
+yielded between them: one per context stage once the context is ready, the time to the first token, and the total
+time of the synthesis, so retrieval time can be told apart from generation time. When tracing is enabled, the whole
+stream is recorded as one trace with a span for the context and one for the synthesis.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from gllm_core.constants import EventType
+from gen_ai_hello_world.timing import collect_stage_timings
+from gen_ai_hello_world.tracing import get_tracer, trace_invocation, use_span
+
+FIRST_TOKEN_STAGE = "first_token"
+SYNTHESIS_STAGE = "response_synthesizer"
+TOTAL_STAGE = "total"
+
+
+@dataclass
+class StreamEvent:
+    """A piece of a streamed response or a latency marker.
+
+    Attributes:
+        kind (str): `token` for a piece of the response, `stage` for a latency marker.
+        text (str): The piece of the response. Empty for a marker.
+        stage (str | None): The stage a marker measures. None for a token.
+        seconds (float | None): The duration of the stage. For `first_token` and `total`, the time since the start of
+            the request. None for a token.
+    """
+
+    kind: str
+    text: str = ""
+    stage: str | None = None
+    seconds: float | None = None
+
+
+class TokenQueueEmitter:
+    """A minimal event emitter that puts the response events it receives on a queue.
+
+    It is passed to the response synthesizer as its `event_emitter`. Events of other types, e.g. status updates of the
+    language model invoker, are ignored.
+
+    Attributes:
+        queue (asyncio.Queue[str | None]): The response tokens, followed by None once the synthesis has finished.
+    """
+
+    def __init__(self):
+        """Initialize the emitter."""
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def emit(self, value: Any, event_level: Any = None, event_type: Any = None, **kwargs: Any) -> None:
+        """Receive an event.
+
+        Args:
+            value (Any): The content of the event.
+            event_level (Any, optional): The level of the event. Defaults to None.
+            event_type (Any, optional): The type of the event. Only `EventType.RESPONSE` is kept. Defaults to None.
+            **kwargs (Any): Ignored.
+        """
+        if event_type == EventType.RESPONSE and isinstance(value, str) and value:
+            self.queue.put_nowait(value)
+
+    def close(self) -> None:
+        """Mark the end of the response."""
+        self.queue.put_nowait(None)
+
+
+class StreamingPipeline:
+    """Builds the context eagerly, then streams the response.
+
+    Attributes:
+        context_pipeline (Any): The pipeline that retrieves the chunks and builds the response synthesis bundle.
+        response_synthesizer (Any): The response synthesizer, e.g. a `StuffResponseSynthesizer`.
+    """
+
+    def __init__(self, context_pipeline: Any, response_synthesizer: Any):
+        """Initialize the streaming pipeline.
+
+        Args:
+            context_pipeline (Any): The pipeline that retrieves the chunks and builds the response synthesis bundle
+                under `response_synthesis_bundle`.
+            response_synthesizer (Any): The response synthesizer.
+        """
+        self.context_pipeline = context_pipeline
+        self.response_synthesizer = response_synthesizer
+
+    async def stream(self, query: str, top_k: int = 4) -> AsyncIterator[StreamEvent]:
+        """Answer a query, yielding the response as it is generated.
+
+        Args:
+            query (str): The user's query.
+            top_k (int, optional): The number of chunks retrieved. Defaults to 4.
+
+        Yields:
+            StreamEvent: A marker for every context stage, then the response tokens, with a `first_token` marker
+                before the first of them and `response_synthesizer` and `total` markers at the end.
+        """
+        start = time.perf_counter()
+        tracer = get_tracer()
+        # One root span covers the whole request. It is only made current around the awaited parts, since the context
+        # of a generator is the context of its consumer while it is suspended at a yield.
+        root_span = tracer.start_span("pipeline.stream") if tracer else None
+        try:
+            with use_span(root_span):
+                with collect_stage_timings() as timings, trace_invocation("pipeline.build_context"):
+                    state = await self.context_pipeline.invoke({"user_query": query}, {"top_k": top_k})
+            for stage, seconds in timings.items():
+                yield StreamEvent("stage", stage=stage, seconds=seconds)
+
+            emitter = TokenQueueEmitter()
+            synthesis_start = time.perf_counter()
+            with use_span(root_span):
+                # The task copies the current context, so its synthesis span is a child of the root span.
+                synthesis = asyncio.create_task(
+                    self._synthesize(query, state.get("response_synthesis_bundle"), emitter)
+                )
+            streamed = False
+            try:
+                while (token := await emitter.queue.get()) is not None:
+                    if not streamed:
+                        streamed = True
+                        yield StreamEvent("stage", stage=FIRST_TOKEN_STAGE, seconds=time.perf_counter() - start)
+                    yield StreamEvent("token", text=token)
+                response = await synthesis
+            finally:
+                # Leaving the stream early, e.g. when the consumer stops reading, cancels the generation.
+                if not synthesis.done():
+                    synthesis.cancel()
+                    await asyncio.gather(synthesis, return_exceptions=True)
+
+            if not streamed and response:
+                # The language model invoker did not stream, so the whole response arrives at once.
+                yield StreamEvent("stage", stage=FIRST_TOKEN_STAGE, seconds=time.perf_counter() - start)
+                yield StreamEvent("token", text=str(response))
+            end = time.perf_counter()
+            yield StreamEvent("stage", stage=SYNTHESIS_STAGE, seconds=end - synthesis_start)
+            yield StreamEvent("stage", stage=TOTAL_STAGE, seconds=end - start)
+        except Exception as e:
+            if root_span:
+                root_span.record_exception(e)
+            raise
+        finally:
+            if root_span:
+                tracer.end_span(root_span)
+
+    async def _synthesize(self, query: str, bundle: dict[str, Any] | None, emitter: TokenQueueEmitter) -> Any:
+        try:
+            with trace_invocation("pipeline.response_synthesizer"):
+                return await self.response_synthesizer.synthesize_response(
+                    query=query, state_variables=bundle, event_emitter=emitter
+                )
+        finally:
+            emitter.close()
@@ -0,0 +1,59 @@
+"""Per-stage timings of pipeline invocations.
+
+`timed_step` wraps the `execute` method of a pipeline step so that its duration is added to the timings of the
+current request. Timings are only collected inside `collect_stage_timings`, so a timed step costs nothing otherwise.
+Each request collects into its own dictionary, which keeps concurrent invocations on one event loop apart.
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
+
+
+def timed_step(pipeline_step: Any, stage: str) -> Any:
+    """Record the duration of a pipeline step under a stage name.
+
+    Args:
+        pipeline_step (Any): The step, e.g. the result of `step(...)` or a `BundlerStep`.
+        stage (str): The name the duration is recorded under.
+
+    Returns:
+        Any: The same step.
+    """
+    execute = pipeline_step.execute
+
+    # `functools.wraps` keeps the signature of `execute`, which the pipeline inspects to decide what to pass.
+    @functools.wraps(execute)
+    async def timed_execute(*args: Any, **kwargs: Any) -> Any:
+        timings = _stage_timings.get()
+        if timings is None:
+            return await execute(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await execute(*args, **kwargs)
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    pipeline_step.execute = timed_execute
+    return pipeline_step
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[dict[str, float]]:
+    """Collect the stage timings of the pipeline invocations made inside the block.
+
+    Use one block per request, inside the task that runs it.
+
+    Yields:
+        dict[str, float]: The seconds spent per stage, filled in as the stages complete.
+    """
+    timings: dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
@@ -0,0 +1,495 @@
+"""Tracing of pipeline steps with OpenTelemetry-compatible spans.
+
+`traced_step` wraps the `execute` method of a pipeline step, like `timed_step`, and records a span per execution with
+its start and end time, the size and keys of the state it received and returned, and the exception it raised, if
+any. The steps of one request share a trace when the request runs inside `trace_invocation`; otherwise every step
+starts a trace of its own.
+
+Whether a trace is recorded is decided once, when it starts, from its trace ID and the sample ratio, so a trace is
+either complete or absent. Spans are buffered and exported in batches from a background thread, in the OTLP/JSON
+format (`ExportTraceServiceRequest`), either appended as one line per batch to a file or posted to the
+`/v1/traces` endpoint of an OpenTelemetry collector.
+
+Tracing is configured by the environment:
+
+- `TRACING_EXPORTER`: `file`, `otlp` or `none` (default).
+- `TRACING_FILE`: the file of the `file` exporter. Defaults to `traces.jsonl`.
+- `OTEL_EXPORTER_OTLP_ENDPOINT`: the collector of the `otlp` exporter. Defaults to `http://localhost:4318`.
+- `TRACING_SAMPLE_RATIO`: the fraction of traces recorded. Defaults to 1.
+- `OTEL_SERVICE_NAME`: the service the spans belong to. Defaults to `gen-ai-hello-world`.
+"""
+
+import atexit
+import functools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+DEFAULT_SERVICE_NAME = "gen-ai-hello-world"
+DEFAULT_TRACING_FILE = "traces.jsonl"
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318"
+DEFAULT_MAX_BATCH_SIZE = 512
+DEFAULT_MAX_QUEUE_SIZE = 4096
+DEFAULT_EXPORT_INTERVAL = 5.0
+SCOPE_NAME = "gen_ai_hello_world.tracing"
+
+# Status codes and span kinds of the OTLP protocol.
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+
+@dataclass
+class Span:
+    """A finished or running span.
+
+    Attributes:
+        name (str): The name of the operation, e.g. the stage of the step.
+        trace_id (str): The 32 hex digit ID of the trace.
+        span_id (str): The 16 hex digit ID of the span.
+        parent_span_id (str | None): The ID of the parent span, or None for a root span.
+        sampled (bool): Whether the trace is recorded.
+        start_time (int): The start in nanoseconds since the epoch.
+        end_time (int | None): The end in nanoseconds since the epoch, or None while the span is running.
+        attributes (dict[str, Any]): The attributes of the span.
+        events (list[dict[str, Any]]): The events of the span, in OTLP/JSON form.
+        error (str | None): The message of the exception that ended the span, if any.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    sampled: bool
+    start_time: int = field(default_factory=time.time_ns)
+    end_time: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    error: str | None = None
+
+    def record_exception(self, exception: BaseException) -> None:
+        """Record an exception as an `exception` event and mark the span as failed.
+
+        Args:
+            exception (BaseException): The exception.
+        """
+        self.error = f"{type(exception).__name__}: {exception}"
+        self.events.append(
+            {
+                "name": "exception",
+                "timeUnixNano": str(time.time_ns()),
+                "attributes": _to_otlp_attributes(
+                    {
+                        "exception.type": type(exception).__name__,
+                        "exception.message": str(exception),
+                        "exception.stacktrace": "".join(traceback.format_exception(exception)),
+                    }
+                ),
+            }
+        )
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Convert the span to its OTLP/JSON form.
+
+        Returns:
+            dict[str, Any]: The span.
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time or self.start_time),
+            "attributes": _to_otlp_attributes(self.attributes),
+            "events": self.events,
+            "status": {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {"code": STATUS_CODE_OK},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(ABC):
+    """Sends batches of spans in the OTLP/JSON format."""
+
+    @abstractmethod
+    def export(self, request: dict[str, Any]) -> None:
+        """Export a batch of spans.
+
+        Args:
+            request (dict[str, Any]): The spans as an OTLP/JSON `ExportTraceServiceRequest`.
+        """
+
+    def shutdown(self) -> None:
+        """Release the resources of the exporter."""
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends every batch as one JSON line to a file, in the format of the OpenTelemetry collector file exporter.
+
+    Attributes:
+        path (str): The file.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACING_FILE):
+        """Initialize the file exporter.
+
+        Args:
+            path (str, optional): The file. Defaults to `traces.jsonl`.
+        """
+        self.path = path
+
+    def export(self, request: dict[str, Any]) -> None:
+        """Append a batch of spans to the file.
+
+        Args:
+            request (dict[str, Any]): The spans as an OTLP/JSON `ExportTraceServiceRequest`.
+        """
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+class OtlpHttpSpanExporter(SpanExporter):
+    """Posts every batch to an OpenTelemetry collector with OTLP/HTTP and JSON encoding.
+
+    Attributes:
+        url (str): The traces endpoint of the collector.
+        headers (dict[str, str]): Extra headers, e.g. for authentication.
+        timeout (float): The seconds to wait for the collector.
+    """
+
+    def __init__(
+        self, endpoint: str = DEFAULT_OTLP_ENDPOINT, headers: dict[str, str] | None = None, timeout: float = 10
+    ):
+        """Initialize the OTLP/HTTP exporter.
+
+        Args:
+            endpoint (str, optional): The base URL of the collector. `/v1/traces` is appended unless it is already
+                there. Defaults to `http://localhost:4318`.
+            headers (dict[str, str] | None, optional): Extra headers. Defaults to None.
+            timeout (float, optional): The seconds to wait for the collector. Defaults to 10.
+        """
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else f"{endpoint}/v1/traces"
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def export(self, request: dict[str, Any]) -> None:
+        """Post a batch of spans to the collector.
+
+        Args:
+            request (dict[str, Any]): The spans as an OTLP/JSON `ExportTraceServiceRequest`.
+        """
+        http_request = urllib.request.Request(
+            self.url,
+            data=json.dumps(request).encode(),
+            headers={"Content-Type": "application/json", **self.headers},
+            method="POST",
+        )
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Samples traces, buffers their spans and exports them in batches from a background thread.
+
+    Attributes:
+        exporter (SpanExporter): Sends the batches.
+        sample_ratio (float): The fraction of traces recorded, between 0 and 1.
+        service_name (str): The service the spans belong to.
+        max_batch_size (int): The number of buffered spans that triggers an export before the interval has passed.
+        max_queue_size (int): The number of buffered spans beyond which new spans are dropped.
+        export_interval (float): The maximum number of seconds a span waits before being exported.
+        dropped_spans (int): The number of spans dropped because the buffer was full.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        sample_ratio: float = 1.0,
+        service_name: str = DEFAULT_SERVICE_NAME,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        export_interval: float = DEFAULT_EXPORT_INTERVAL,
+    ):
+        """Initialize the tracer and start its export thread.
+
+        Args:
+            exporter (SpanExporter): Sends the batches.
+            sample_ratio (float, optional): The fraction of traces recorded. Defaults to 1.
+            service_name (str, optional): The service the spans belong to. Defaults to `gen-ai-hello-world`.
+            max_batch_size (int, optional): The number of buffered spans that triggers an export. Defaults to 512.
+            max_queue_size (int, optional): The number of buffered spans beyond which new spans are dropped.
+                Defaults to 4096.
+            export_interval (float, optional): The maximum number of seconds a span waits before being exported.
+                Defaults to 5.
+        """
+        self.exporter = exporter
+        self.sample_ratio = min(max(sample_ratio, 0.0), 1.0)
+        self.service_name = service_name
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.export_interval = export_interval
+        self.dropped_spans = 0
+        self._spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def should_sample(self, trace_id: str) -> bool:
+        """Decide whether a trace is recorded, consistently for the same trace ID.
+
+        Args:
+            trace_id (str): The ID of the trace.
+
+        Returns:
+            bool: Whether the trace is recorded.
+        """
+        # Like the TraceIdRatioBased sampler of OpenTelemetry, compare the low 64 bits of the ID with the ratio.
+        return int(trace_id[16:], 16) < self.sample_ratio * 2**64
+
+    def start_span(self, name: str, attributes: dict[str, Any] | None = None) -> Span:
+        """Start a span as a child of the current span, or as the root of a new trace.
+
+        Args:
+            name (str): The name of the operation.
+            attributes (dict[str, Any] | None, optional): The attributes of the span. Defaults to None.
+
+        Returns:
+            Span: The span. It is only exported if its trace is sampled.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            trace_id = secrets.token_hex(16)
+            sampled = self.should_sample(trace_id)
+        else:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        return Span(
+            name,
+            trace_id,
+            secrets.token_hex(8),
+            parent.span_id if parent else None,
+            sampled,
+            attributes=attributes or {},
+        )
+
+    def end_span(self, span: Span) -> None:
+        """End a span and queue it for export if its trace is sampled.
+
+        Args:
+            span (Span): The span.
+        """
+        span.end_time = time.time_ns()
+        if not span.sampled:
+            return
+        with self._lock:
+            if len(self._spans) >= self.max_queue_size:
+                self.dropped_spans += 1
+                return
+            self._spans.append(span)
+            if len(self._spans) >= self.max_batch_size:
+                self._wake_up.set()
+
+    def flush(self) -> None:
+        """Export every buffered span now."""
+        with self._export_lock:
+            while True:
+                with self._lock:
+                    spans, self._spans = self._spans[: self.max_batch_size], self._spans[self.max_batch_size :]
+                if not spans:
+                    return
+                try:
+                    self.exporter.export(self._to_request(spans))
+                except Exception as e:
+                    print(f"Could not export {len(spans)} spans: {e}", file=sys.stderr)
+
+    def shutdown(self) -> None:
+        """Stop the export thread and export the remaining spans."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake_up.set()
+        self._thread.join(timeout=self.export_interval)
+        self.flush()
+        self.exporter.shutdown()
+
+    def _export_loop(self) -> None:
+        while not self._stopped:
+            self._wake_up.wait(self.export_interval)
+            self._wake_up.clear()
+            self.flush()
+
+    def _to_request(self, spans: list[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _to_otlp_attributes({"service.name": self.service_name})},
+                    "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+                }
+            ]
+        }
+
+
+_tracer: Tracer | None = None
+_tracer_configured = False
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer | None:
+    """Return the tracer configured by the environment, creating it on the first call.
+
+    Returns:
+        Tracer | None: The tracer, or None if `TRACING_EXPORTER` disables tracing.
+    """
+    global _tracer, _tracer_configured
+    with _tracer_lock:
+        if _tracer_configured:
+            return _tracer
+        _tracer_configured = True
+        exporter_name = os.getenv("TRACING_EXPORTER", "none").lower()
+        if exporter_name == "file":
+            exporter = FileSpanExporter(os.getenv("TRACING_FILE", DEFAULT_TRACING_FILE))
+        elif exporter_name == "otlp":
+            exporter = OtlpHttpSpanExporter(os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", DEFAULT_OTLP_ENDPOINT))
+        else:
+            return None
+        _tracer = Tracer(
+            exporter,
+            sample_ratio=float(os.getenv("TRACING_SAMPLE_RATIO", "1")),
+            service_name=os.getenv("OTEL_SERVICE_NAME", DEFAULT_SERVICE_NAME),
+        )
+        atexit.register(_tracer.shutdown)
+        return _tracer
+
+
+def traced_step(pipeline_step: Any, name: str, tracer: Tracer | None = None) -> Any:
+    """Record a span for every execution of a pipeline step.
+
+    Args:
+        pipeline_step (Any): The step, e.g. the result of `step(...)` or a `BundlerStep`.
+        name (str): The name of the spans.
+        tracer (Tracer | None, optional): The tracer. Defaults to None, which uses the tracer configured by the
+            environment.
+
+    Returns:
+        Any: The same step, unchanged if tracing is disabled.
+    """
+    tracer = tracer or get_tracer()
+    if tracer is None:
+        return pipeline_step
+    execute = pipeline_step.execute
+
+    @functools.wraps(execute)
+    async def traced_execute(*args: Any, **kwargs: Any) -> Any:
+        span = tracer.start_span(name, {"pipeline.step.name": name})
+        if not span.sampled:
+            return await execute(*args, **kwargs)
+        state = args[0] if args else kwargs.get("state")
+        span.attributes.update(_describe_state("pipeline.state.input", state))
+        token = _current_span.set(span)
+        try:
+            result = await execute(*args, **kwargs)
+            span.attributes.update(_describe_state("pipeline.state.output", result))
+            return result
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            tracer.end_span(span)
+
+    pipeline_step.execute = traced_execute
+    return pipeline_step
+
+
+@contextmanager
+def trace_invocation(name: str = "pipeline.invoke", tracer: Tracer | None = None) -> Iterator[Span | None]:
+    """Group the spans of the steps executed inside the block under one root span.
+
+    Use one block per request, around `pipeline.invoke(...)` and inside the task that runs it.
+
+    Args:
+        name (str, optional): The name of the root span. Defaults to `pipeline.invoke`.
+        tracer (Tracer | None, optional): The tracer. Defaults to None, which uses the tracer configured by the
+            environment.
+
+    Yields:
+        Span | None: The root span, to add attributes to, or None if tracing is disabled.
+    """
+    tracer = tracer or get_tracer()
+    if tracer is None:
+        yield None
+        return
+    span = tracer.start_span(name)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.end_span(span)
+
+
+@contextmanager
+def use_span(span: Span | None) -> Iterator[Span | None]:
+    """Make a span the parent of the spans started inside the block, without ending it.
+
+    Unlike `trace_invocation`, the span can outlive the block, e.g. the root span of a streamed response, which is
+    only entered around the parts that run before the next yield.
+
+    Args:
+        span (Span | None): The span, or None to leave the current span unchanged.
+
+    Yields:
+        Span | None: The same span.
+    """
+    if span is None:
+        yield None
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def _describe_state(prefix: str, state: Any) -> dict[str, Any]:
+    attributes = {f"{prefix}.bytes": len(json.dumps(state, default=str, ensure_ascii=False).encode())}
+    if isinstance(state, dict):
+        attributes[f"{prefix}.keys"] = sorted(str(key) for key in state)
+    return attributes
+
+
+def _to_otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_to_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _to_otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _to_otlp_value(value)} for key, value in attributes.items()]
@@ -0,0 +1,241 @@
+"""Vector and hybrid data stores for the gen_ai_hello_world application.
+
+They serve a local `VectorIndex`, so chunks are retrieved by embedding similarity without an external database. The
+hybrid data store also searches the BM25 index of the chunks and fuses both rankings.
+"""
+
+import asyncio
+from typing import Any, Sequence
+
+from gllm_core.schema import Chunk
+from gllm_retrieval.constants import DEFAULT_TOP_K
+from gllm_retrieval.retriever.data_store.data_store import BaseDataStore
+from gen_ai_hello_world.bm25_index import BM25Index, tokenize
+from gen_ai_hello_world.retrieval_cache import RetrievalCache
+from gen_ai_hello_world.vector_index import DEFAULT_NPROBE, VectorIndex, matches_filters
+
+DEFAULT_CANDIDATE_DEPTH = 50
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]], k: int = DEFAULT_RRF_K, weights: Sequence[float] | None = None
+) -> list[tuple[int, float]]:
+    """Fuse rankings by summing `weight / (k + rank)` over the rankings that contain each item.
+
+    Args:
+        rankings (Sequence[Sequence[int]]): The rankings, best first.
+        k (int, optional): Dampens the advantage of the top ranks. Defaults to 60.
+        weights (Sequence[float] | None, optional): The weight of each ranking. Defaults to None, which weighs them
+            equally.
+
+    Returns:
+        list[tuple[int, float]]: The items and their fused scores, best first.
+    """
+    scores: dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+
+
+class VectorDataStore(BaseDataStore):
+    """Data store backed by a memory-mapped vector index with an IVF search.
+
+    The index is searched in a worker thread, so a search does not block the event loop. Commits made to the index
+    while the data store is serving are picked up by the next query. With a retrieval cache, a repeated query skips
+    the embedding call and the search.
+
+    Attributes:
+        index (VectorIndex): The index, as of its latest commit.
+        em_invoker (Any): The embedding model invoker that embeds the queries.
+        nprobe (int): The number of IVF lists scanned per query.
+        cache (RetrievalCache | None): The cache of query embeddings and results, if any.
+    """
+
+    def __init__(
+        self, index_path: str, em_invoker: Any, nprobe: int = DEFAULT_NPROBE, cache: RetrievalCache | None = None
+    ):
+        """Initialize the vector data store.
+
+        Args:
+            index_path (str): The directory of the index.
+            em_invoker (Any): The embedding model invoker that embeds the queries.
+            nprobe (int, optional): The number of IVF lists scanned per query. Defaults to 16.
+            cache (RetrievalCache | None, optional): The cache of query embeddings and results. Defaults to None.
+        """
+        super().__init__()
+        self.index = VectorIndex(index_path)
+        self.em_invoker = em_invoker
+        self.nprobe = nprobe
+        self.cache = cache
+
+    async def query(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        retrieval_params: dict[str, Any] | None = None,
+    ) -> list[Chunk]:
+        """Query the data store.
+
+        Args:
+            query (str): The query.
+            top_k (int, optional): The maximum number of chunks returned. Defaults to DEFAULT_TOP_K.
+            retrieval_params (dict[str, Any] | None, optional): Supports `filters`, the expected metadata values, and
+                `nprobe`, which overrides the number of IVF lists scanned. Defaults to None.
+
+        Returns:
+            list[Chunk]: The closest chunks, best first, with their cosine similarity as the score.
+        """
+        retrieval_params = retrieval_params or {}
+        self.index = index = self.index.refresh()
+        embedding = await self.embed_query(query)
+        if self.cache is None:
+            results = await asyncio.to_thread(self._search, index, query, embedding, top_k, retrieval_params)
+            return [_to_chunk(chunk, score) for chunk, score in results]
+
+        key = self.cache.result_key(
+            embedding, top_k, {**self._get_cache_params(query), **retrieval_params}, index.version
+        )
+        cached = self.cache.get_result(key, index.version)
+        if cached is not None:
+            chunks = await asyncio.to_thread(lambda: [index.get_chunk_by_id(chunk_id) for chunk_id, _ in cached])
+            if all(chunk is not None for chunk in chunks):
+                return [_to_chunk(chunk, score) for chunk, (_, score) in zip(chunks, cached)]
+
+        results = await asyncio.to_thread(self._search, index, query, embedding, top_k, retrieval_params)
+        self.cache.set_result(key, index.version, [(chunk["id"], float(score)) for chunk, score in results])
+        return [_to_chunk(chunk, score) for chunk, score in results]
+
+    async def query_by_id(self, id_: str | list[str]) -> list[Chunk]:
+        """Query the data store by ID.
+
+        Args:
+            id_ (str | list[str]): The ID or IDs of the chunks.
+
+        Returns:
+            list[Chunk]: The chunks that exist, in the order of the IDs.
+        """
+        self.index = self.index.refresh()
+        ids = [id_] if isinstance(id_, str) else id_
+        chunks = await asyncio.to_thread(lambda: [self.index.get_chunk_by_id(chunk_id) for chunk_id in ids])
+        return [_to_chunk(chunk) for chunk in chunks if chunk is not None]
+
+    async def embed_query(self, query: str) -> Any:
+        """Embed a query, from the cache if possible.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            Any: The embedding.
+        """
+        if self.cache is None:
+            return await self.em_invoker.invoke(query)
+        embedding = self.cache.get_embedding(query)
+        if embedding is None:
+            embedding = self.cache.set_embedding(query, await self.em_invoker.invoke(query))
+        return embedding
+
+    def _get_cache_params(self, query: str) -> dict[str, Any]:
+        # Everything a cached result depends on besides the embedding, the top_k and the retrieval parameters.
+        return {"nprobe": self.nprobe}
+
+    def _search(
+        self, index: VectorIndex, query: str, embedding: Any, top_k: int, retrieval_params: dict[str, Any]
+    ) -> list[tuple[dict[str, Any], float]]:
+        return index.search(
+            embedding, top_k, retrieval_params.get("nprobe", self.nprobe), retrieval_params.get("filters")
+        )
+
+
+class HybridDataStore(VectorDataStore):
+    """Data store that fuses a vector search and a BM25 keyword search with reciprocal-rank fusion.
+
+    Each search returns `candidate_depth` candidates, and the best `top_k` of the fused ranking are returned. The BM25
+    index is only read: the writer of the vector index, e.g. the ingestion, adds the committed rows to it, and every
+    query picks up its latest segments. Rows it does not cover yet are only found by the vector search. Cached results
+    are shared by queries with the same embedding bucket and the same keywords.
+
+    Attributes:
+        bm25 (BM25Index): The keyword index of the chunks.
+        candidate_depth (int): The number of candidates taken from each search.
+        rrf_k (int): The `k` of the reciprocal-rank fusion.
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        em_invoker: Any,
+        nprobe: int = DEFAULT_NPROBE,
+        candidate_depth: int = DEFAULT_CANDIDATE_DEPTH,
+        rrf_k: int = DEFAULT_RRF_K,
+        cache: RetrievalCache | None = None,
+    ):
+        """Initialize the hybrid data store.
+
+        Args:
+            index_path (str): The directory of the vector index. The BM25 index is kept in its `bm25` directory.
+            em_invoker (Any): The embedding model invoker that embeds the queries.
+            nprobe (int, optional): The number of IVF lists scanned per query. Defaults to 16.
+            candidate_depth (int, optional): The number of candidates taken from each search. Defaults to 50.
+            rrf_k (int, optional): The `k` of the reciprocal-rank fusion. Defaults to 60.
+            cache (RetrievalCache | None, optional): The cache of query embeddings and results. Defaults to None.
+        """
+        super().__init__(index_path, em_invoker, nprobe, cache)
+        self.bm25 = BM25Index.for_vector_index(index_path)
+        self.candidate_depth = candidate_depth
+        self.rrf_k = rrf_k
+
+    async def query(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        retrieval_params: dict[str, Any] | None = None,
+    ) -> list[Chunk]:
+        """Query the data store.
+
+        Args:
+            query (str): The query.
+            top_k (int, optional): The maximum number of chunks returned. Defaults to DEFAULT_TOP_K.
+            retrieval_params (dict[str, Any] | None, optional): Supports `filters`, the expected metadata values,
+                `nprobe`, which overrides the number of IVF lists scanned, and `candidate_depth`. Defaults to None.
+
+        Returns:
+            list[Chunk]: The best chunks of the fused ranking, with their fused score.
+        """
+        return await super().query(query, top_k, retrieval_params)
+
+    def _get_cache_params(self, query: str) -> dict[str, Any]:
+        # The keyword ranking only depends on the set of query terms, and on the rows the BM25 index covers, which
+        # the writer may extend after the commit of the vector index.
+        return {
+            "nprobe": self.nprobe,
+            "candidate_depth": self.candidate_depth,
+            "rrf_k": self.rrf_k,
+            "terms": sorted(set(tokenize(query))),
+            "bm25_rows": self.bm25.indexed_rows,
+        }
+
+    def _search(
+        self, index: VectorIndex, query: str, embedding: Any, top_k: int, retrieval_params: dict[str, Any]
+    ) -> list[tuple[dict[str, Any], float]]:
+        depth = max(retrieval_params.get("candidate_depth", self.candidate_depth), top_k)
+        nprobe = retrieval_params.get("nprobe", self.nprobe)
+        filters = retrieval_params.get("filters")
+        self.bm25.refresh()
+
+        chunks = {}
+
+        def predicate(row: int) -> bool:
+            chunks[row] = index.get_chunk(row)
+            return matches_filters(chunks[row]["metadata"], filters)
+
+        vector_rows, _ = index.search_rows(embedding, depth, nprobe, predicate if filters else None)
+        keyword_rows, _ = self.bm25.search(query, depth, index.is_deleted, predicate if filters else None)
+        fused = reciprocal_rank_fusion([vector_rows.tolist(), keyword_rows.tolist()], self.rrf_k)[:top_k]
+        return [(chunks.get(row) or index.get_chunk(row), score) for row, score in fused]
+
+
+def _to_chunk(chunk: dict[str, Any], score: float | None = None) -> Chunk:
+    return Chunk(id=chunk["id"], content=chunk["content"], metadata=chunk["metadata"], score=score)
@@ -0,0 +1,588 @@
+"""On-disk vector index with an inverted-file (IVF) approximate nearest-neighbour search.
+
+An index is a directory of flat files that are appended to and memory-mapped, so a corpus larger than the RAM can be
+searched without loading it:
+
+- `embeddings.f32`: the normalized embeddings, one float32 row per chunk.
+- `chunks.jsonl` and `chunk_offsets.u64`: the chunks and the byte offset of each one, for O(1) reads by row.
+- `ids.jsonl`: the chunk IDs in row order, loaded into an ID to row map on the first lookup by ID.
+- `deleted_rows.i64`: the rows that were deleted, which searches and lookups skip.
+- `ivf_centroids.<generation>.npy` and `ivf_assignments.<generation>.i32`: the k-means centroids and the list of every
+  row, of one training of the index.
+- `ivf_lists.<version>.npy` and `ivf_list_offsets.<version>.npy`: the rows grouped by list, as of one commit.
+- `manifest.json`: the number of committed rows, the size of every file, and the generation and version of the IVF
+  files. Anything written after the last commit, e.g. by a crashed writer, is ignored by readers and truncated by the
+  next writer. IVF files are never overwritten, so replacing the manifest is the only step that publishes a commit;
+  the files of the commit before the last are kept for readers still opening them, and older ones are deleted.
+
+A search compares the query with the centroids, scores only the rows of the `nprobe` closest lists, and returns the
+best rows by cosine similarity. Indexes that have not been trained yet are searched exhaustively.
+"""
+
+import json
+import math
+import mmap
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+CHUNKS_FILE = "chunks.jsonl"
+CHUNK_OFFSETS_FILE = "chunk_offsets.u64"
+IDS_FILE = "ids.jsonl"
+DELETED_ROWS_FILE = "deleted_rows.i64"
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.i32"
+LISTS_FILE = "ivf_lists.npy"
+LIST_OFFSETS_FILE = "ivf_list_offsets.npy"
+
+FORMAT_VERSION = 2
+DEFAULT_NPROBE = 16
+AUTO_TRAIN_MIN_ROWS = 10_000
+RETRAIN_GROWTH_FACTOR = 4
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLE = 100_000
+SCORE_BLOCK_ROWS = 65_536
+
+
+def normalize(vectors: Any) -> np.ndarray:
+    """Scale vectors to unit length, so that dot products are cosine similarities.
+
+    Args:
+        vectors (Any): A vector or a matrix with one vector per row.
+
+    Returns:
+        np.ndarray: The normalized float32 vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def matches_filters(metadata: dict[str, Any], filters: dict[str, Any] | None) -> bool:
+    """Check chunk metadata against equality filters.
+
+    Args:
+        metadata (dict[str, Any]): The metadata of the chunk.
+        filters (dict[str, Any] | None): The expected value of each key. A list matches any of its values.
+
+    Returns:
+        bool: Whether every filter matches.
+    """
+    for key, expected in (filters or {}).items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+@dataclass
+class IndexManifest:
+    """The committed state of an index.
+
+    Attributes:
+        dimension (int): The dimension of the embeddings.
+        count (int): The number of committed rows.
+        chunks_size (int): The committed size of the chunks file in bytes.
+        ids_size (int): The committed size of the IDs file in bytes.
+        deleted_size (int): The committed size of the deleted rows file in bytes.
+        nlist (int): The number of IVF lists, or 0 if the index has not been trained.
+        trained_count (int): The number of rows when the index was last trained.
+        ivf_generation (int): Incremented by every training, names the centroids and assignments files.
+        version (int): Incremented by every commit, names the lists files.
+        format_version (int): The version of the file format.
+    """
+
+    dimension: int
+    count: int = 0
+    chunks_size: int = 0
+    ids_size: int = 0
+    deleted_size: int = 0
+    nlist: int = 0
+    trained_count: int = 0
+    ivf_generation: int = 0
+    version: int = 0
+    format_version: int = FORMAT_VERSION
+
+    @classmethod
+    def load(cls, path: Path) -> "IndexManifest | None":
+        """Load the manifest of an index directory.
+
+        Args:
+            path (Path): The index directory.
+
+        Returns:
+            IndexManifest | None: The manifest, or None if the directory holds no index.
+        """
+        manifest_path = path / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        return cls(**json.loads(manifest_path.read_text()))
+
+    def save(self, path: Path) -> None:
+        """Write the manifest atomically.
+
+        Args:
+            path (Path): The index directory.
+        """
+        temporary_path = path / f"{MANIFEST_FILE}.tmp"
+        temporary_path.write_text(json.dumps(asdict(self)))
+        os.replace(temporary_path, path / MANIFEST_FILE)
+
+
+class VectorIndexWriter:
+    """Appends chunks and their embeddings to an index and maintains its IVF lists.
+
+    Nothing is visible to readers until `commit`. The index is trained automatically by `commit` once it holds
+    `AUTO_TRAIN_MIN_ROWS` rows, and retrained whenever it has grown by `RETRAIN_GROWTH_FACTOR` since. Rows added to a
+    trained index are assigned to the closest existing list.
+
+    Attributes:
+        path (Path): The index directory.
+        manifest (IndexManifest): The state of the index, including the uncommitted rows.
+    """
+
+    def __init__(self, path: str | Path, dimension: int):
+        """Open an index for writing, creating it if needed.
+
+        Args:
+            path (str | Path): The index directory.
+            dimension (int): The dimension of the embeddings.
+
+        Raises:
+            ValueError: If the index exists with another dimension.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.manifest = IndexManifest.load(self.path) or IndexManifest(dimension=dimension)
+        if self.manifest.dimension != dimension:
+            raise ValueError(f"The index at {self.path} has dimension {self.manifest.dimension}, not {dimension}.")
+
+        self._committed = (self.manifest.ivf_generation, self.manifest.version)
+        self._centroids = None
+        if self.manifest.nlist:
+            self._centroids = np.load(self.path / _versioned(CENTROIDS_FILE, self.manifest.ivf_generation))
+        self._files = {}
+        for name, size in self._get_committed_sizes().items():
+            file = open(self._get_file_path(name), "ab")
+            file.truncate(size)
+            self._files[name] = file
+
+    def add(self, chunks: Iterable[dict[str, Any]], embeddings: Any) -> None:
+        """Append chunks and their embeddings.
+
+        Args:
+            chunks (Iterable[dict[str, Any]]): The chunks, each with an `id`, a `content` and optional `metadata`.
+            embeddings (Any): One embedding per chunk.
+
+        Raises:
+            ValueError: If the number or dimension of the embeddings does not match.
+        """
+        chunks = list(chunks)
+        embeddings = normalize(embeddings).reshape(-1, self.manifest.dimension)
+        if len(embeddings) != len(chunks):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(chunks)} chunks.")
+
+        offsets = []
+        for chunk in chunks:
+            record = {"id": chunk["id"], "content": chunk["content"], "metadata": chunk.get("metadata") or {}}
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(self.manifest.chunks_size)
+            self._files[CHUNKS_FILE].write(line)
+            self.manifest.chunks_size += len(line)
+            id_line = (json.dumps(chunk["id"]) + "\n").encode("utf-8")
+            self._files[IDS_FILE].write(id_line)
+            self.manifest.ids_size += len(id_line)
+
+        self._files[EMBEDDINGS_FILE].write(embeddings.tobytes())
+        self._files[CHUNK_OFFSETS_FILE].write(np.asarray(offsets, dtype=np.uint64).tobytes())
+        if self._centroids is not None:
+            self._files[ASSIGNMENTS_FILE].write(_assign(embeddings, self._centroids).tobytes())
+        self.manifest.count += len(chunks)
+
+    def delete_rows(self, rows: Iterable[int]) -> None:
+        """Delete rows, e.g. the chunks of a document that changed.
+
+        Args:
+            rows (Iterable[int]): The rows.
+        """
+        rows = np.fromiter(rows, dtype=np.int64)
+        self._files[DELETED_ROWS_FILE].write(rows.tobytes())
+        self.manifest.deleted_size += rows.nbytes
+
+    def train(self, nlist: int | None = None, seed: int = 0) -> None:
+        """Cluster the rows with k-means and assign every row to its closest list.
+
+        Args:
+            nlist (int | None, optional): The number of lists. Defaults to None, which uses the square root of the
+                number of rows.
+            seed (int, optional): The seed of the sampling and initialization. Defaults to 0.
+        """
+        count = self.manifest.count
+        if count == 0:
+            return
+        self._flush()
+        nlist = min(nlist or max(1, round(math.sqrt(count))), count)
+        embeddings = np.memmap(
+            self.path / EMBEDDINGS_FILE, dtype=np.float32, mode="r", shape=(count, self.manifest.dimension)
+        )
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, max(nlist * 32, min(KMEANS_MAX_SAMPLE, count)))
+        sample = np.asarray(embeddings[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = _kmeans(sample, nlist, rng)
+
+        # The files of the new generation are only used by readers once `commit` publishes the manifest.
+        generation = self.manifest.ivf_generation + 1
+        self._files.pop(ASSIGNMENTS_FILE).close()
+        _save_npy(self.path / _versioned(CENTROIDS_FILE, generation), centroids)
+        assignments_path = self.path / _versioned(ASSIGNMENTS_FILE, generation)
+        temporary_path = assignments_path.with_name(assignments_path.name + ".tmp")
+        with open(temporary_path, "wb") as file:
+            for start in range(0, count, SCORE_BLOCK_ROWS):
+                file.write(_assign(embeddings[start : start + SCORE_BLOCK_ROWS], centroids).tobytes())
+        os.replace(temporary_path, assignments_path)
+        self._files[ASSIGNMENTS_FILE] = open(assignments_path, "ab")
+
+        self._centroids = centroids
+        self.manifest.nlist = nlist
+        self.manifest.trained_count = count
+        self.manifest.ivf_generation = generation
+
+    def commit(self) -> None:
+        """Make the added rows visible to readers, training the index first if it is due."""
+        count, manifest = self.manifest.count, self.manifest
+        if count >= AUTO_TRAIN_MIN_ROWS and (
+            not manifest.nlist or count >= manifest.trained_count * RETRAIN_GROWTH_FACTOR
+        ):
+            self.train()
+        self._flush()
+        manifest.version += 1
+        if manifest.nlist:
+            assignments = np.fromfile(self._get_file_path(ASSIGNMENTS_FILE), dtype=np.int32, count=count)
+            lists = np.argsort(assignments, kind="stable").astype(np.int64)
+            list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=manifest.nlist))])
+            _save_npy(self.path / _versioned(LISTS_FILE, manifest.version), lists)
+            _save_npy(self.path / _versioned(LIST_OFFSETS_FILE, manifest.version), list_offsets.astype(np.int64))
+        manifest.save(self.path)
+        self._remove_stale_files(self._committed)
+        self._committed = (manifest.ivf_generation, manifest.version)
+
+    def close(self) -> None:
+        """Close the files without committing."""
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+
+    def __enter__(self) -> "VectorIndexWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def _flush(self) -> None:
+        for file in self._files.values():
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _get_file_path(self, name: str) -> Path:
+        if name == ASSIGNMENTS_FILE:
+            return self.path / _versioned(name, self.manifest.ivf_generation)
+        return self.path / name
+
+    def _remove_stale_files(self, previous: tuple[int, int]) -> None:
+        # Keep the IVF files of the current and the previous commit, which readers may still be opening.
+        keep = {
+            CENTROIDS_FILE: {self.manifest.ivf_generation, previous[0]},
+            ASSIGNMENTS_FILE: {self.manifest.ivf_generation, previous[0]},
+            LISTS_FILE: {self.manifest.version, previous[1]},
+            LIST_OFFSETS_FILE: {self.manifest.version, previous[1]},
+        }
+        for path in self.path.glob("ivf_*"):
+            parts = path.name.split(".")
+            if len(parts) == 3 and parts[1].isdigit():
+                kept = keep.get(f"{parts[0]}.{parts[2]}")
+                if kept is not None and int(parts[1]) not in kept:
+                    path.unlink(missing_ok=True)
+
+    def _get_committed_sizes(self) -> dict[str, int]:
+        manifest = self.manifest
+        return {
+            EMBEDDINGS_FILE: manifest.count * manifest.dimension * 4,
+            CHUNKS_FILE: manifest.chunks_size,
+            CHUNK_OFFSETS_FILE: manifest.count * 8,
+            IDS_FILE: manifest.ids_size,
+            DELETED_ROWS_FILE: manifest.deleted_size,
+            ASSIGNMENTS_FILE: manifest.count * 4 if manifest.nlist else 0,
+        }
+
+
+class VectorIndex:
+    """A read-only, memory-mapped view of the committed state of an index.
+
+    Attributes:
+        path (Path): The index directory.
+        manifest (IndexManifest): The committed state the view was opened at.
+        embeddings (np.ndarray): The memory-mapped embeddings, one row per chunk.
+    """
+
+    def __init__(self, path: str | Path):
+        """Open an index.
+
+        Args:
+            path (str | Path): The index directory.
+
+        Raises:
+            FileNotFoundError: If the directory holds no index.
+        """
+        self.path = Path(path)
+        manifest = IndexManifest.load(self.path)
+        if manifest is None:
+            raise FileNotFoundError(f"No vector index at {self.path}.")
+        self.manifest = manifest
+        self._manifest_mtime = (self.path / MANIFEST_FILE).stat().st_mtime_ns
+
+        count, dimension = manifest.count, manifest.dimension
+        self.embeddings = _memmap(self.path / EMBEDDINGS_FILE, np.float32, (count, dimension))
+        self._chunk_offsets = _memmap(self.path / CHUNK_OFFSETS_FILE, np.uint64, (count,))
+        self._chunks = _mmap_file(self.path / CHUNKS_FILE, manifest.chunks_size)
+        self._centroids = self._lists = self._list_offsets = None
+        if manifest.nlist:
+            self._centroids = np.load(self.path / _versioned(CENTROIDS_FILE, manifest.ivf_generation))
+            self._lists = np.load(self.path / _versioned(LISTS_FILE, manifest.version), mmap_mode="r")
+            self._list_offsets = np.load(self.path / _versioned(LIST_OFFSETS_FILE, manifest.version))
+        self._deleted = None
+        if manifest.deleted_size:
+            self._deleted = np.zeros(count, dtype=bool)
+            self._deleted[np.fromfile(self.path / DELETED_ROWS_FILE, np.int64, manifest.deleted_size // 8)] = True
+        self._row_by_id: dict[str, int] | None = None
+        self._row_by_id_lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """The number of rows."""
+        return self.manifest.count
+
+    @property
+    def version(self) -> int:
+        """The commit the view was opened at."""
+        return self.manifest.version
+
+    def is_deleted(self, rows: np.ndarray) -> np.ndarray:
+        """Check which rows were deleted.
+
+        Args:
+            rows (np.ndarray): The rows.
+
+        Returns:
+            np.ndarray: True for every deleted row, and for rows committed after this view was opened.
+        """
+        rows = np.asarray(rows)
+        uncommitted = rows >= self.count
+        if self._deleted is None:
+            return uncommitted
+        return uncommitted | self._deleted[np.where(uncommitted, 0, rows)]
+
+    def refresh(self) -> "VectorIndex":
+        """Return a view of the latest commit.
+
+        Returns:
+            VectorIndex: This view if nothing was committed since it was opened, a new view otherwise.
+        """
+        if (self.path / MANIFEST_FILE).stat().st_mtime_ns == self._manifest_mtime:
+            return self
+        return VectorIndex(self.path)
+
+    def search_rows(
+        self,
+        query: Any,
+        top_k: int,
+        nprobe: int | None = DEFAULT_NPROBE,
+        predicate: Callable[[int], bool] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the rows closest to a query embedding.
+
+        Args:
+            query (Any): The query embedding.
+            top_k (int): The maximum number of rows returned.
+            nprobe (int | None, optional): The number of IVF lists scanned. Defaults to 16. None scans every row.
+            predicate (Callable[[int], bool] | None, optional): Accepts or rejects a row. Rows are checked in order
+                of score until `top_k` are accepted. Defaults to None, which accepts every row.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The rows and their cosine similarities, best first.
+        """
+        if self.count == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(query)
+        rows = self._probe(query, nprobe)
+        if rows is None:
+            rows = np.arange(self.count)
+            blocks = range(0, self.count, SCORE_BLOCK_ROWS)
+            scores = np.concatenate([self.embeddings[start : start + SCORE_BLOCK_ROWS] @ query for start in blocks])
+        else:
+            scores = self.embeddings[rows] @ query if len(rows) else np.empty(0, dtype=np.float32)
+        if self._deleted is not None:
+            live = ~self.is_deleted(rows)
+            rows, scores = rows[live], scores[live]
+        if len(rows) == 0:
+            return rows, scores
+
+        selected = _select_top(rows, scores, top_k, predicate)
+        return rows[selected], scores[selected]
+
+    def search(
+        self,
+        query: Any,
+        top_k: int,
+        nprobe: int | None = DEFAULT_NPROBE,
+        filters: dict[str, Any] | None = None,
+    ) -> list[tuple[dict[str, Any], float]]:
+        """Find the chunks closest to a query embedding.
+
+        Args:
+            query (Any): The query embedding.
+            top_k (int): The maximum number of chunks returned.
+            nprobe (int | None, optional): The number of IVF lists scanned. Defaults to 16. None scans every row.
+            filters (dict[str, Any] | None, optional): The metadata filters, see `matches_filters`. Defaults to None.
+
+        Returns:
+            list[tuple[dict[str, Any], float]]: The chunks and their cosine similarities, best first.
+        """
+        chunks = {}
+
+        def predicate(row: int) -> bool:
+            chunks[row] = self.get_chunk(row)
+            return matches_filters(chunks[row]["metadata"], filters)
+
+        rows, scores = self.search_rows(query, top_k, nprobe, predicate if filters else None)
+        return [(chunks.get(row) or self.get_chunk(row), float(score)) for row, score in zip(rows.tolist(), scores)]
+
+    def get_chunk(self, row: int) -> dict[str, Any]:
+        """Read the chunk of a row.
+
+        Args:
+            row (int): The row.
+
+        Returns:
+            dict[str, Any]: The chunk, with its `id`, `content` and `metadata`.
+        """
+        start = int(self._chunk_offsets[row])
+        end = int(self._chunk_offsets[row + 1]) if row + 1 < self.count else self.manifest.chunks_size
+        return json.loads(self._chunks[start:end])
+
+    def get_chunk_by_id(self, id_: str) -> dict[str, Any] | None:
+        """Read a chunk by ID.
+
+        Args:
+            id_ (str): The ID of the chunk.
+
+        Returns:
+            dict[str, Any] | None: The chunk, or None if there is no chunk with the ID or it was deleted.
+        """
+        row = self._get_row_by_id().get(id_)
+        if row is None or (self._deleted is not None and self._deleted[row]):
+            return None
+        return self.get_chunk(row)
+
+    def close(self) -> None:
+        """Release the memory-mapped chunks file."""
+        if self._chunks is not None:
+            self._chunks.close()
+
+    def _get_row_by_id(self) -> dict[str, int]:
+        with self._row_by_id_lock:
+            if self._row_by_id is None:
+                row_by_id = {}
+                with open(self.path / IDS_FILE, "rb") as file:
+                    for row, line in enumerate(file.read(self.manifest.ids_size).splitlines()):
+                        # A chunk added again later replaces the earlier one.
+                        row_by_id[json.loads(line)] = row
+                self._row_by_id = row_by_id
+            return self._row_by_id
+
+    def _probe(self, query: np.ndarray, nprobe: int | None) -> np.ndarray | None:
+        if self._centroids is None or nprobe is None or nprobe >= self.manifest.nlist:
+            return None
+        lists = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._lists[self._list_offsets[i] : self._list_offsets[i + 1]] for i in lists])
+        # Sorted rows read the memory-mapped embeddings front to back.
+        rows.sort()
+        return rows[rows < self.count]
+
+
+def _select_top(
+    rows: np.ndarray, scores: np.ndarray, top_k: int, predicate: Callable[[int], bool] | None
+) -> np.ndarray:
+    limit = top_k if predicate is None else top_k * 4
+    selected, checked = [], set()
+    while True:
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit] if limit < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if predicate is None:
+            return top
+        for i in top.tolist():
+            if i in checked:
+                continue
+            checked.add(i)
+            if predicate(int(rows[i])):
+                selected.append(i)
+                if len(selected) == top_k:
+                    return np.asarray(selected, dtype=np.int64)
+        if limit == len(scores):
+            return np.asarray(selected, dtype=np.int64)
+        limit *= 4
+
+
+def _kmeans(sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts[~empty], axis=0)
+        # Empty lists are reseeded with random rows, so that every list stays in use.
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.argmax(np.asarray(embeddings) @ centroids.T, axis=1).astype(np.int32)
+
+
+def _versioned(name: str, version: int) -> str:
+    stem, extension = name.split(".")
+    return f"{stem}.{version}.{extension}"
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.save(file, array)
+    os.replace(temporary_path, path)
+
+
+def _memmap(path: Path, dtype: Any, shape: tuple[int, ...]) -> np.ndarray:
+    if shape[0] == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _mmap_file(path: Path, size: int) -> mmap.mmap | None:
+    if size == 0:
+        return None
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)